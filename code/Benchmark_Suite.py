@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Synthetic Data Generators and Per-Stage Benchmark Suite
+=======================================================
+
+The repository ships a 623-message training set and a 78-node forward graph, which says little
+about behaviour at corpus scale. This suite generates synthetic inputs at any scale and times
+each analysis stage on them:
+
+- corpus: Russian-language messages drawn from the word distribution and message lengths of
+  Training_Dataset.csv, with the FRAMES key phrases and the rule lexicons injected at
+  TERM_RATE, attributed to channels of Channels_List.csv (weighted by subscribers);
+- forward graph: directed graph with heavy-tailed in/out activity, community structure and
+  weights calibrated on Edges.csv / Nodes.csv (mean degree, intra-community share, weights).
+
+Stages (BENCH_STAGES) and scales (BENCH_MESSAGES, BENCH_NODES):
+- rules       — spaCy rule detector of Dependency_Parsing.py (needs ru_core_news_lg)
+- frames      — frame matcher of Frame_Frequency_Analysis.py
+- classifier  — ruBERT inference (MODEL_DIR, BACKEND torch/onnx/onnx-int8)
+- network     — degrees, betweenness, structural summary and Louvain of Network_Analysis.py
+
+Every (stage, scale) runs in a fresh process, so peak RSS is that of the stage alone. Results
+(throughput, latency percentiles, peak memory) go to outputs/benchmarks/benchmark_<time>.json and
+are compared with the previous run; throughput drops beyond REGRESSION_TOLERANCE are flagged.
+
+Dependencies
+------------
+pip install pandas numpy scipy networkx (spacy / torch transformers for rules / classifier)
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import resource
+import platform
+import subprocess
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# ========================
+# CONFIGURATION
+# ========================
+CORPUS_SEED_PATH = "data/Training_Dataset.csv"
+CHANNELS_PATH = "data/Channels_List.csv"
+EDGES_PATH = "data/Network_Analysis_Data/Edges.csv"
+NODES_PATH = "data/Network_Analysis_Data/Nodes.csv"
+
+
+def _scales(var: str, default: str):
+    return [int(float(x)) for x in os.getenv(var, default).split(",") if x]
+
+
+BENCH_STAGES = [s for s in os.getenv("BENCH_STAGES", "rules,frames,classifier,network").split(",") if s]
+BENCH_MESSAGES = _scales("BENCH_MESSAGES", "1e5")     # corpus sizes (up to 1e7)
+BENCH_NODES = _scales("BENCH_NODES", "1e3,1e4")       # graph sizes (up to 1e5)
+BENCH_SEED = 42
+BACKEND = os.getenv("BACKEND", "torch")
+
+CHUNK_SIZE = 50_000               # messages generated and processed at a time
+TERM_RATE = 0.3                   # share of messages that receive injected frame/lexicon terms
+RULES_MAX_MESSAGES = 20_000       # spaCy parsing runs at ~ms/message; larger scales are capped
+CLASSIFIER_MAX_MESSAGES = 5_000   # same for transformer inference
+CLASSIFIER_BATCH_SIZE = 32
+LATENCY_SAMPLES = 100_000         # per-message latencies kept for percentiles (strided sample)
+EXACT_BC_MAX_NODES = 2_000        # larger graphs use pivot-sampled betweenness
+BENCH_BC_EPSILON = float(os.getenv("BENCH_BC_EPSILON", 0.05))
+REGRESSION_TOLERANCE = 0.2        # flag throughput drops of more than 20% vs the previous run
+
+BENCH_DIR = os.path.join("outputs", "benchmarks")
+
+
+# ----------------- corpus generator -----------------
+TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+class SyntheticCorpus:
+    """Message stream with the vocabulary and length profile of the training set."""
+
+    def __init__(self, seed: int = BENCH_SEED):
+        from Frame_Frequency_Analysis import FRAMES
+        from Dependency_Parsing import MULTIWORD_SUBJECTS, SINGLEWORD_SUBJECTS, NEGATIVE_LEMMAS
+
+        self.rng = np.random.default_rng(seed)
+        messages = pd.read_csv(CORPUS_SEED_PATH)["message"].dropna().astype(str)
+        tokens = [TOKEN_RE.findall(m) for m in messages]
+        counts = pd.Series([t for toks in tokens for t in toks]).value_counts()
+        self.vocab = counts.index.to_numpy(dtype=object)
+        self.p = (counts / counts.sum()).to_numpy()
+        self.lengths = np.array([len(t) for t in tokens if t])
+        self.terms = np.array([k for kws in FRAMES.values() for k in kws]
+                              + MULTIWORD_SUBJECTS + SINGLEWORD_SUBJECTS + sorted(NEGATIVE_LEMMAS), dtype=object)
+
+        channels = pd.read_csv(CHANNELS_PATH, encoding="utf-8-sig")
+        self.channels = channels["Id"].to_numpy(dtype=object)
+        self.clusters = channels["Cluster"].to_numpy(dtype=object)
+        subs = channels["Subscribers"].fillna(channels["Subscribers"].median()).to_numpy(dtype=float)
+        self.channel_p = subs / subs.sum()
+
+    def chunks(self, n_messages: int, chunk_size: int = CHUNK_SIZE):
+        """Yield DataFrames (message_id, channel_id, cluster, time, message) totalling n_messages."""
+        start_ts = pd.Timestamp("2022-02-24").value
+        span = pd.Timestamp("2024-09-01").value - start_ts
+        for lo in range(0, n_messages, chunk_size):
+            n = min(chunk_size, n_messages - lo)
+            lengths = self.rng.choice(self.lengths, n)
+            words = self.vocab[self.rng.choice(len(self.vocab), lengths.sum(), p=self.p)]
+            bounds = np.concatenate([[0], np.cumsum(lengths)])
+            inject = self.rng.random(n) < TERM_RATE
+            texts = []
+            for i in range(n):
+                msg = words[bounds[i]:bounds[i + 1]].tolist()
+                if inject[i]:
+                    for term in self.rng.choice(self.terms, self.rng.integers(1, 3)):
+                        msg.insert(int(self.rng.integers(0, len(msg) + 1)), term)
+                texts.append(" ".join(msg))
+            ch = self.rng.choice(len(self.channels), n, p=self.channel_p)
+            yield pd.DataFrame({
+                "message_id": np.arange(lo, lo + n),
+                "channel_id": self.channels[ch],
+                "cluster": self.clusters[ch],
+                "time": pd.to_datetime(np.sort(start_ts + self.rng.integers(0, span, n))),
+                "message": texts,
+            })
+
+
+# ----------------- graph generator -----------------
+def graph_profile(edges_path: str = EDGES_PATH, nodes_path: str = NODES_PATH) -> dict:
+    """Mean out-degree, edge weights, community shares and intra-community edge share of the real graph."""
+    edges = pd.read_csv(edges_path)
+    nodes = pd.read_csv(nodes_path)
+    community = dict(zip(nodes["Id"], nodes["modularity_class"]))
+    n = len(set(edges["Source"]) | set(edges["Target"]))
+    same = edges["Source"].map(community) == edges["Target"].map(community)
+    return {
+        "mean_out_degree": len(edges) / n,
+        "weights": edges["Weight"].to_numpy(),
+        "community_shares": nodes["modularity_class"].value_counts(normalize=True).to_numpy(),
+        "intra_share": float(same.mean()),
+    }
+
+
+def synthetic_forward_graph(n_nodes: int, seed: int = BENCH_SEED, profile: dict = None):
+    """(edges DataFrame Source/Target/Weight, nodes DataFrame Id/Label/modularity_class)."""
+    profile = profile or graph_profile()
+    rng = np.random.default_rng(seed)
+    comm = rng.choice(len(profile["community_shares"]), n_nodes, p=profile["community_shares"])
+    # heavy-tailed activity: few channels forward (and are forwarded) a lot
+    out_f = rng.pareto(1.5, n_nodes) + 1
+    in_f = rng.pareto(1.2, n_nodes) + 1
+    n_edges = int(n_nodes * min(profile["mean_out_degree"], (n_nodes - 1) / 4))
+
+    src = rng.choice(n_nodes, n_edges, p=out_f / out_f.sum())
+    tgt = rng.choice(n_nodes, n_edges, p=in_f / in_f.sum())
+    intra = np.flatnonzero(rng.random(n_edges) < profile["intra_share"])
+    for c in np.unique(comm):
+        members = np.flatnonzero(comm == c)
+        e = intra[comm[src[intra]] == c]
+        if len(e):
+            tgt[e] = members[rng.choice(len(members), len(e), p=in_f[members] / in_f[members].sum())]
+    keep = src != tgt
+    weights = rng.choice(profile["weights"], keep.sum())
+
+    ids = np.array([f"ch{i:06d}" for i in range(n_nodes)], dtype=object)
+    edges = pd.DataFrame({"Source": ids[src[keep]], "Target": ids[tgt[keep]], "Weight": weights})
+    nodes = pd.DataFrame({"Id": ids, "Label": ids, "modularity_class": comm})
+    return edges, nodes
+
+
+# ----------------- measurement helpers -----------------
+def _peak_rss_mb() -> float:
+    """Peak RSS of this process and its finished children (Linux reports KiB)."""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+
+def _latency_ms(samples) -> dict:
+    arr = np.asarray(samples, dtype=float) * 1000
+    if not len(arr):
+        return {}
+    return {"p50": float(np.percentile(arr, 50)), "p95": float(np.percentile(arr, 95)),
+            "p99": float(np.percentile(arr, 99)), "mean": float(arr.mean())}
+
+
+def _per_message_stage(n_messages: int, setup, process, unit: str = "messages") -> dict:
+    """Stream the synthetic corpus through process(msg); time each call (strided sample)."""
+    corpus = SyntheticCorpus()
+    rss_before = _peak_rss_mb()
+    t_setup = time.perf_counter()
+    state = setup()
+    setup_s = time.perf_counter() - t_setup
+    stride = max(1, n_messages // LATENCY_SAMPLES)
+    lat, busy, hits, done = [], 0.0, 0, 0
+    for chunk in corpus.chunks(n_messages):
+        for msg in chunk["message"]:
+            t0 = time.perf_counter()
+            hits += bool(process(state, msg))
+            dt = time.perf_counter() - t0
+            busy += dt
+            if done % stride == 0:
+                lat.append(dt)
+            done += 1
+    return {"items": done, "unit": unit, "setup_seconds": setup_s, "seconds": busy,
+            "throughput_per_s": done / busy if busy else None, "latency_ms": _latency_ms(lat),
+            "positives": hits, "peak_rss_mb": _peak_rss_mb(), "rss_before_mb": rss_before}
+
+
+# ----------------- stages -----------------
+def bench_frames(n_messages: int) -> dict:
+    import Frame_Frequency_Analysis as ffa
+
+    backend = {}
+
+    def setup():
+        lemmatize, backend["name"] = ffa.get_lemmatizer()
+        return lemmatize, ffa.compile_frame_regexes(lemmatize)
+
+    res = _per_message_stage(n_messages, setup, lambda st, msg: ffa.frames_in(msg, *st))
+    res["lemmatizer"] = backend["name"]
+    return res
+
+
+def bench_rules(n_messages: int) -> dict:
+    import Dependency_Parsing as rules
+
+    try:
+        rules.get_nlp()
+    except OSError as e:
+        return {"skipped": f"spaCy model unavailable: {e}"}
+    n = min(n_messages, RULES_MAX_MESSAGES)
+    res = _per_message_stage(n, rules.get_nlp,
+                             lambda st, msg: rules.is_criticism_of_russian_leadership_spacy(msg))
+    res["capped_from"] = n_messages if n < n_messages else None
+    return res
+
+
+def bench_classifier(n_messages: int) -> dict:
+    from Fine_Tune_RuBERT_Criticism import MODEL_DIR
+
+    if not os.path.isdir(MODEL_DIR):
+        return {"skipped": f"no trained model in {MODEL_DIR}"}
+    from Export_RuBERT_ONNX import encode, softmax_pos, load_backend
+
+    n = min(n_messages, CLASSIFIER_MAX_MESSAGES)
+    texts = next(SyntheticCorpus().chunks(n, chunk_size=n))["message"].tolist()
+    rss_before = _peak_rss_mb()
+    t0 = time.perf_counter()
+    run, tokenizer = load_backend(BACKEND)
+    load_s = time.perf_counter() - t0
+
+    batch_lat, tokens, busy = [], 0, 0.0
+    for lo in range(0, n, CLASSIFIER_BATCH_SIZE):
+        t0 = time.perf_counter()
+        enc = encode(tokenizer, texts[lo:lo + CLASSIFIER_BATCH_SIZE])
+        softmax_pos(run(enc))
+        dt = time.perf_counter() - t0
+        batch_lat.append(dt)
+        busy += dt
+        tokens += int(enc["attention_mask"].sum())
+    single = []
+    for text in texts[:200]:
+        t0 = time.perf_counter()
+        softmax_pos(run(encode(tokenizer, [text])))
+        single.append(time.perf_counter() - t0)
+    return {"items": n, "unit": "messages", "capped_from": n_messages if n < n_messages else None,
+            "backend": BACKEND, "setup_seconds": load_s, "seconds": busy,
+            "throughput_per_s": n / busy, "tokens_per_s": tokens / busy,
+            "latency_ms": _latency_ms(single), "batch_latency_ms": _latency_ms(batch_lat),
+            "batch_size": CLASSIFIER_BATCH_SIZE, "peak_rss_mb": _peak_rss_mb(), "rss_before_mb": rss_before}
+
+
+def bench_network(n_nodes: int) -> dict:
+    import networkx as nx
+    from Network_Analysis import (build_sparse_graph, compute_degree_tables, compute_betweenness_table,
+                                  structural_summary, louvain_partition)
+
+    t0 = time.perf_counter()
+    edges, nodes = synthetic_forward_graph(n_nodes)
+    gen_s = time.perf_counter() - t0
+    rss_before = _peak_rss_mb()
+    mode = "exact" if n_nodes <= EXACT_BC_MAX_NODES else "approx"
+    timings = {}
+
+    def timed(name, fn):
+        t = time.perf_counter()
+        out = fn()
+        timings[name] = time.perf_counter() - t
+        return out
+
+    g = timed("build", lambda: build_sparse_graph(edges["Source"].to_numpy(), edges["Target"].to_numpy(),
+                                                  edges["Weight"].to_numpy()))
+    timed("degree", lambda: compute_degree_tables(g, nodes))
+    bc = timed("betweenness", lambda: compute_betweenness_table(g, nodes, mode=mode, epsilon=BENCH_BC_EPSILON))
+    timed("structural_summary", lambda: structural_summary(g))
+    GU = nx.from_scipy_sparse_array(g.undirected(how="sum"), edge_attribute="weight")
+    timed("louvain", lambda: louvain_partition(GU, 1.0, BENCH_SEED))
+    total = sum(timings.values())
+    return {"items": g.m, "unit": "edges", "nodes": g.n, "generate_seconds": gen_s, "seconds": total,
+            "throughput_per_s": g.m / total, "metric_seconds": timings,
+            "betweenness": bc.attrs["betweenness"], "peak_rss_mb": _peak_rss_mb(), "rss_before_mb": rss_before}
+
+
+STAGE_BENCHMARKS = {
+    "rules": (bench_rules, BENCH_MESSAGES),
+    "frames": (bench_frames, BENCH_MESSAGES),
+    "classifier": (bench_classifier, BENCH_MESSAGES),
+    "network": (bench_network, BENCH_NODES),
+}
+
+
+# ----------------- runner -----------------
+def _init_child():
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_isolated(fn, scale: int) -> dict:
+    """Run one benchmark in a fresh process so its peak RSS is not inflated by earlier ones."""
+    with ProcessPoolExecutor(max_workers=1, mp_context=mp.get_context("spawn"), initializer=_init_child) as pool:
+        return pool.submit(fn, scale).result()
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {"git_commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+            "cpu_count": os.cpu_count(), "numpy": np.__version__, "pandas": pd.__version__}
+
+
+def compare_with_previous(results, previous_path: str):
+    """Print throughput changes against the previous run; return the flagged regressions."""
+    with open(previous_path, encoding="utf-8") as f:
+        prev = {(r["stage"], r["scale"]): r for r in json.load(f)["results"]}
+    flagged = []
+    print(f"\n=== Compared with {os.path.basename(previous_path)} ===")
+    for r in results:
+        old = prev.get((r["stage"], r["scale"]))
+        if not old or not old.get("throughput_per_s") or not r.get("throughput_per_s"):
+            continue
+        ratio = r["throughput_per_s"] / old["throughput_per_s"]
+        mark = "  REGRESSION" if ratio < 1 - REGRESSION_TOLERANCE else ""
+        print(f" {r['stage']:<11} {r['scale']:>9}: throughput x{ratio:.2f}{mark}")
+        if mark:
+            flagged.append((r["stage"], r["scale"], ratio))
+    return flagged
+
+
+def main():
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    previous = sorted(glob.glob(os.path.join(BENCH_DIR, "benchmark_*.json")))
+    results = []
+    for stage in BENCH_STAGES:
+        fn, scales = STAGE_BENCHMARKS[stage]
+        for scale in scales:
+            print(f" [{stage}] scale {scale:,} ...", flush=True)
+            res = {"stage": stage, "scale": scale, **run_isolated(fn, scale)}
+            results.append(res)
+            if "skipped" in res:
+                print(f"   skipped: {res['skipped']}")
+                continue
+            if "metric_seconds" in res:
+                detail = ", ".join(f"{k} {v:.2f}s" for k, v in res["metric_seconds"].items())
+            else:
+                detail = f"p50 {res['latency_ms']['p50']:.3f} ms, p95 {res['latency_ms']['p95']:.3f} ms"
+            print(f"   {res['items']:,} {res['unit']} in {res['seconds']:.2f}s -> "
+                  f"{res['throughput_per_s']:,.1f} {res['unit']}/s; {detail}; peak RSS {res['peak_rss_mb']:.0f} MB")
+
+    out_path = os.path.join(BENCH_DIR, f"benchmark_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    report = {"created": time.strftime("%Y-%m-%d %H:%M:%S"), "environment": environment(),
+              "config": {"stages": BENCH_STAGES, "messages": BENCH_MESSAGES, "nodes": BENCH_NODES,
+                         "seed": BENCH_SEED, "backend": BACKEND, "term_rate": TERM_RATE,
+                         "bc_epsilon": BENCH_BC_EPSILON},
+              "results": results}
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=float)
+    print(f"\n Saved: {out_path}")
+    if previous:
+        compare_with_previous(results, previous[-1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Memory-Compact Corpus Layout
+============================
+
+Helpers that keep the message corpus small in RAM for the analysis scripts:
+
+- message text as Arrow-backed strings (one contiguous buffer instead of a Python object per row);
+- channel_id / channel_name / cluster as categoricals, message_id as int32, time as datetime64;
+- per-message labels (frames, criticism) as packed bit flags: one uint8 holds all eight
+  FRAMES, instead of eight boolean columns plus Python lists of bools;
+- PostgreSQL reads through a server-side cursor, compacting each chunk as it arrives, so the
+  object-dtype frame of the whole corpus never exists at once.
+
+Run directly to compare the object layout with the compact one on COMPACT_SOURCE
+("postgres", a CSV path, or "synthetic" — the Benchmark_Suite.py generator).
+
+Dependencies
+------------
+pip install pandas numpy pyarrow (psycopg2-binary for postgres)
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+# ========================
+# CONFIGURATION
+# ========================
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", 100_000))   # rows fetched / processed at a time
+TEXT_DTYPE = "string[pyarrow]"
+CATEGORY_COLUMNS = ("channel_id", "channel_name", "channel_username", "cluster")
+COMPACT_SOURCE = os.getenv("COMPACT_SOURCE", "synthetic")
+COMPACT_SAMPLE = int(float(os.getenv("COMPACT_SAMPLE", 1e5)))   # messages for COMPACT_SOURCE=synthetic
+
+
+# ----------------- layout -----------------
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Return df with the compact dtypes (columns not listed here are left unchanged)."""
+    out = {}
+    for col in df.columns:
+        s = df[col]
+        if col in ("message", "messages"):
+            s = s.astype(TEXT_DTYPE)
+        elif col in CATEGORY_COLUMNS:
+            s = s.astype("category")
+        elif col == "message_id":
+            s = pd.to_numeric(s, downcast="integer").astype(np.int32)
+        elif col == "time" and not pd.api.types.is_datetime64_any_dtype(s):
+            s = pd.to_datetime(s, errors="coerce")
+        out[col] = s
+    return pd.DataFrame(out, index=df.index)
+
+
+def concat_compact(chunks) -> pd.DataFrame:
+    """Concatenate compact chunks, unifying categories so the result stays categorical."""
+    chunks = [c for c in chunks if len(c)]
+    if not chunks:
+        return pd.DataFrame()
+    for col in chunks[0].columns:
+        if isinstance(chunks[0][col].dtype, pd.CategoricalDtype):
+            cats = pd.api.types.union_categoricals([c[col] for c in chunks], sort_categories=True).categories
+            for c in chunks:
+                c[col] = c[col].cat.set_categories(cats)
+    return pd.concat(chunks, ignore_index=True)
+
+
+def read_postgres_compact(conn, query: str, params=None, chunk_size: int = CHUNK_SIZE) -> pd.DataFrame:
+    """Run query through a server-side cursor and compact each chunk before keeping it."""
+    chunks = []
+    with conn.cursor(name="compact_corpus") as cur:
+        cur.itersize = chunk_size
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            colnames = [desc[0] for desc in cur.description]
+            chunks.append(compact_frame(pd.DataFrame(rows, columns=colnames)))
+    return concat_compact(chunks)
+
+
+def iter_chunks(n: int, chunk_size: int = CHUNK_SIZE):
+    """(lo, hi) row bounds covering n rows."""
+    for lo in range(0, n, chunk_size):
+        yield lo, min(lo + chunk_size, n)
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 2**20
+
+
+# ----------------- bit flags -----------------
+def flag_dtype(n_flags: int):
+    for dt in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if n_flags <= np.iinfo(dt).bits:
+            return dt
+    raise ValueError(f"At most 64 flags can be packed, got {n_flags}")
+
+
+def flag_bits(names) -> dict:
+    """Name -> bit mask, in the given order."""
+    return {name: 1 << i for i, name in enumerate(names)}
+
+
+def unpack_flags(flags: np.ndarray, n_flags: int) -> np.ndarray:
+    """(n, n_flags) bool matrix from packed flags."""
+    return ((flags[:, None] >> np.arange(n_flags, dtype=flags.dtype)) & 1).astype(bool)
+
+
+def count_flags_by(codes: np.ndarray, n_groups: int, flags: np.ndarray, n_flags: int,
+                   chunk_size: int = CHUNK_SIZE) -> np.ndarray:
+    """(n_groups, n_flags) counts of set flags per group code, unpacking one chunk at a time."""
+    counts = np.zeros((n_groups, n_flags), dtype=np.int64)
+    for lo, hi in iter_chunks(len(flags), chunk_size):
+        np.add.at(counts, codes[lo:hi], unpack_flags(flags[lo:hi], n_flags))
+    return counts
+
+
+# ----------------- main -----------------
+def load_source(source: str = COMPACT_SOURCE) -> pd.DataFrame:
+    """Corpus in the plain (object) layout, for the comparison."""
+    if source == "synthetic":
+        from Benchmark_Suite import SyntheticCorpus
+        return pd.concat(SyntheticCorpus().chunks(COMPACT_SAMPLE), ignore_index=True).astype(
+            {"message": object, "channel_id": object, "cluster": object})
+    if source == "postgres":
+        import psycopg2
+        from Dependency_Parsing import get_pg_config, build_query
+
+        conn = psycopg2.connect(**get_pg_config())
+        try:
+            return pd.read_sql_query(build_query(), conn)
+        finally:
+            conn.close()
+    return pd.read_csv(source, dtype=object)
+
+
+def main():
+    df = load_source()
+    # measured before compacting: Arrow conversion caches a UTF-8 copy inside each Python str
+    before = df.memory_usage(deep=True)
+    plain = before.sum() / 2**20
+    compact = compact_frame(df)
+    print(f" {len(df):,} messages from {COMPACT_SOURCE}")
+    print(f" object layout:  {plain:9.1f} MB")
+    print(f" compact layout: {memory_mb(compact):9.1f} MB  (x{plain / max(memory_mb(compact), 1e-9):.1f} smaller)")
+    after = compact.memory_usage(deep=True)
+    for col in compact.columns:
+        print(f"   {col:<16} {str(df[col].dtype):<16} -> {str(compact[col].dtype):<16} "
+              f"{before[col] / 2**20:8.1f} -> {after[col] / 2**20:8.1f} MB")
+    n_frames = 8   # has__ bool columns + the per-frame Python lists of bools they were built from
+    print(f" frame labels:   {len(df) * n_frames * (1 + 8) / 2**20:9.1f} MB as columns + lists -> "
+          f"{len(df) * np.dtype(flag_dtype(n_frames)).itemsize / 2**20:.1f} MB packed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Rule + Transformer Cascade for Criticism Detection
+==================================================
+
+Combines the two detectors of criticism toward Russian authorities:
+a cheap first stage (lexical gate over the Dependency_Parsing.py lexicons and/or the
+spaCy rule detector) decides which messages are candidates, and only those are scored
+by the fine-tuned ruBERT classifier (MODEL_DIR, PyTorch or ONNX). Messages that no gate
+fires on are treated as confident negatives and never reach the transformer.
+
+Evaluation mode (default) scores Training_Dataset.csv under every routing policy and
+reports the share of messages routed and the recall lost relative to running the
+transformer on everything. CORPUS=1 applies the selected POLICY to telegram_data.
+
+Dependencies
+------------
+pip install torch transformers spacy (onnxruntime for BACKEND=onnx)
+"""
+
+import os
+import re
+import time
+import numpy as np
+import pandas as pd
+
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import precision_recall_fscore_support
+
+import Dependency_Parsing as rules
+from Fine_Tune_RuBERT_Criticism import (
+    DATA_PATH,
+    OUTPUT_DIR,
+    RANDOM_SEED,
+    THRESHOLD,
+    load_data,
+)
+from Export_RuBERT_ONNX import encode, softmax_pos, load_backend
+from Dedup_Messages import dedup_messages
+
+# ========================
+# CONFIGURATION
+# ========================
+BACKEND = os.getenv("BACKEND", "torch")       # "torch", "onnx" or "onnx-int8"
+POLICY = os.getenv("POLICY", "authority")     # policy used for CORPUS=1 scoring
+EVAL_SPLIT = os.getenv("EVAL_SPLIT", "all")   # "all" rows of DATA_PATH or the held-out "test" split
+CORPUS = os.getenv("CORPUS", "0") == "1"
+SCORE_BATCH_SIZE = 32
+
+# Authority references beyond the rule lexicon (titles, institutions, informal names).
+# They widen the gate only; the rule detector itself is unchanged.
+EXTRA_AUTHORITY_TERMS = [
+    "власть", "власти", "правительство", "чиновник", "министр", "депутат", "генерал", "генштаб",
+    "губернатор", "администрация", "верховный главнокомандующий", "гарант", "владимир владимирович",
+    "силовые структуры", "элита", "руководство", "начальство", "кремлёвский",
+]
+
+# Policy -> gates combined with OR. An empty list sends everything to the transformer;
+# None skips the transformer entirely (rule labels only).
+ROUTING_POLICIES = {
+    "all": [],
+    "subject": ["subject"],
+    "authority": ["authority"],
+    "authority_or_negative": ["authority", "negative"],
+    "rule": ["rule"],
+    "authority_or_rule": ["authority", "rule"],
+    "rule_only": None,
+}
+
+OUT_EVAL = os.path.join(OUTPUT_DIR, "criticism_cascade_routing_report.csv")
+OUT_CORPUS = os.path.join(OUTPUT_DIR, "criticism_cascade_corpus.csv")
+
+_SUFFIXES = ("ться", "тись", "ость", "ать", "ять", "ить", "еть", "уть", "ный", "ий", "ый", "ой",
+             "ая", "ое", "ие", "ия", "ь", "й", "а", "е", "ё", "и", "о", "у", "ы", "ю", "я")
+
+
+# ----------------- lexical gate -----------------
+def stem(word: str) -> str:
+    """Crude prefix stem so one pattern covers Russian inflections (кремль -> кремл)."""
+    w = word.lower()
+    for suf in _SUFFIXES:
+        if w.endswith(suf) and len(w) - len(suf) >= 3:
+            return w[: -len(suf)]
+    return w
+
+
+def phrase_pattern(phrase: str) -> str:
+    """Word-initial stem pattern for a (multiword) phrase."""
+    return r"\w*\s+".join(re.escape(stem(w)) for w in phrase.split())
+
+
+def compile_gate(terms) -> re.Pattern:
+    pats = sorted({phrase_pattern(t) for t in terms}, key=len, reverse=True)
+    return re.compile(r"(?<!\w)(?:" + "|".join(pats) + ")", flags=re.UNICODE)
+
+
+SUBJECT_TERMS = list(rules.SINGLEWORD_SUBJECTS) + list(rules.MULTIWORD_SUBJECTS)
+GATES_LEXICAL = {
+    "subject": compile_gate(SUBJECT_TERMS),
+    "authority": compile_gate(SUBJECT_TERMS + EXTRA_AUTHORITY_TERMS),
+    "negative": compile_gate(sorted(rules.NEGATIVE_LEMMAS)),
+}
+
+
+def gate_masks(texts, needed) -> dict:
+    """Boolean routing mask per gate (only gates used by some policy are computed)."""
+    masks, timings = {}, {}
+    lowered = None
+    for g in needed:
+        t0 = time.perf_counter()
+        if g == "rule":
+            masks[g] = np.fromiter((rules.is_criticism_of_russian_leadership_spacy(t) for t in texts),
+                                   dtype=bool, count=len(texts))
+        else:
+            if lowered is None:
+                lowered = [t.lower() for t in texts]
+            rx = GATES_LEXICAL[g]
+            masks[g] = np.fromiter((rx.search(t) is not None for t in lowered), dtype=bool, count=len(texts))
+        timings[g] = time.perf_counter() - t0
+    return masks, timings
+
+
+def route(policy_gates, masks, n: int) -> np.ndarray:
+    """Messages a policy sends to the transformer."""
+    if not policy_gates:
+        return np.ones(n, dtype=bool)
+    out = np.zeros(n, dtype=bool)
+    for g in policy_gates:
+        out |= masks[g]
+    return out
+
+
+# ----------------- transformer stage -----------------
+class MemoScorer:
+    """Score messages by index, calling the transformer once per message at most."""
+
+    def __init__(self, texts, run, tokenizer):
+        self.texts = texts
+        self.run = run
+        self.tokenizer = tokenizer
+        self.probs = np.full(len(texts), np.nan)
+        self.calls = 0
+        self.seconds = 0.0
+
+    def score(self, idx: np.ndarray) -> np.ndarray:
+        todo = idx[np.isnan(self.probs[idx])]
+        # shortest first keeps per-batch padding small
+        todo = todo[np.argsort([len(self.texts[i]) for i in todo], kind="stable")]
+        t0 = time.perf_counter()
+        for i in range(0, len(todo), SCORE_BATCH_SIZE):
+            chunk = todo[i:i + SCORE_BATCH_SIZE]
+            enc = encode(self.tokenizer, [self.texts[j] for j in chunk])
+            self.probs[chunk] = softmax_pos(self.run(enc))
+        self.seconds += time.perf_counter() - t0
+        self.calls += len(todo)
+        return self.probs[idx]
+
+
+def cascade_predict(routed: np.ndarray, scorer: MemoScorer) -> np.ndarray:
+    """Final labels: transformer decision for routed messages, 0 for the rest."""
+    y_hat = np.zeros(len(routed), dtype=int)
+    idx = np.flatnonzero(routed)
+    if len(idx):
+        y_hat[idx] = (scorer.score(idx) >= THRESHOLD).astype(int)
+    return y_hat
+
+
+# ----------------- evaluation -----------------
+def evaluate_policies(df: pd.DataFrame, policies: dict) -> pd.DataFrame:
+    texts = df["message"].tolist()
+    y = df["is_criticism"].to_numpy()
+    n = len(texts)
+
+    needed = sorted({g for gates in policies.values() if gates for g in gates}
+                    | ({"rule"} if any(g is None for g in policies.values()) else set()))
+    masks, gate_seconds = gate_masks(texts, needed)
+    run, tokenizer = load_backend(BACKEND)
+    scorer = MemoScorer(texts, run, tokenizer)
+
+    rows = []
+    for name, gates in policies.items():
+        if gates is None:
+            routed = np.zeros(n, dtype=bool)
+            y_hat = masks["rule"].astype(int)
+            gate_used = ["rule"]
+        else:
+            routed = route(gates, masks, n)
+            y_hat = cascade_predict(routed, scorer)
+            gate_used = gates
+        p, r, f1, _ = precision_recall_fscore_support(y, y_hat, average="binary", zero_division=0)
+        rows.append({
+            "policy": name,
+            "gates": "+".join(gate_used) if gate_used else "-",
+            "routed_share": routed.mean(),
+            "transformer_calls": int(routed.sum()),
+            "gate_recall": float(routed[y == 1].mean()) if (y == 1).any() else float("nan"),
+            "precision": p, "recall": r, "f1": f1,
+            "gate_seconds": sum(gate_seconds[g] for g in gate_used),
+        })
+
+    # Each message is scored once across policies; cost per policy is estimated per call
+    report = pd.DataFrame(rows)
+    report["est_transformer_seconds"] = report["transformer_calls"] * scorer.seconds / max(scorer.calls, 1)
+    ref = report.loc[report["policy"] == "all"]
+    if len(ref):
+        report["recall_lost"] = float(ref["recall"].iloc[0]) - report["recall"]
+        report["f1_delta"] = report["f1"] - float(ref["f1"].iloc[0])
+    return report
+
+
+def score_corpus(policy: str):
+    """Apply one routing policy to the telegram_data corpus."""
+    gates = ROUTING_POLICIES[policy]
+    df = rules.load_df_from_postgres()
+    df = df[df["message"].notna()].copy()
+    df["message"] = df["message"].astype(str)
+    print(f" Loaded {len(df)} corpus messages; policy '{policy}'")
+
+    # Gates and the transformer run once per canonical text; reposts inherit its labels (DEDUP)
+    groups = dedup_messages(df["message"], df["time"] if "time" in df.columns else None)
+    spread = groups.fan_out if groups is not None else np.asarray
+    texts = df["message"].iloc[groups.canonical_positions].tolist() if groups is not None \
+        else df["message"].tolist()
+
+    needed = ["rule"] if gates is None else list(gates)
+    masks, gate_seconds = gate_masks(texts, needed)
+    if gates is None:
+        routed = np.zeros(len(texts), dtype=bool)
+        df["prob_criticism"] = np.nan
+        df["is_criticism"] = spread(masks["rule"].astype(int))
+        scorer = None
+    else:
+        routed = route(gates, masks, len(texts))
+        run, tokenizer = load_backend(BACKEND)
+        scorer = MemoScorer(texts, run, tokenizer)
+        df["is_criticism"] = spread(cascade_predict(routed, scorer))
+        df["prob_criticism"] = spread(scorer.probs)
+    df["routed"] = spread(routed)
+    df.to_csv(OUT_CORPUS, index=False)
+
+    print(f" Routed to transformer: {routed.sum()} / {len(texts)} texts ({routed.mean():.1%}); "
+          f"gate time {sum(gate_seconds.values()):.1f}s"
+          + (f", transformer time {scorer.seconds:.1f}s" if scorer else ""))
+    print(f" Critical messages: {int(df['is_criticism'].sum())} -> {OUT_CORPUS}")
+
+
+def main():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    if CORPUS:
+        score_corpus(POLICY)
+        return
+
+    df = load_data(DATA_PATH).reset_index(drop=True)
+    if EVAL_SPLIT == "test":
+        _, idx = train_test_split(np.arange(len(df)), test_size=0.2,
+                                  stratify=df["is_criticism"], random_state=RANDOM_SEED)
+        df = df.iloc[idx].reset_index(drop=True)
+    print(f" Evaluating routing policies on {len(df)} messages ({EVAL_SPLIT}), backend={BACKEND}")
+
+    policies = dict(ROUTING_POLICIES)
+    try:
+        rules.get_nlp()
+    except (OSError, ImportError) as e:
+        print(f" spaCy model unavailable ({e}); skipping rule-based policies")
+        policies = {k: v for k, v in policies.items() if v is not None and "rule" not in v}
+
+    report = evaluate_policies(df, policies)
+    report.to_csv(OUT_EVAL, index=False)
+
+    cols = ["policy", "routed_share", "gate_recall", "precision", "recall", "f1", "recall_lost",
+            "gate_seconds", "est_transformer_seconds"]
+    print("\n=== Routing policies ===")
+    print(report[[c for c in cols if c in report.columns]].to_string(index=False, float_format="%.3f"))
+    print(f"\n Saved: {OUT_EVAL}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+ruBERT Criticism Classifier — Embedding Cache and Lightweight Heads
+===================================================================
+
+This script encodes the labeled training messages (and, optionally, the Telegram corpus) once
+with the ruBERT encoder, stores the pooled embeddings as memory-mapped float16 arrays, and then
+trains cheap heads (logistic regression, MLP) on top of them. A vectorized precision–recall sweep
+over cross-validated out-of-fold predictions on the training split picks the decision threshold,
+and the held-out split is scored once at that fixed threshold, so threshold or label-set
+experiments take seconds on CPU instead of a full fine-tune / re-predict.
+
+Embeddings are cached by text content + encoder + pooling, labels are not part of the key:
+changing LABEL_COLUMN or the labels in DATA_PATH reuses the cached arrays.
+
+Dependencies
+------------
+pip install torch transformers datasets scikit-learn (psycopg2-binary for CORPUS=1)
+"""
+
+import os
+import json
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+
+from sklearn.model_selection import StratifiedKFold, cross_val_predict, train_test_split
+from sklearn.linear_model import LogisticRegression
+from sklearn.neural_network import MLPClassifier
+from sklearn.metrics import classification_report
+
+import torch
+from datasets import Dataset
+from transformers import BertTokenizerFast, BertModel
+
+from Fine_Tune_RuBERT_Criticism import (
+    DATA_PATH,
+    OUTPUT_DIR,
+    MODEL_DIR,
+    MAX_LEN,
+    RANDOM_SEED,
+    THRESHOLD,
+    tokenization_cache_key,
+    tokenize_cached,
+    padded_batches,
+)
+
+# ========================
+# CONFIGURATION
+# ========================
+ENCODER = os.getenv("ENCODER", MODEL_DIR)        # fine-tuned model by default; any BERT checkpoint works
+POOLING = os.getenv("POOLING", "mean")           # "mean" (masked mean of last layer) or "cls"
+LABEL_COLUMN = os.getenv("LABEL_COLUMN", "is_criticism")
+CORPUS = os.getenv("CORPUS", "0") == "1"         # also embed and score telegram_data messages
+CORPUS_LIMIT = int(os.getenv("CORPUS_LIMIT", 0))  # 0 = all messages
+
+EMBED_BATCH_SIZE = 64
+THRESHOLD_FOLDS = 5                              # CV folds on the training split for threshold selection
+EMBED_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache", "embeddings")
+OUT_SWEEP = os.path.join(OUTPUT_DIR, "embedding_heads_threshold_sweep.csv")
+OUT_SUMMARY = os.path.join(OUTPUT_DIR, "embedding_heads_summary.json")
+OUT_CORPUS = os.path.join(OUTPUT_DIR, "embedding_head_corpus_scores.csv")
+
+HEADS = {
+    "logreg": lambda: LogisticRegression(max_iter=2000, C=1.0),
+    "mlp": lambda: MLPClassifier(hidden_layer_sizes=(256,), alpha=1e-3, early_stopping=True,
+                                 max_iter=300, random_state=RANDOM_SEED),
+}
+
+
+# ----------------- data -----------------
+def load_labeled(path: str, label_col: str) -> pd.DataFrame:
+    """Load the training CSV with an arbitrary binary label column."""
+    df = pd.read_csv(path)
+    if not {"message", label_col}.issubset(df.columns):
+        raise ValueError(f"Dataset must contain 'message' and '{label_col}' columns.")
+    df = df[["message", label_col]].dropna()
+    df["message"] = df["message"].astype(str).str.strip()
+    df = df[df["message"] != ""].reset_index(drop=True)
+    df[label_col] = df[label_col].astype(int)
+    return df
+
+
+def load_corpus_from_postgres(limit: int = 0) -> pd.DataFrame:
+    """Load corpus messages (channel_id, message_id, message) with Dependency_Parsing's query and settings."""
+    import psycopg2
+    from Dependency_Parsing import CHANNEL_ID, build_query, get_pg_config
+
+    conn = psycopg2.connect(**get_pg_config())
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(build_query(extra_columns=("message_id",), limit=limit), (CHANNEL_ID,) if CHANNEL_ID else None)
+            rows = cur.fetchall()
+            colnames = [desc[0] for desc in cur.description]
+    finally:
+        conn.close()
+    df = pd.DataFrame(rows, columns=colnames)
+    df = df[df["message"].notna()]
+    df["message"] = df["message"].astype(str).str.strip()
+    return df[df["message"] != ""].reset_index(drop=True)
+
+
+# ----------------- embeddings -----------------
+def encoder_fingerprint(path: str) -> str:
+    """Identify an encoder by its config and weight files (name, size, mtime)."""
+    h = hashlib.sha256(path.encode())
+    if os.path.isdir(path):
+        for fn in sorted(os.listdir(path)):
+            if fn == "config.json" or fn.endswith((".safetensors", ".bin")):
+                st = os.stat(os.path.join(path, fn))
+                h.update(f"{fn}:{st.st_size}:{st.st_mtime_ns}".encode())
+    return h.hexdigest()[:16]
+
+
+def embed_cached(texts, tokenizer, model, name: str) -> np.ndarray:
+    """Return pooled embeddings for `texts` as a read-only float16 memmap, computing them once."""
+    tok_key = tokenization_cache_key(texts, tokenizer, MAX_LEN, False)
+    key = hashlib.sha256(f"{tok_key}|{encoder_fingerprint(ENCODER)}|{POOLING}".encode()).hexdigest()[:16]
+    path = os.path.join(EMBED_CACHE_DIR, f"{name}-{POOLING}-{key}.npy")
+    if os.path.exists(path):
+        print(f" Using cached embeddings: {path}")
+        return np.load(path, mmap_mode="r")
+
+    os.makedirs(EMBED_CACHE_DIR, exist_ok=True)
+    enc_ds = tokenize_cached(Dataset.from_dict({"text": list(texts)}), tokenizer)
+    tmp = path + ".tmp"
+    out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float16,
+                                    shape=(len(texts), model.config.hidden_size))
+    start, row = time.perf_counter(), 0
+    model.eval()
+    with torch.inference_mode():
+        for enc in padded_batches(enc_ds, tokenizer, EMBED_BATCH_SIZE):
+            batch = {k: torch.from_numpy(v) for k, v in enc.items()}
+            hidden = model(**batch).last_hidden_state
+            if POOLING == "cls":
+                pooled = hidden[:, 0]
+            else:
+                mask = batch["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+                pooled = (hidden * mask).sum(1) / mask.sum(1).clamp(min=1)
+            out[row:row + len(pooled)] = pooled.numpy().astype(np.float16)
+            row += len(pooled)
+    out.flush()
+    del out
+    os.replace(tmp, path)
+    print(f" Embedded {len(texts)} {name} texts in {time.perf_counter() - start:.1f}s -> {path}")
+    return np.load(path, mmap_mode="r")
+
+
+# ----------------- threshold sweep -----------------
+def pr_sweep(y_true: np.ndarray, probs: np.ndarray) -> pd.DataFrame:
+    """Precision/recall/F1 at every distinct score threshold, computed with cumulative sums."""
+    order = np.argsort(-probs, kind="mergesort")
+    p, y = probs[order], y_true[order]
+    tp = np.cumsum(y)
+    fp = np.cumsum(1 - y)
+    last = np.r_[np.nonzero(np.diff(p))[0], len(p) - 1]   # last index of each tied score
+    tp, fp, thr = tp[last], fp[last], p[last]
+    precision = tp / np.maximum(tp + fp, 1)
+    recall = tp / max(int(y.sum()), 1)
+    f1 = np.where(precision + recall > 0, 2 * precision * recall / np.maximum(precision + recall, 1e-12), 0.0)
+    return pd.DataFrame({"threshold": thr, "precision": precision, "recall": recall, "f1": f1})
+
+
+# ----------------- main -----------------
+def main():
+    torch.manual_seed(RANDOM_SEED)
+    print(f" Encoder: {ENCODER} (pooling={POOLING})")
+    tokenizer = BertTokenizerFast.from_pretrained(ENCODER)
+    model = BertModel.from_pretrained(ENCODER)   # classifier head (if any) is ignored
+
+    df = load_labeled(DATA_PATH, LABEL_COLUMN)
+    X = embed_cached(df["message"].tolist(), tokenizer, model, "training")
+    y = df[LABEL_COLUMN].to_numpy()
+
+    # Same stratified 80/20 split as Fine_Tune_RuBERT_Criticism.py
+    idx_train, idx_test = train_test_split(
+        np.arange(len(df)), test_size=0.2, stratify=y, random_state=RANDOM_SEED
+    )
+    X_train = np.asarray(X[idx_train], dtype=np.float32)
+    X_test = np.asarray(X[idx_test], dtype=np.float32)
+
+    sweeps, summary, fitted = [], {}, {}
+    for name, make in HEADS.items():
+        # Threshold from out-of-fold predictions on the training split; the test split is not consulted
+        oof = cross_val_predict(make(), X_train, y[idx_train], method="predict_proba",
+                                cv=StratifiedKFold(THRESHOLD_FOLDS, shuffle=True, random_state=RANDOM_SEED))[:, 1]
+        sweep = pr_sweep(y[idx_train], oof)
+        best = sweep.loc[sweep["f1"].idxmax()]
+        thr = float(best["threshold"])
+
+        t0 = time.perf_counter()
+        head = make().fit(X_train, y[idx_train])
+        fit_s = time.perf_counter() - t0
+        probs = head.predict_proba(X_test)[:, 1]
+        rep_default = classification_report(y[idx_test], (probs >= THRESHOLD).astype(int),
+                                            digits=3, output_dict=True)
+        rep_cv = classification_report(y[idx_test], (probs >= thr).astype(int),
+                                       digits=3, output_dict=True)
+        summary[name] = {
+            "fit_seconds": fit_s,
+            "default_threshold": THRESHOLD,
+            "report_at_default": rep_default,
+            "cv_threshold": thr,
+            "cv_f1": float(best["f1"]),
+            "report_at_cv_threshold": rep_cv,
+        }
+        sweeps.append(sweep.assign(head=name))
+        fitted[name] = (head, thr)
+
+        print(f"\n=== Head: {name} (fit {fit_s:.2f}s) ===")
+        print(f"Threshold from {THRESHOLD_FOLDS}-fold out-of-fold sweep: {thr:.3f} "
+              f"(CV F1={best['f1']:.3f} P={best['precision']:.3f} R={best['recall']:.3f})")
+        print(f"Held-out F1 (criticism) @ {THRESHOLD}: {rep_default['1']['f1-score']:.3f} | "
+              f"@ {thr:.3f}: {rep_cv['1']['f1-score']:.3f}")
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    pd.concat(sweeps, ignore_index=True)[["head", "threshold", "precision", "recall", "f1"]] \
+        .to_csv(OUT_SWEEP, index=False)
+    with open(OUT_SUMMARY, "w", encoding="utf-8") as f:
+        json.dump({"encoder": ENCODER, "pooling": POOLING, "label_column": LABEL_COLUMN, "heads": summary},
+                  f, ensure_ascii=False, indent=2)
+
+    if CORPUS:
+        corpus = load_corpus_from_postgres(CORPUS_LIMIT)
+        print(f"\n Loaded {len(corpus)} corpus messages")
+        if corpus.empty:
+            print(" Corpus query returned no messages; nothing to score.")
+        else:
+            Xc = embed_cached(corpus["message"].tolist(), tokenizer, model, "corpus")
+            best_name = max(summary, key=lambda k: summary[k]["cv_f1"])   # chosen on CV, not on the test split
+            head, thr = fitted[best_name]
+            probs = np.concatenate([head.predict_proba(np.asarray(Xc[i:i + 100_000], dtype=np.float32))[:, 1]
+                                    for i in range(0, len(corpus), 100_000)])
+            corpus[["channel_id", "message_id"]].assign(
+                prob_criticism=probs, is_criticism=(probs >= thr).astype(int), head=best_name
+            ).to_csv(OUT_CORPUS, index=False)
+            print(f" Corpus scored with '{best_name}' at threshold {thr:.3f}: "
+                  f"{int((probs >= thr).sum())} critical of {len(corpus)} -> {OUT_CORPUS}")
+
+    print("\n Saved:")
+    print(f" - {OUT_SWEEP}")
+    print(f" - {OUT_SUMMARY}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+ruBERT Criticism Classifier — Local Inference Server with Micro-Batching
+========================================================================
+
+Long-running asyncio HTTP server that loads the saved classifier (MODEL_DIR, PyTorch or ONNX)
+once and scores messages on demand. Concurrent requests are coalesced into micro-batches bounded
+by MAX_BATCH_SIZE and MAX_WAIT_MS, so many small calls share one model forward pass.
+
+Endpoints
+---------
+POST /score    {"messages": ["...", ...]}  ->  {"prob_criticism": [...], "is_criticism": [...]}
+GET  /metrics  request latency p50/p99, batch-size distribution, queue depth
+GET  /health
+
+Listens on HOST:PORT, or on a Unix socket when SOCKET_PATH is set. From the collector or a
+notebook, use `score_messages(texts)` below.
+"""
+
+import os
+import json
+import time
+import asyncio
+from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from Local_HTTP import HTTPError, connection, json_object, serve_connection, string_list
+
+# ========================
+# CONFIGURATION
+# ========================
+HOST = os.getenv("HOST", "127.0.0.1")
+PORT = int(os.getenv("PORT", 8765))
+SOCKET_PATH = os.getenv("SOCKET_PATH")            # e.g. /tmp/criticism.sock (overrides HOST/PORT)
+BACKEND = os.getenv("BACKEND", "torch")           # "torch", "onnx" or "onnx-int8"
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", 32))
+MAX_WAIT_MS = float(os.getenv("MAX_WAIT_MS", 10))  # how long the first message in a batch may wait
+METRICS_WINDOW = 10000                              # recent samples kept for percentiles
+
+
+# ----------------- micro-batching -----------------
+class MicroBatcher:
+    """Queue single messages and score them in batches on a dedicated model thread."""
+
+    def __init__(self, run, tokenizer, threshold: float):
+        from Export_RuBERT_ONNX import encode, softmax_pos
+
+        self._encode = encode
+        self._softmax_pos = softmax_pos
+        self.run = run
+        self.tokenizer = tokenizer
+        self.threshold = threshold
+        self.queue = asyncio.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=1)  # one forward pass at a time
+        self.batch_sizes = deque(maxlen=METRICS_WINDOW)
+        self.batch_ms = deque(maxlen=METRICS_WINDOW)
+        self.request_ms = deque(maxlen=METRICS_WINDOW)
+        self.messages_scored = 0
+        self.requests = 0
+
+    def _forward(self, texts):
+        return self._softmax_pos(self.run(self._encode(self.tokenizer, texts)))
+
+    async def score(self, texts):
+        loop = asyncio.get_running_loop()
+        t0 = time.perf_counter()
+        futures = []
+        for text in texts:
+            fut = loop.create_future()
+            self.queue.put_nowait((text, fut))
+            futures.append(fut)
+        probs = await asyncio.gather(*futures)
+        self.request_ms.append((time.perf_counter() - t0) * 1000)
+        self.requests += 1
+        return probs
+
+    async def worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + MAX_WAIT_MS / 1000
+            while len(batch) < MAX_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # drain anything that arrived while waiting, up to the size bound
+            while len(batch) < MAX_BATCH_SIZE and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            texts = [t for t, _ in batch]
+            t0 = time.perf_counter()
+            try:
+                probs = await loop.run_in_executor(self.executor, self._forward, texts)
+            except Exception as e:  # fail the whole batch, keep serving
+                for _, fut in batch:
+                    if not fut.done():
+                        fut.set_exception(e)
+                continue
+            self.batch_ms.append((time.perf_counter() - t0) * 1000)
+            self.batch_sizes.append(len(batch))
+            self.messages_scored += len(batch)
+            for (_, fut), p in zip(batch, probs):
+                if not fut.done():
+                    fut.set_result(float(p))
+
+    def metrics(self) -> dict:
+        def pct(values):
+            if not values:
+                return {"p50": None, "p99": None, "mean": None}
+            arr = np.fromiter(values, dtype=float)
+            return {"p50": float(np.percentile(arr, 50)), "p99": float(np.percentile(arr, 99)),
+                    "mean": float(arr.mean())}
+
+        return {
+            "requests": self.requests,
+            "messages_scored": self.messages_scored,
+            "queue_depth": self.queue.qsize(),
+            "request_latency_ms": pct(self.request_ms),
+            "batch_latency_ms": pct(self.batch_ms),
+            "batch_size": {**pct(self.batch_sizes),
+                           "histogram": dict(sorted(Counter(self.batch_sizes).items()))},
+            "config": {"backend": BACKEND, "max_batch_size": MAX_BATCH_SIZE, "max_wait_ms": MAX_WAIT_MS},
+        }
+
+
+# ----------------- HTTP handling -----------------
+async def handle_connection(reader, writer, batcher: MicroBatcher):
+    """Serve HTTP/1.1 requests on one connection (keep-alive and error handling in Local_HTTP.py)."""
+
+    async def route(method, path, body):
+        if method == "POST" and path == "/score":
+            messages = string_list(json_object(body), "messages")
+            probs = await batcher.score(messages)   # a failed forward pass becomes a 500
+            return 200, {"prob_criticism": probs,
+                         "is_criticism": [int(p >= batcher.threshold) for p in probs]}
+        if method == "GET" and path == "/metrics":
+            return 200, batcher.metrics()
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok"}
+        raise HTTPError(404, f"no route for {method} {path}")
+
+    await serve_connection(reader, writer, route)
+
+
+async def serve(batcher: MicroBatcher):
+    worker = asyncio.create_task(batcher.worker())
+
+    async def _handler(reader, writer):
+        await handle_connection(reader, writer, batcher)
+
+    if SOCKET_PATH:
+        if os.path.exists(SOCKET_PATH):
+            os.remove(SOCKET_PATH)
+        server = await asyncio.start_unix_server(_handler, path=SOCKET_PATH)
+        where = f"unix:{SOCKET_PATH}"
+    else:
+        server = await asyncio.start_server(_handler, HOST, PORT)
+        where = f"http://{HOST}:{PORT}"
+    print(f" Serving criticism scores on {where} "
+          f"(backend={BACKEND}, max_batch={MAX_BATCH_SIZE}, max_wait={MAX_WAIT_MS} ms)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        worker.cancel()
+
+
+# ----------------- client -----------------
+def score_messages(texts, host=HOST, port=PORT, socket_path=SOCKET_PATH):
+    """Client helper: return P(criticism) for each text from a running server."""
+    conn = connection(host, port, socket_path)
+    try:
+        body = json.dumps({"messages": list(texts)}, ensure_ascii=False).encode("utf-8")
+        conn.request("POST", "/score", body=body, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        payload = json.loads(resp.read())
+        if resp.status != 200:
+            raise RuntimeError(f"Server error {resp.status}: {payload.get('error')}")
+        return payload["prob_criticism"]
+    finally:
+        conn.close()
+
+
+def get_metrics(host=HOST, port=PORT, socket_path=SOCKET_PATH) -> dict:
+    """Client helper: fetch the server's latency and batch-size metrics."""
+    conn = connection(host, port, socket_path)
+    try:
+        conn.request("GET", "/metrics")
+        return json.loads(conn.getresponse().read())
+    finally:
+        conn.close()
+
+
+# ----------------- main -----------------
+def main():
+    from Fine_Tune_RuBERT_Criticism import MODEL_DIR, THRESHOLD
+    from Export_RuBERT_ONNX import load_backend
+
+    print(f" Loading model once from: {MODEL_DIR}")
+    run, tokenizer = load_backend(BACKEND)
+    batcher = MicroBatcher(run, tokenizer, THRESHOLD)
+    try:
+        asyncio.run(serve(batcher))
+    except KeyboardInterrupt:
+        print("\n Server stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Near-Duplicate Message Detection (exact hash + MinHash-LSH)
+===========================================================
+
+Reposts put the same text into many channels, often with a changed signature line, link or
+emoji. This stage groups such copies so the expensive NLP steps (spaCy rules, frame
+lemmatization, ruBERT) run once per canonical text and their results are fanned out:
+
+1. exact duplicates — identical raw text (8-byte BLAKE2 digest);
+2. near duplicates (near=True only) — texts identical after normalization (lowercase, ё→е,
+   links / @mentions / punctuation / emoji removed, spaces collapsed), then MinHash signatures
+   (NUM_PERM permutations) of word SHINGLE_SIZE-grams over the normalized-unique texts, LSH
+   banding (BANDS × ROWS) for candidates, verified by estimated Jaccard >= JACCARD_THRESHOLD
+   against the bucket representative and merged with union-find.
+
+The canonical message of a group is its earliest (by time, else by position). `dedup(texts)`
+returns the mapping; `Dedup.fan_out(values)` spreads per-canonical results to every message.
+The NLP scripts fold only exact duplicates by default (DEDUP=exact), so the fanned-out results
+equal per-message processing. Texts that differ in case, ё/е, links, mentions, punctuation or an
+added comment can parse and label differently, so folding them is opt-in (DEDUP=near).
+Run directly to write the mapping for telegram_data (or DEDUP_SOURCE=<csv>) and the dedup ratio.
+
+Dependencies
+------------
+pip install pandas numpy pyarrow
+"""
+
+import os
+import re
+import time
+import hashlib
+from itertools import chain
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from Compact_Corpus import CHUNK_SIZE, iter_chunks
+
+# ========================
+# CONFIGURATION
+# ========================
+DEDUP = os.getenv("DEDUP", "exact")                    # used by the NLP scripts: "exact", "near" (opt-in) or "off"
+DEDUP_SOURCE = os.getenv("DEDUP_SOURCE", "postgres")   # "postgres" or a CSV with a message column
+NUM_PERM = 128
+BANDS, ROWS = 16, 8                  # BANDS * ROWS == NUM_PERM; candidate threshold ~ (1/BANDS)**(1/ROWS) = 0.71
+SHINGLE_SIZE = 3                     # words per shingle
+JACCARD_THRESHOLD = 0.8              # estimated Jaccard needed to merge a candidate pair
+MIN_TOKENS = 5                       # shorter texts are matched exactly only
+SHINGLES_PER_BATCH = 2**17           # bounds the (shingles x NUM_PERM) hash block in memory
+SEED = 42
+
+OUTPUT_DIR = "outputs"
+OUT_MAP = os.path.join(OUTPUT_DIR, "dedup", "message_canonical.parquet")
+
+_MIX = np.uint64(0x9E3779B97F4A7C15)    # odd 64-bit multiplier for combining token codes
+_LINK_RE = re.compile(r"(https?://|www\.|t\.me/)\S+|@\w+")
+_NONWORD_RE = re.compile(r"[^\w\s]|_", re.UNICODE)
+
+
+# ----------------- normalization and hashing -----------------
+def normalize_text(text: str) -> str:
+    text = _LINK_RE.sub(" ", text.lower().replace("ё", "е"))
+    return " ".join(_NONWORD_RE.sub(" ", text).split())
+
+
+def text_digest(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+def shingle_keys(texts):
+    """
+    64-bit keys of the word SHINGLE_SIZE-grams of each (normalized) text, flat, with the text
+    index of each key. Words are factorized once for the whole batch; a text shorter than
+    SHINGLE_SIZE gives one key for all its words.
+    """
+    tokens = [t.split() for t in texts]
+    lengths = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+    codes = pd.factorize(np.fromiter(chain.from_iterable(tokens), dtype=object,
+                                     count=int(lengths.sum())))[0].astype(np.uint64) + np.uint64(1)
+    text_of = np.repeat(np.arange(len(texts)), lengths)
+    pos = np.arange(len(codes)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    remaining = lengths[text_of] - pos
+    keys = codes.copy()
+    for j in range(1, SHINGLE_SIZE):
+        nxt = np.zeros_like(codes)
+        nxt[:-j] = codes[j:]
+        keys = keys * _MIX + np.where(remaining > j, nxt, np.uint64(0))
+    valid = (remaining >= SHINGLE_SIZE) | ((pos == 0) & (lengths[text_of] < SHINGLE_SIZE))
+    return keys[valid], text_of[valid]
+
+
+def _permutations(num_perm: int = NUM_PERM, seed: int = SEED):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64) * np.uint64(2) + np.uint64(1)   # odd
+    b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signatures(texts, num_perm: int = NUM_PERM) -> np.ndarray:
+    """(len(texts), num_perm) uint32 MinHash signatures; multiply-shift hash (a*x + b) >> 32 per permutation."""
+    a, b = _permutations(num_perm)
+    keys, text_of = shingle_keys(texts)
+    bounds = np.searchsorted(text_of, np.arange(len(texts) + 1))
+    sig = np.empty((len(texts), num_perm), dtype=np.uint32)
+    lo = 0
+    while lo < len(texts):
+        # texts [lo, hi) whose shingles fit in one (shingles x num_perm) block
+        hi = max(lo + 1, int(np.searchsorted(bounds, bounds[lo] + SHINGLES_PER_BATCH, side="right")) - 1)
+        hi = min(hi, len(texts))
+        h = ((a[:, None] * keys[None, bounds[lo]:bounds[hi]] + b[:, None]) >> np.uint64(32)).astype(np.uint32)
+        sig[lo:hi] = np.minimum.reduceat(h, bounds[lo:hi] - bounds[lo], axis=1).T   # contiguous rows
+        lo = hi
+    return sig
+
+
+# ----------------- clustering -----------------
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = np.arange(n)
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, x: int, y: int):
+        rx, ry = self.find(x), self.find(y)
+        if rx != ry:
+            self.parent[max(rx, ry)] = min(rx, ry)
+
+
+def lsh_groups(sig: np.ndarray, bands: int = BANDS, rows: int = ROWS,
+               threshold: float = JACCARD_THRESHOLD) -> np.ndarray:
+    """Group id (smallest member index) per signature row."""
+    uf = _UnionFind(len(sig))
+    for band in range(bands):
+        block = np.ascontiguousarray(sig[:, band * rows:(band + 1) * rows])
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * rows))).ravel()
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.concatenate([[True], sorted_keys[1:] != sorted_keys[:-1]]))
+        ends = np.append(starts[1:], len(order))
+        shared = (ends - starts) > 1
+        for s, e in zip(starts[shared], ends[shared]):
+            members = order[s:e]
+            rep = members[0]
+            agree = (sig[members[1:]] == sig[rep]).mean(axis=1)
+            for m in members[1:][agree >= threshold]:
+                uf.union(rep, m)
+    return np.array([uf.find(i) for i in range(len(sig))])
+
+
+@dataclass
+class Dedup:
+    """canonical[i] = position of the canonical message for message i; kind: 0 unique/canonical, 1 exact, 2 near."""
+    canonical: np.ndarray
+    kind: np.ndarray
+    seconds: float
+
+    @property
+    def canonical_positions(self) -> np.ndarray:
+        return np.flatnonzero(self.canonical == np.arange(len(self.canonical)))
+
+    def fan_out(self, values) -> np.ndarray:
+        """Spread results computed for canonical_positions (same order) to every message."""
+        full = np.empty(len(self.canonical), dtype=np.asarray(values).dtype)
+        full[self.canonical_positions] = values
+        return full[self.canonical]
+
+    def stats(self) -> dict:
+        n = len(self.canonical)
+        k = len(self.canonical_positions)
+        return {"messages": n, "canonical": k, "exact_duplicates": int((self.kind == 1).sum()),
+                "near_duplicates": int((self.kind == 2).sum()),
+                "dedup_ratio": 1 - k / n if n else 0.0, "seconds": round(self.seconds, 2)}
+
+
+def _take(texts, idx) -> list:
+    """Python strings for positions idx of a list or Series (Arrow-backed columns stay compact)."""
+    if hasattr(texts, "iloc"):
+        return texts.iloc[idx].fillna("").tolist()
+    return [texts[i] or "" for i in idx]
+
+
+def dedup(texts, times=None, near: bool = True, chunk_size: int = CHUNK_SIZE) -> Dedup:
+    """
+    Exact (+ near-duplicate) groups over texts (list or Series); the earliest message of a group
+    is canonical. Texts are hashed chunk by chunk, so only digests are held for the corpus.
+    """
+    t0 = time.perf_counter()
+    n = len(texts)
+    order = np.argsort(np.asarray(times), kind="stable") if times is not None else np.arange(n)
+
+    def first_of(keys):
+        """Position of the first occurrence (in time order) of each message's key."""
+        _, first_in_order, inverse = np.unique(keys[order], return_index=True, return_inverse=True)
+        rep = np.empty(n, dtype=np.int64)
+        rep[order] = order[first_in_order][inverse]
+        return rep
+
+    digests = np.empty(n, dtype=np.int64)
+    norm_digests = np.empty(n if near else 0, dtype=np.int64)
+    n_tokens = np.empty(n if near else 0, dtype=np.int32)
+    for lo, hi in iter_chunks(n, chunk_size):
+        for i, t in enumerate(_take(texts, np.arange(lo, hi)), start=lo):
+            digests[i] = text_digest(t)
+            if near:
+                norm = normalize_text(t)
+                norm_digests[i] = text_digest(norm)
+                n_tokens[i] = norm.count(" ") + 1 if norm else 0
+
+    exact_rep = first_of(digests)
+    kind = np.where(exact_rep != np.arange(n), 1, 0).astype(np.int8)
+    canonical = exact_rep
+
+    if near:
+        canonical = first_of(norm_digests)   # identical after normalization
+        reps = np.unique(canonical)
+        reps = reps[np.argsort(np.argsort(order)[reps], kind="stable")]   # time order, so union-find roots are earliest
+        long_reps = reps[n_tokens[reps] >= MIN_TOKENS]
+        if len(long_reps) > 1:
+            sig = np.empty((len(long_reps), NUM_PERM), dtype=np.uint32)
+            for lo, hi in iter_chunks(len(long_reps), chunk_size):
+                sig[lo:hi] = minhash_signatures([normalize_text(t) for t in _take(texts, long_reps[lo:hi])])
+            rep_map = np.arange(n)
+            rep_map[long_reps] = long_reps[lsh_groups(sig)]   # earliest member of each group
+            canonical = rep_map[canonical]
+        kind[canonical != exact_rep] = 2
+    return Dedup(canonical=canonical, kind=kind, seconds=time.perf_counter() - t0)
+
+
+def dedup_messages(texts, times=None, mode: str = DEDUP):
+    """dedup() for DEDUP mode "near" / "exact"; None for "off" (process every message)."""
+    if mode == "off":
+        return None
+    result = dedup(texts, times, near=(mode == "near"))
+    s = result.stats()
+    print(f" Dedup ({mode}): {s['messages']:,} messages -> {s['canonical']:,} canonical texts, "
+          f"ratio {s['dedup_ratio']:.1%} ({s['seconds']:.1f}s)")
+    return result
+
+
+# ----------------- main -----------------
+def load_messages(source: str = DEDUP_SOURCE) -> pd.DataFrame:
+    if source == "postgres":
+        from Dependency_Parsing import load_df_from_postgres
+        return load_df_from_postgres()
+    return pd.read_csv(source)
+
+
+def main():
+    os.makedirs(os.path.dirname(OUT_MAP), exist_ok=True)
+    df = load_messages()
+    df = df[df["message"].notna()].reset_index(drop=True)
+    result = dedup(df["message"], df["time"] if "time" in df.columns else None)
+    s = result.stats()
+    keep = [c for c in ("channel_id", "message_id", "time") if c in df.columns]
+    out = df[keep].assign(position=np.arange(len(df)), canonical=result.canonical, kind=result.kind)
+    out.to_parquet(OUT_MAP, index=False)
+    print(f" {s['messages']:,} messages -> {s['canonical']:,} canonical texts "
+          f"({s['exact_duplicates']:,} exact, {s['near_duplicates']:,} near duplicates); "
+          f"dedup ratio {s['dedup_ratio']:.1%} in {s['seconds']:.1f}s")
+    print(f" Saved: {OUT_MAP}")
+
+
+if __name__ == "__main__":
+    main()
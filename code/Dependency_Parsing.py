@@ -10,11 +10,11 @@ that express criticism toward Russian leadership using lexical and syntactic rul
 import os
 import sys
 import pickle
+import numpy as np
 import pandas as pd
-from tqdm import tqdm
-import spacy
-from spacy.matcher import PhraseMatcher
-import psycopg2
+
+# spaCy, psycopg2 and tqdm are imported where they are used, so importing the lexicons and
+# rules (or running as an NLP_Worker.py client) does not pay their start-up cost.
 
 # ========= DATABASE CONFIGURATION =========
 def _get_env_required(name: str) -> str:
@@ -23,14 +23,20 @@ def _get_env_required(name: str) -> str:
         sys.exit(f"Environment variable {name} is required but not set.")
     return val
 
-PGHOST = _get_env_required("PGHOST")
-PGPORT = int(_get_env_required("PGPORT"))
-PGDB   = _get_env_required("PGDATABASE")
-PGUSER = _get_env_required("PGUSER")
-PGPASS = _get_env_required("PGPASSWORD")
+def get_pg_config() -> dict:
+    """Read PostgreSQL settings from the environment (only when a DB connection is needed)."""
+    return dict(
+        host=_get_env_required("PGHOST"),
+        port=int(_get_env_required("PGPORT")),
+        dbname=_get_env_required("PGDATABASE"),
+        user=_get_env_required("PGUSER"),
+        password=_get_env_required("PGPASSWORD"),
+    )
 
 # Optional filter variable
 CHANNEL_ID = os.getenv("CHANNEL_ID")  # if not set → all channels included
+NLP_WORKER = os.getenv("NLP_WORKER")  # socket path or host:port of a running NLP_Worker.py
+WORKER_BATCH_SIZE = 256
 
 # ========= SQL QUERY =========
 # Reads text from `messages` (if present) or `message` column.
@@ -39,19 +45,21 @@ QUERY_BASE = """
 SELECT
   COALESCE(messages, message) AS message,
   "time",
-  channel_id
+  channel_id{extra_columns}
 FROM public.telegram_data
 WHERE "time" >= TIMESTAMP '2022-02-22 00:00:00'
 {channel_filter}
 ORDER BY "time" ASC
+{limit}
 """
 
-def build_query() -> str:
-    """Constructs SQL query with optional channel_id filtering."""
-    if CHANNEL_ID:
-        return QUERY_BASE.format(channel_filter="AND channel_id = %s")
-    else:
-        return QUERY_BASE.format(channel_filter="")
+def build_query(extra_columns=(), limit: int = 0) -> str:
+    """Constructs SQL query with optional channel_id filtering (extra columns / row limit for other scripts)."""
+    return QUERY_BASE.format(
+        extra_columns="".join(f",\n  {c}" for c in extra_columns),
+        channel_filter="AND channel_id = %s" if CHANNEL_ID else "",
+        limit=f"LIMIT {int(limit)}" if limit else "",
+    )
 
 
 # ========= LEXICAL DICTIONARIES =========
@@ -84,12 +92,25 @@ NEGATIVE_VERBS_WITH_NOT = {"мочь", "решаться", "вмешиватьс
 PRONOUNS = {"он", "она", "они", "его", "её", "их", "ему", "ей", "им", "них"}
 
 # ========= SPACY INITIALIZATION =========
-nlp = spacy.load("ru_core_news_lg")
-phrase_matcher = PhraseMatcher(nlp.vocab, attr="LOWER")
-phrase_patterns = [nlp(text) for text in MULTIWORD_SUBJECTS]
-phrase_matcher.add("MULTI_SUBJECT", phrase_patterns)
+# Loaded on first use, so other scripts can import the lexicons and rules cheaply.
+_nlp = None
+_phrase_matcher = None
+
+def get_nlp():
+    """Return the shared spaCy pipeline and multiword-subject matcher, loading them once."""
+    global _nlp, _phrase_matcher
+    if _nlp is None:
+        import spacy
+        from spacy.matcher import PhraseMatcher
+
+        _nlp = spacy.load("ru_core_news_lg")
+        _phrase_matcher = PhraseMatcher(_nlp.vocab, attr="LOWER")
+        phrase_patterns = [_nlp(text) for text in MULTIWORD_SUBJECTS]
+        _phrase_matcher.add("MULTI_SUBJECT", phrase_patterns)
+    return _nlp, _phrase_matcher
 
 def contains_multiword_subject(doc):
+    _, phrase_matcher = get_nlp()
     return len(phrase_matcher(doc)) > 0
 
 def criticism_targeting_subject(doc):
@@ -109,7 +130,11 @@ def criticism_targeting_subject(doc):
 
 def is_criticism_of_russian_leadership_spacy(text):
     """Return True if message contains criticism of Russian leadership."""
-    doc = nlp(text)
+    nlp, _ = get_nlp()
+    return is_criticism_doc(nlp(text))
+
+def is_criticism_doc(doc):
+    """Rule decision for an already parsed message."""
     lemmas = [t.lemma_.lower() for t in doc]
     has_single_subject = any(sub in lemmas for sub in SINGLEWORD_SUBJECTS)
     has_multi_subject = contains_multiword_subject(doc)
@@ -117,18 +142,21 @@ def is_criticism_of_russian_leadership_spacy(text):
     has_criticism = criticism_targeting_subject(doc)
     return has_subject and has_criticism
 
+def criticism_flags(texts, batch_size: int = 64):
+    """Rule decisions for many messages, parsed in batches with nlp.pipe."""
+    nlp, _ = get_nlp()
+    return [is_criticism_doc(doc) for doc in nlp.pipe(texts, batch_size=batch_size)]
+
 # ========= DATABASE CONNECTION =========
 def load_df_from_postgres() -> pd.DataFrame:
-    """Load data from PostgreSQL into a DataFrame."""
-    conn = psycopg2.connect(
-        host=PGHOST, port=PGPORT, dbname=PGDB, user=PGUSER, password=PGPASS
-    )
+    """Load data from PostgreSQL into a DataFrame (chunked, in the Compact_Corpus.py layout)."""
+    import psycopg2
+    from Compact_Corpus import read_postgres_compact
+
+    conn = psycopg2.connect(**get_pg_config())
     try:
-        with conn, conn.cursor() as cur:
-            cur.execute(QUERY)
-            rows = cur.fetchall()
-            colnames = [desc[0] for desc in cur.description]
-            return pd.DataFrame(rows, columns=colnames)
+        with conn:
+            return read_postgres_compact(conn, build_query(), (CHANNEL_ID,) if CHANNEL_ID else None)
     finally:
         conn.close()
 
@@ -139,25 +167,41 @@ def main():
     if df.empty or "message" not in df.columns:
         sys.exit("No data returned or missing 'message' column. Check your query or filters.")
 
-    df = df[df["message"].notna()].copy()
-    df["message"] = df["message"].astype(str)
+    df = df[df["message"].notna()].reset_index(drop=True)
 
     if "time" in df.columns:
         df["time"] = pd.to_datetime(df["time"], errors="coerce")
         df = df.dropna(subset=["time"])
 
-    print(f" Loaded {len(df)} rows. Starting text analysis (approx. 15–20 min)...")
-    criticism_flags = []
-
-    for i, msg in enumerate(tqdm(df["message"], desc="Analyzing messages")):
-        is_crit = is_criticism_of_russian_leadership_spacy(msg)
-        criticism_flags.append(is_crit)
+    from tqdm import tqdm
+    from Dedup_Messages import dedup_messages
 
-        if (i + 1) % 1000 == 0:
-            count = int(sum(criticism_flags))
-            print(f"• Processed {i+1} messages | Found critical: {count}")
-
-    df["is_criticism"] = criticism_flags
+    print(f" Loaded {len(df)} rows. Starting text analysis (approx. 15–20 min)...")
+    if NLP_WORKER:
+        from NLP_Worker import call_worker
+        print(f" Using resident NLP worker at {NLP_WORKER}")
+
+    # Reposts are parsed once: rules run on canonical texts, results are fanned out
+    # (DEDUP=near also folds near duplicates, DEDUP=off disables)
+    groups = dedup_messages(df["message"], df["time"] if "time" in df.columns else None)
+    todo = groups.canonical_positions if groups is not None else np.arange(len(df))
+    flags = np.zeros(len(todo), dtype=bool)
+
+    # Python strings exist only for the batch being analyzed; the frame keeps Arrow strings
+    with tqdm(total=len(todo), desc="Analyzing messages") as bar:
+        for lo in range(0, len(todo), WORKER_BATCH_SIZE):
+            batch = df["message"].iloc[todo[lo:lo + WORKER_BATCH_SIZE]].tolist()
+            if NLP_WORKER:
+                flags[lo:lo + len(batch)] = call_worker("rules", batch, NLP_WORKER)["is_criticism"]
+            else:
+                flags[lo:lo + len(batch)] = criticism_flags(batch)
+            bar.update(len(batch))
+
+            done = lo + len(batch)
+            if done // 1000 > lo // 1000:
+                print(f"• Processed {done} messages | Found critical: {int(flags[:done].sum())}")
+
+    df["is_criticism"] = groups.fan_out(flags) if groups is not None else flags
 
     # Output
     tag = "anti_regime_nationalists"
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+ruBERT Criticism Classifier — Knowledge Distillation into a Compact Student
+===========================================================================
+
+This script distills the fine-tuned classifier from Fine_Tune_RuBERT_Criticism.py (teacher,
+MODEL_DIR) into a small student for high-throughput CPU scoring. The student is trained on the
+teacher's temperature-softened predictions over unlabeled telegram_data messages plus the labeled
+training split (soft + hard loss), then compared with the teacher on the same held-out split.
+The student checkpoint is chosen on an inner validation split (VAL_FRACTION of the labeled
+training rows), so the held-out split is used only for the final comparison.
+
+Student options (STUDENT_BASE):
+- a small pretrained Russian BERT, default "cointegrated/rubert-tiny2";
+- "shallow": the teacher truncated to STUDENT_LAYERS evenly spaced encoder layers.
+
+Reported for teacher and student: accuracy / F1 on the held-out split, messages/sec and peak RSS
+(each model is benchmarked in a fresh process so RSS figures are not mixed).
+
+Dependencies
+------------
+pip install torch transformers datasets scikit-learn psycopg2-binary
+"""
+
+import os
+import copy
+import json
+import time
+import resource
+import multiprocessing as mp
+import numpy as np
+
+from sklearn.metrics import classification_report
+from sklearn.model_selection import train_test_split
+
+import torch
+import torch.nn.functional as F
+from datasets import Dataset
+from transformers import (
+    AutoTokenizer,
+    AutoModelForSequenceClassification,
+    DataCollatorWithPadding,
+    Trainer,
+    TrainingArguments,
+)
+
+from Fine_Tune_RuBERT_Criticism import (
+    DATA_PATH,
+    OUTPUT_DIR,
+    MODEL_DIR,
+    MAX_LEN,
+    RANDOM_SEED,
+    THRESHOLD,
+    load_data,
+    make_hf_datasets,
+    tokenize_cached,
+    padded_batches,
+)
+from Criticism_Embedding_Heads import load_corpus_from_postgres
+
+# ========================
+# CONFIGURATION
+# ========================
+STUDENT_BASE = os.getenv("STUDENT_BASE", "cointegrated/rubert-tiny2")
+STUDENT_LAYERS = int(os.getenv("STUDENT_LAYERS", 3))          # used when STUDENT_BASE=shallow
+STUDENT_DIR = os.path.join(OUTPUT_DIR, "models", "rubert_criticism_student")
+UNLABELED_LIMIT = int(os.getenv("UNLABELED_LIMIT", 50000))    # 0 = labeled split only
+VAL_FRACTION = 0.15      # share of the labeled training rows held out for checkpoint selection
+
+TEMPERATURE = 2.0
+ALPHA = 0.5              # weight of the soft (teacher) loss on labeled examples
+STUDENT_EPOCHS = 3
+STUDENT_LR = 1e-4
+STUDENT_BATCH_SIZE = 32
+TEACHER_BATCH_SIZE = 64
+BENCH_MESSAGES = 2000
+BENCH_BATCH_SIZE = 32
+BENCH_THREADS = int(os.getenv("NUM_THREADS", os.cpu_count() or 1))
+
+OUT_REPORT = os.path.join(OUTPUT_DIR, "rubert_distillation_report.json")
+
+
+# ----------------- teacher soft labels -----------------
+def teacher_logits(model, tokenizer, texts) -> np.ndarray:
+    """Teacher logits for `texts` (tokenization via the shared on-disk cache)."""
+    enc_ds = tokenize_cached(Dataset.from_dict({"text": list(texts)}), tokenizer)
+    out = []
+    model.eval()
+    with torch.inference_mode():
+        for enc in padded_batches(enc_ds, tokenizer, TEACHER_BATCH_SIZE):
+            out.append(model(**{k: torch.from_numpy(v) for k, v in enc.items()}).logits.numpy())
+    return np.concatenate(out).astype(np.float32)
+
+
+# ----------------- student -----------------
+def make_student(teacher, teacher_tokenizer):
+    """Return (student model, student tokenizer) according to STUDENT_BASE."""
+    if STUDENT_BASE == "shallow":
+        student = copy.deepcopy(teacher)
+        layers = student.bert.encoder.layer
+        keep = np.linspace(0, len(layers) - 1, STUDENT_LAYERS).round().astype(int)
+        student.bert.encoder.layer = torch.nn.ModuleList([layers[i] for i in keep])
+        student.config.num_hidden_layers = len(keep)
+        return student, teacher_tokenizer
+    tokenizer = AutoTokenizer.from_pretrained(STUDENT_BASE)
+    model = AutoModelForSequenceClassification.from_pretrained(STUDENT_BASE, num_labels=2)
+    return model, tokenizer
+
+
+class DistillationTrainer(Trainer):
+    """Trainer with KL(student || teacher) at TEMPERATURE plus CE on labeled rows (label >= 0)."""
+
+    def compute_loss(self, model, inputs, return_outputs=False, **kwargs):
+        t_logits = inputs.pop("teacher_logits")
+        labels = inputs.pop("labels")
+        inputs.pop("length", None)
+        outputs = model(**inputs)
+        s_logits = outputs.logits
+
+        soft = F.kl_div(
+            F.log_softmax(s_logits / TEMPERATURE, dim=-1),
+            F.softmax(t_logits / TEMPERATURE, dim=-1),
+            reduction="batchmean",
+        ) * TEMPERATURE ** 2
+        labeled = labels >= 0
+        if labeled.any():
+            hard = F.cross_entropy(s_logits[labeled], labels[labeled])
+            loss = ALPHA * soft + (1 - ALPHA) * hard
+        else:
+            loss = soft
+        return (loss, outputs) if return_outputs else loss
+
+
+def build_student_dataset(tokenizer, texts, labels, logits) -> Dataset:
+    ds = Dataset.from_dict({"text": list(texts), "label": list(labels)})
+    ds = tokenize_cached(ds, tokenizer)
+    return ds.add_column("teacher_logits", logits.tolist())
+
+
+# ----------------- benchmarking -----------------
+def _bench_worker(model_dir: str, texts, threads: int):
+    """Run in a fresh process: load a model, score texts, return msgs/sec and peak RSS (MB)."""
+    torch.set_num_threads(threads)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir).eval()
+    probs = []
+    with torch.inference_mode():
+        model(**tokenizer(texts[:BENCH_BATCH_SIZE], padding=True, truncation=True,
+                          max_length=MAX_LEN, return_tensors="pt"))  # warm-up
+        t0 = time.perf_counter()
+        for i in range(0, len(texts), BENCH_BATCH_SIZE):
+            enc = tokenizer(texts[i:i + BENCH_BATCH_SIZE], padding=True, truncation=True,
+                            max_length=MAX_LEN, return_tensors="pt")
+            probs.append(torch.softmax(model(**enc).logits, dim=-1)[:, 1].numpy())
+        elapsed = time.perf_counter() - t0
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    n_params = sum(p.numel() for p in model.parameters())
+    return {"messages_per_sec": len(texts) / elapsed, "peak_rss_mb": peak_mb,
+            "parameters": n_params, "probs": np.concatenate(probs).tolist()}
+
+
+def benchmark(model_dir: str, texts):
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(1) as pool:
+        return pool.apply(_bench_worker, (model_dir, list(texts), BENCH_THREADS))
+
+
+def summarize(y_true, probs) -> dict:
+    rep = classification_report(y_true, (np.asarray(probs) >= THRESHOLD).astype(int), digits=3, output_dict=True)
+    return {"accuracy": rep["accuracy"], "f1_criticism": rep["1"]["f1-score"],
+            "macro_f1": rep["macro avg"]["f1-score"], "report": rep}
+
+
+# ----------------- main -----------------
+def main():
+    os.makedirs(STUDENT_DIR, exist_ok=True)
+    os.environ["WANDB_DISABLED"] = "true"
+    torch.manual_seed(RANDOM_SEED)
+    np.random.seed(RANDOM_SEED)
+
+    df = load_data(DATA_PATH)
+    train_ds, test_ds, test_texts = make_hf_datasets(df)
+    y_test = np.asarray(test_ds["label"], dtype=int)
+
+    print(f" Teacher: {MODEL_DIR}")
+    t_tok = AutoTokenizer.from_pretrained(MODEL_DIR)
+    teacher = AutoModelForSequenceClassification.from_pretrained(MODEL_DIR)
+
+    # --- Inner validation split of the labeled rows: checkpoint selection only ---
+    texts, val_texts, labels, val_labels = train_test_split(
+        list(train_ds["text"]), list(train_ds["label"]), test_size=VAL_FRACTION,
+        stratify=list(train_ds["label"]), random_state=RANDOM_SEED)
+    n_labeled = len(texts)
+
+    # --- Transfer set: remaining labeled rows + unlabeled corpus (validation and held-out texts excluded) ---
+    if UNLABELED_LIMIT:
+        corpus = load_corpus_from_postgres(UNLABELED_LIMIT)
+        excluded = set(test_texts) | set(val_texts) | set(texts)
+        extra = [t for t in dict.fromkeys(corpus["message"]) if t not in excluded]
+        texts += extra
+        labels += [-1] * len(extra)
+        print(f" Transfer set: {n_labeled} labeled + {len(extra)} unlabeled messages "
+              f"({len(val_texts)} labeled held out for validation)")
+
+    t0 = time.perf_counter()
+    logits = teacher_logits(teacher, t_tok, texts)
+    print(f" Teacher soft labels computed in {time.perf_counter() - t0:.1f}s")
+
+    student, s_tok = make_student(teacher, t_tok)
+    train_set = build_student_dataset(s_tok, texts, labels, logits)
+    eval_set = build_student_dataset(s_tok, val_texts, val_labels, teacher_logits(teacher, t_tok, val_texts))
+
+    args = TrainingArguments(
+        output_dir=os.path.join(OUTPUT_DIR, "results_student"),
+        evaluation_strategy="epoch",
+        save_strategy="epoch",
+        learning_rate=STUDENT_LR,
+        per_device_train_batch_size=STUDENT_BATCH_SIZE,
+        per_device_eval_batch_size=STUDENT_BATCH_SIZE,
+        group_by_length=True,
+        length_column_name="length",
+        num_train_epochs=STUDENT_EPOCHS,
+        weight_decay=0.01,
+        load_best_model_at_end=True,
+        metric_for_best_model="eval_loss",
+        greater_is_better=False,
+        remove_unused_columns=False,   # keep teacher_logits for the loss
+        logging_steps=50,
+        save_total_limit=1,
+        report_to=[],
+        seed=RANDOM_SEED,
+    )
+    trainer = DistillationTrainer(
+        model=student,
+        args=args,
+        train_dataset=train_set,
+        eval_dataset=eval_set,   # inner validation split; the held-out split never picks the checkpoint
+        tokenizer=s_tok,
+        data_collator=DataCollatorWithPadding(s_tok, pad_to_multiple_of=8),
+    )
+    print(" Distillation started...")
+    trainer.train()
+    student.save_pretrained(STUDENT_DIR)
+    s_tok.save_pretrained(STUDENT_DIR)
+    print(f" Student saved to: {STUDENT_DIR}")
+
+    # --- Compare on held-out split; benchmark each model in its own process ---
+    bench_texts = list(test_texts)
+    while len(bench_texts) < BENCH_MESSAGES:
+        bench_texts += list(test_texts)
+    bench_texts = bench_texts[:BENCH_MESSAGES]
+
+    results = {}
+    for name, path in (("teacher", MODEL_DIR), ("student", STUDENT_DIR)):
+        bench = benchmark(path, bench_texts)
+        probs = bench.pop("probs")[:len(test_texts)]
+        results[name] = {**summarize(y_test, probs), **bench}
+
+    t, s = results["teacher"], results["student"]
+    results["delta"] = {
+        "accuracy": s["accuracy"] - t["accuracy"],
+        "f1_criticism": s["f1_criticism"] - t["f1_criticism"],
+        "macro_f1": s["macro_f1"] - t["macro_f1"],
+        "speedup": s["messages_per_sec"] / t["messages_per_sec"],
+        "rss_ratio": s["peak_rss_mb"] / t["peak_rss_mb"],
+    }
+    results["config"] = {"student_base": STUDENT_BASE, "temperature": TEMPERATURE, "alpha": ALPHA,
+                         "transfer_messages": len(texts), "validation_messages": len(val_texts),
+                         "bench_threads": BENCH_THREADS}
+
+    with open(OUT_REPORT, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+
+    print("\n=== Teacher vs Student (held-out split) ===")
+    for name in ("teacher", "student"):
+        r = results[name]
+        print(f"{name:8s} acc={r['accuracy']:.3f}  F1(crit)={r['f1_criticism']:.3f}  "
+              f"macro F1={r['macro_f1']:.3f}  {r['messages_per_sec']:.1f} msg/s  "
+              f"peak RSS={r['peak_rss_mb']:.0f} MB  params={r['parameters'] / 1e6:.1f}M")
+    d = results["delta"]
+    print(f"delta    acc={d['accuracy']:+.3f}  F1(crit)={d['f1_criticism']:+.3f}  "
+          f"speed-up x{d['speedup']:.1f}  RSS x{d['rss_ratio']:.2f}")
+    print(f"\n Report saved to: {OUT_REPORT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Exponential Discriminative Snowball Sampling (EDSS) Engine
+==========================================================
+
+Automates the wave expansion described in docs/03_Sampling_Procedure.md over the forward
+graph. Starting from the seed channels, each wave lists every channel forwarded at least
+WAVE_THRESHOLDS[wave] times (Feb 24, 2022 – Sep 1, 2024) by the channels selected in the
+previous wave (the frontier; the seeds for wave 1), with per-quarter forward counts, and
+flags candidates against the exclusion criteria:
+
+- news / official / foreign / Private_Deleted_Blocked — from the manual exclusion list
+  (EXCLUSIONS_PATH: columns channel, reason; reasons in lower case);
+- irregular_source — computed: forwarded by the frontier in fewer than MIN_ACTIVE_QUARTERS
+  of the quarterly snapshots.
+
+Unflagged candidates are proposed as Selected = 1 and become the frontier of the next wave;
+the expansion stops early when a wave selects no channel.
+Each wave's candidate table has the columns of Sampling_Manual_Filtering_R1_Example.csv, in
+the same order, followed by active_quarters and reviewed, so it can be reviewed by hand;
+reviewed decisions placed in DECISIONS_PATH (columns channel, Selected) override the
+proposals on the next run.
+
+Forward counts come from repost_edges_daily (SAMPLING_SOURCE=postgres, see Repost_Edges.py)
+or a daily edge CSV (columns source, target, day, weight). They are held as one sparse
+channel × channel matrix per quarter, so a wave is a row slice of the frontier, not a scan.
+
+Dependencies
+------------
+pip install pandas numpy scipy (psycopg2-binary for SAMPLING_SOURCE=postgres)
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# ========================
+# CONFIGURATION
+# ========================
+SAMPLING_SOURCE = os.getenv("SAMPLING_SOURCE", "postgres")   # "postgres" or a daily edge CSV path
+SEEDS = ["kvmalofeev", "strelkovii", "adirect", "rybar"]
+WAVE_THRESHOLDS = [5, 10]          # minimum forwards from the current sample, per wave
+MIN_ACTIVE_QUARTERS = 3            # fewer active quarters -> irregular_source
+START_DATE = "2022-02-24"
+END_DATE = "2024-09-01"
+EXCLUSIONS_PATH = os.getenv("EXCLUSIONS_PATH", "data/Sampling_Exclusions.csv")
+DECISIONS_PATH = os.getenv("DECISIONS_PATH", "data/Sampling_Decisions.csv")
+
+EXCLUSION_REASONS = ["news", "official", "foreign", "private_deleted_blocked"]
+# output column per flag, named and ordered as in Sampling_Manual_Filtering_R1_Example.csv
+FLAG_COLUMNS = {"news": "news", "official": "official", "foreign": "foreign",
+                "irregular_source": "irregular_source", "private_deleted_blocked": "Private_Deleted_Blocked"}
+
+OUTPUT_DIR = "outputs"
+SAMPLING_DIR = os.path.join(OUTPUT_DIR, "sampling")
+OUT_SAMPLE = os.path.join(SAMPLING_DIR, "EDSS_sample.csv")
+
+
+# ----------------- input -----------------
+def load_quarterly_counts(source: str = SAMPLING_SOURCE) -> pd.DataFrame:
+    """(source, target, quarter, weight) forward counts for every forwarding pair."""
+    if source == "postgres":
+        from Repost_Edges import connect, update_edges, fetch_quarterly_edges
+
+        conn = connect()
+        try:
+            update_edges(conn)
+            df = fetch_quarterly_edges(conn, START_DATE, END_DATE)
+        finally:
+            conn.close()
+    else:
+        from Temporal_Network_Analysis import load_daily_edges
+
+        daily = load_daily_edges(source)
+        daily = daily[(daily["day"] >= START_DATE) & (daily["day"] < END_DATE)]
+        df = (daily.assign(quarter=daily["day"].dt.to_period("Q"))
+                   .groupby(["source", "target", "quarter"], as_index=False)["weight"].sum())
+    return df
+
+
+def load_exclusions(path: str = None) -> dict:
+    """
+    channel -> set of exclusion reasons from the manual list. A missing default file only warns
+    (no manual exclusions); a path given explicitly (argument or EXCLUSIONS_PATH) must exist.
+    """
+    explicit = path is not None or "EXCLUSIONS_PATH" in os.environ
+    path = path or EXCLUSIONS_PATH
+    if not os.path.exists(path):
+        if explicit:
+            raise FileNotFoundError(f"Exclusion list not found: {path}")
+        print(f"Warning: no exclusion list at {path}; only irregular_source is flagged")
+        return {}
+    ex = pd.read_csv(path)
+    ex["reason"] = ex["reason"].str.strip().str.lower()
+    unknown = set(ex["reason"]) - set(EXCLUSION_REASONS)
+    if unknown:
+        raise ValueError(f"Unknown exclusion reason(s) in {path}: {sorted(unknown)}")
+    return ex.groupby("channel")["reason"].agg(set).to_dict()
+
+
+def load_decisions(path: str = DECISIONS_PATH) -> dict:
+    """channel -> reviewed Selected decision (0/1), overriding the engine's proposal."""
+    if not os.path.exists(path):
+        return {}
+    dec = pd.read_csv(path)
+    return dict(zip(dec["channel"], dec["Selected"].astype(int)))
+
+
+# ----------------- engine -----------------
+class ForwardCounts:
+    """Per-quarter forward counts as sparse matrices over one channel index."""
+
+    def __init__(self, counts: pd.DataFrame):
+        self.labels, codes = np.unique(np.concatenate([counts["source"].to_numpy(dtype=str),
+                                                       counts["target"].to_numpy(dtype=str)]),
+                                       return_inverse=True)
+        self.index = {c: i for i, c in enumerate(self.labels)}
+        n = len(self.labels)
+        src, tgt = codes[:len(counts)], codes[len(counts):]
+        self.quarters = pd.period_range(pd.Period(START_DATE, "Q"),
+                                        pd.Period(pd.Timestamp(END_DATE) - pd.Timedelta(days=1), "Q"), freq="Q")
+        q_idx = pd.PeriodIndex(counts["quarter"], freq="Q")
+        w = counts["weight"].to_numpy()
+        self.Q = []
+        for q in self.quarters:
+            m = np.asarray(q_idx == q)
+            self.Q.append(sparse.csr_matrix((w[m], (src[m], tgt[m])), shape=(n, n)))
+        self.total = sum(self.Q).tocsr()
+
+    def columns(self) -> list:
+        return ["channel_name", "forward_channel_name", *map(str, self.quarters), "total_count", "active_quarters"]
+
+    def wave(self, frontier, sample, threshold: int) -> pd.DataFrame:
+        """Candidate (frontier channel, forwarded channel) pairs with >= threshold forwards and quarterly counts."""
+        f_idx = np.array(sorted(self.index[c] for c in frontier if c in self.index), dtype=int)
+        if not len(f_idx):
+            return pd.DataFrame(columns=self.columns())
+        in_sample = np.zeros(len(self.labels), dtype=bool)
+        in_sample[[self.index[c] for c in sample if c in self.index]] = True
+
+        sub = self.total[f_idx].tocoo()
+        keep = (sub.data >= threshold) & ~in_sample[sub.col]
+        if not keep.any():
+            return pd.DataFrame(columns=self.columns())
+        rows, cols = f_idx[sub.row[keep]], sub.col[keep]
+        table = pd.DataFrame({"channel_name": self.labels[rows], "forward_channel_name": self.labels[cols]})
+        for q, Qm in zip(self.quarters, self.Q):
+            table[str(q)] = np.asarray(Qm[rows, cols]).ravel()
+        table["total_count"] = sub.data[keep]
+
+        # regularity of each candidate: quarters in which any frontier channel forwarded it
+        active = np.zeros(len(self.labels), dtype=int)
+        for Qm in self.Q:
+            forwarded = np.asarray(Qm[f_idx].sum(axis=0)).ravel() > 0
+            active += forwarded
+        table["active_quarters"] = active[cols]
+        return table
+
+
+def apply_criteria(table: pd.DataFrame, exclusions: dict, decisions: dict) -> pd.DataFrame:
+    """Add exclusion flags and the proposed (or reviewed) Selected decision, in the example CSV's column order."""
+    flags = list(FLAG_COLUMNS.values())
+    counts = [c for c in table.columns if c != "active_quarters"]
+    columns = counts + flags + ["Selected", "active_quarters", "reviewed"]
+    if table.empty:
+        return table.reindex(columns=columns)
+    target = table["forward_channel_name"]
+    for reason in EXCLUSION_REASONS:
+        table[FLAG_COLUMNS[reason]] = target.map(lambda c: int(reason in exclusions.get(c, ()))).astype(int)
+    table["irregular_source"] = (table["active_quarters"] < MIN_ACTIVE_QUARTERS).astype(int)
+    proposed = (table[flags].sum(axis=1) == 0).astype(int)
+    # a channel is kept or dropped as a whole, not per forwarding pair
+    proposed = proposed.groupby(target).transform("max")
+    reviewed = target.map(decisions)
+    table["Selected"] = reviewed.fillna(proposed).astype(int)
+    table["reviewed"] = reviewed.notna().astype(int)
+    table = table[columns]
+    return table.sort_values(["channel_name", "total_count"], ascending=[True, False]).reset_index(drop=True)
+
+
+def run_edss(counts: ForwardCounts, seeds, thresholds, exclusions: dict, decisions: dict):
+    """Expand waves from the seeds; return ({wave: candidate table}, sample table)."""
+    sample = {c: 0 for c in seeds}
+    tables = {}
+    frontier = list(seeds)
+    for wave, threshold in enumerate(thresholds, start=1):
+        t0 = time.perf_counter()
+        table = apply_criteria(counts.wave(frontier, sample, threshold), exclusions, decisions)
+        tables[wave] = table
+        selected = sorted(set(table.loc[table["Selected"] == 1, "forward_channel_name"]))
+        n_candidates = table["forward_channel_name"].nunique()
+        print(f" Wave {wave} (>= {threshold} forwards from {len(frontier)} frontier channels, sample {len(sample)}): "
+              f"{n_candidates} candidate channels, {len(selected)} selected ({time.perf_counter() - t0:.2f}s)")
+        for c in selected:
+            sample[c] = wave
+        frontier = selected
+        if not frontier:
+            break
+    sample_df = pd.DataFrame({"channel": list(sample), "wave": list(sample.values())})
+    return tables, sample_df
+
+
+# ----------------- main -----------------
+def main():
+    os.makedirs(SAMPLING_DIR, exist_ok=True)
+    t0 = time.perf_counter()
+    counts = ForwardCounts(load_quarterly_counts())
+    print(f" Forward counts: {len(counts.labels)} channels, {counts.total.nnz} forwarding pairs, "
+          f"{len(counts.quarters)} quarters ({time.perf_counter() - t0:.1f}s)")
+
+    missing = [s for s in SEEDS if s not in counts.index]
+    if missing:
+        print(f" Warning: seeds without forwards in the data: {missing}")
+
+    tables, sample = run_edss(counts, SEEDS, WAVE_THRESHOLDS, load_exclusions(), load_decisions())
+    for wave, table in tables.items():
+        path = os.path.join(SAMPLING_DIR, f"EDSS_wave{wave}_candidates.csv")
+        table.to_csv(path, index=False)
+        print(f" Saved: {path}")
+    sample.to_csv(OUT_SAMPLE, index=False)
+    print(f" Sample: {len(sample)} channels -> {OUT_SAMPLE}")
+
+
+if __name__ == "__main__":
+    main()
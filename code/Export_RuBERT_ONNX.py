@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+ruBERT Criticism Classifier — ONNX Export and CPU Inference
+===========================================================
+
+This script exports the fine-tuned model saved by Fine_Tune_RuBERT_Criticism.py (MODEL_DIR)
+to ONNX, optionally applies dynamic int8 quantization, and scores the held-out split with
+both PyTorch and ONNX Runtime to check prediction parity and compare CPU throughput/latency.
+
+Dependencies
+------------
+pip install onnx onnxruntime
+"""
+
+import os
+import json
+import time
+import inspect
+import numpy as np
+
+from sklearn.metrics import classification_report
+
+import torch
+from transformers import BertTokenizerFast, BertForSequenceClassification
+
+from Fine_Tune_RuBERT_Criticism import (
+    DATA_PATH,
+    OUTPUT_DIR,
+    MODEL_DIR,
+    MAX_LEN,
+    THRESHOLD,
+    load_data,
+    make_hf_datasets,
+    tokenize_cached,
+    padded_batches,
+)
+
+# ========================
+# CONFIGURATION
+# ========================
+ONNX_DIR = os.path.join(OUTPUT_DIR, "models", "rubert_criticism_onnx")
+ONNX_PATH = os.path.join(ONNX_DIR, "model.onnx")
+ONNX_INT8_PATH = os.path.join(ONNX_DIR, "model.int8.onnx")
+OUT_BENCHMARK = os.path.join(OUTPUT_DIR, "rubert_onnx_benchmark.json")
+
+QUANTIZE = os.getenv("QUANTIZE", "1") == "1"       # set QUANTIZE=0 to skip the int8 model
+NUM_THREADS = int(os.getenv("NUM_THREADS", os.cpu_count() or 1))
+INFER_BATCH_SIZE = 32
+LATENCY_SAMPLES = 50     # single-message calls used for the latency figures
+OPSET = 14
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Wrap the classifier so the exported graph has a single `logits` output."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask, token_type_ids):
+        return self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            token_type_ids=token_type_ids,
+        ).logits
+
+
+def export_onnx(model, tokenizer, path: str):
+    """Export the PyTorch classifier to ONNX with dynamic batch and sequence axes."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    dummy = tokenizer(["Пример сообщения"], padding=True, truncation=True,
+                      max_length=MAX_LEN, return_tensors="pt")
+    dynamic = {0: "batch", 1: "sequence"}
+    # Newer torch defaults to the dynamo exporter; the TorchScript one is what BERT quantization expects
+    legacy = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(
+        _LogitsOnly(model).eval(),
+        (dummy["input_ids"], dummy["attention_mask"], dummy["token_type_ids"]),
+        path,
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": dynamic,
+            "attention_mask": dynamic,
+            "token_type_ids": dynamic,
+            "logits": {0: "batch"},
+        },
+        opset_version=OPSET,
+        do_constant_folding=True,
+        **legacy,
+    )
+    print(f" ONNX model written to: {path}")
+
+
+def quantize_onnx(src_path: str, dst_path: str):
+    """Apply dynamic int8 quantization to the weights of an exported ONNX model."""
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    quantize_dynamic(src_path, dst_path, weight_type=QuantType.QInt8)
+    print(f" Quantized (int8) model written to: {dst_path}")
+
+
+def make_ort_session(path: str):
+    """Create a CPU-only ONNX Runtime session with full graph optimizations."""
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    opts.intra_op_num_threads = NUM_THREADS
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(path, sess_options=opts, providers=["CPUExecutionProvider"])
+
+
+def softmax_pos(logits: np.ndarray) -> np.ndarray:
+    """Probability of label=1 from two-class logits."""
+    z = logits - logits.max(axis=1, keepdims=True)
+    e = np.exp(z)
+    return e[:, 1] / e.sum(axis=1)
+
+
+def torch_backend(model):
+    """Return a scoring callable for the PyTorch model (numpy encodings -> logits)."""
+    model.eval()
+
+    def _run(enc):
+        with torch.inference_mode():
+            out = model(**{k: torch.from_numpy(v) for k, v in enc.items()})
+        return out.logits.numpy()
+    return _run
+
+
+def onnx_backend(session):
+    """Return a scoring callable for an ONNX Runtime session (numpy encodings -> logits)."""
+    names = {i.name for i in session.get_inputs()}
+
+    def _run(enc):
+        feed = {k: v.astype(np.int64) for k, v in enc.items() if k in names}
+        return session.run(["logits"], feed)[0]
+    return _run
+
+
+def load_backend(backend: str = "torch"):
+    """Return (scoring callable on numpy encodings -> logits, tokenizer) for MODEL_DIR.
+
+    backend: "torch", "onnx" (fp32 export) or "onnx-int8" (quantized export).
+    """
+    tokenizer = BertTokenizerFast.from_pretrained(MODEL_DIR)
+    if backend == "onnx":
+        run = onnx_backend(make_ort_session(ONNX_PATH))
+    elif backend == "onnx-int8":
+        run = onnx_backend(make_ort_session(ONNX_INT8_PATH))
+    else:
+        run = torch_backend(BertForSequenceClassification.from_pretrained(MODEL_DIR))
+    return run, tokenizer
+
+
+def encode(tokenizer, texts):
+    """Tokenize a batch with per-batch padding, returning int64 numpy arrays."""
+    enc = tokenizer(texts, padding=True, truncation=True, max_length=MAX_LEN, return_tensors="np")
+    return {k: v.astype(np.int64) for k, v in enc.items()}
+
+
+def predict(run, batches):
+    """Score pre-tokenized batches; return P(criticism) and wall-clock seconds of model calls."""
+    probs = []
+    start = time.perf_counter()
+    for enc in batches:
+        probs.append(softmax_pos(run(enc)))
+    elapsed = time.perf_counter() - start
+    return np.concatenate(probs), elapsed
+
+
+def single_message_latency(run, tokenizer, texts, n: int = LATENCY_SAMPLES):
+    """Latency (ms) of one-message calls, as seen by ad-hoc scoring."""
+    run(encode(tokenizer, texts[:1]))  # warm-up
+    lat = []
+    for text in texts[:n]:
+        t0 = time.perf_counter()
+        run(encode(tokenizer, [text]))
+        lat.append((time.perf_counter() - t0) * 1000)
+    lat = np.asarray(lat)
+    return {"p50_ms": float(np.percentile(lat, 50)), "p95_ms": float(np.percentile(lat, 95)),
+            "mean_ms": float(lat.mean())}
+
+
+def evaluate_backend(name, run, tokenizer, texts, batches, y_true, ref_probs=None):
+    """Throughput, latency, report and (optionally) parity against reference probabilities."""
+    probs, elapsed = predict(run, batches)
+    y_hat = (probs >= THRESHOLD).astype(int)
+    result = {
+        "backend": name,
+        "messages": len(texts),
+        "seconds": elapsed,
+        "messages_per_sec": len(texts) / elapsed if elapsed > 0 else float("nan"),
+        "latency": single_message_latency(run, tokenizer, texts),
+        "classification_report": classification_report(y_true, y_hat, digits=3, output_dict=True),
+    }
+    if ref_probs is not None:
+        ref_hat = (ref_probs >= THRESHOLD).astype(int)
+        result["parity"] = {
+            "label_agreement": float((ref_hat == y_hat).mean()),
+            "max_abs_prob_diff": float(np.abs(ref_probs - probs).max()),
+            "mean_abs_prob_diff": float(np.abs(ref_probs - probs).mean()),
+        }
+    return result, probs
+
+
+def print_result(res):
+    print(f"\n=== {res['backend']} ===")
+    print(f"Throughput: {res['messages_per_sec']:.1f} msg/s "
+          f"({res['messages']} messages in {res['seconds']:.2f}s, batch={INFER_BATCH_SIZE})")
+    lat = res["latency"]
+    print(f"Single-message latency: p50={lat['p50_ms']:.1f} ms  p95={lat['p95_ms']:.1f} ms")
+    rep = res["classification_report"]
+    print(f"Accuracy: {rep['accuracy']:.3f} | F1 (criticism): {rep['1']['f1-score']:.3f} "
+          f"| Macro F1: {rep['macro avg']['f1-score']:.3f}")
+    if "parity" in res:
+        p = res["parity"]
+        print(f"Parity vs PyTorch: label agreement={p['label_agreement']:.4f}  "
+              f"max |Δp|={p['max_abs_prob_diff']:.4f}  mean |Δp|={p['mean_abs_prob_diff']:.5f}")
+
+
+def main():
+    torch.set_num_threads(NUM_THREADS)
+
+    print(f" Loading fine-tuned model from: {MODEL_DIR}")
+    tokenizer = BertTokenizerFast.from_pretrained(MODEL_DIR)
+    model = BertForSequenceClassification.from_pretrained(MODEL_DIR).eval()
+
+    export_onnx(model, tokenizer, ONNX_PATH)
+    if QUANTIZE:
+        quantize_onnx(ONNX_PATH, ONNX_INT8_PATH)
+
+    # Same stratified split as training, so the numbers are comparable with the model card
+    df = load_data(DATA_PATH)
+    _, test_ds, test_texts = make_hf_datasets(df)
+    y_true = np.asarray(test_ds["label"], dtype=int)
+    # Tokenization comes from the shared on-disk cache; throughput below is model time only
+    batches = list(padded_batches(tokenize_cached(test_ds, tokenizer), tokenizer, INFER_BATCH_SIZE))
+    print(f" Scoring {len(test_texts)} held-out messages on CPU ({NUM_THREADS} threads)")
+
+    results = []
+    res_pt, ref_probs = evaluate_backend("pytorch-fp32", torch_backend(model), tokenizer, test_texts,
+                                        batches, y_true)
+    results.append(res_pt)
+
+    backends = [("onnxruntime-fp32", ONNX_PATH)]
+    if QUANTIZE:
+        backends.append(("onnxruntime-int8", ONNX_INT8_PATH))
+    for name, path in backends:
+        res, _ = evaluate_backend(name, onnx_backend(make_ort_session(path)), tokenizer,
+                                  test_texts, batches, y_true, ref_probs=ref_probs)
+        res["model_size_mb"] = os.path.getsize(path) / 2**20
+        results.append(res)
+
+    for res in results:
+        print_result(res)
+
+    with open(OUT_BENCHMARK, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n Benchmark saved to: {OUT_BENCHMARK}")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,9 @@ to classify whether a message contains criticism of Russian authorities.
 
 import os
 import json
+import time
+import shutil
+import hashlib
 import numpy as np
 import pandas as pd
 
@@ -18,11 +21,13 @@ from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
 
 import torch
-from datasets import Dataset
+from datasets import Dataset, load_from_disk
 from transformers import (
-    BertTokenizer,
+    BertTokenizerFast,
     BertForSequenceClassification,
+    DataCollatorWithPadding,
     Trainer,
+    TrainerCallback,
     TrainingArguments,
 )
 
@@ -32,15 +37,21 @@ from transformers import (
 DATA_PATH = "data/Training_Dataset.csv"   # expects columns: message, is_criticism
 OUTPUT_DIR = "outputs"
 MODEL_DIR = os.path.join(OUTPUT_DIR, "models", "rubert_criticism_classifier")
+BASE_MODEL = "DeepPavlov/rubert-base-cased"
 
 RANDOM_SEED = 42
-MAX_LEN = 128
+MAX_LEN = int(os.getenv("MAX_LEN", 128))   # truncation length; raise for long posts (model limit 512)
+DYNAMIC_PADDING = os.getenv("DYNAMIC_PADDING", "1") == "1"  # 0 = pad every example to MAX_LEN
 BATCH_SIZE = 8
 EPOCHS = 3
 LR = 2e-5
 WEIGHT_DECAY = 0.01
 THRESHOLD = 0.5  # probability threshold for label=1
 
+TOKENIZED_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache", "tokenized")
+TOKENIZE_NUM_PROC = int(os.getenv("TOKENIZE_NUM_PROC", min(4, os.cpu_count() or 1)))
+TOKENIZE_PARALLEL_MIN = 10_000   # rows from which tokenization is spread over TOKENIZE_NUM_PROC processes
+
 
 def ensure_dirs():
     """Create output directories if they don’t exist."""
@@ -77,18 +88,136 @@ def make_hf_datasets(df: pd.DataFrame):
     return train_ds, test_ds, test_texts
 
 
-def tokenize_datasets(train_ds: Dataset, test_ds: Dataset, tokenizer):
-    """Tokenize texts and convert to Torch format."""
-    def _tok(ex):
-        return tokenizer(ex["text"], padding="max_length", truncation=True, max_length=MAX_LEN)
+def tokenization_cache_key(texts, tokenizer, max_len: int, padding) -> str:
+    """Cache key from the text content, the tokenizer definition and the length settings.
+
+    The tokenizer is identified by its serialized vocabulary/normalizer rather than its path,
+    so the base tokenizer and the copy saved in MODEL_DIR share cache entries.
+    """
+    h = hashlib.sha256()
+    for t in texts:
+        h.update(t.encode("utf-8"))
+        h.update(b"\0")
+    spec = json.loads(tokenizer.backend_tokenizer.to_str())
+    spec.pop("truncation", None)  # runtime state set by the last call, not part of the vocabulary
+    spec.pop("padding", None)
+    tok_id = hashlib.sha256(json.dumps(spec, sort_keys=True).encode("utf-8")).hexdigest()
+    key = hashlib.sha256(f"{h.hexdigest()}|{tok_id}|{max_len}|{padding}".encode()).hexdigest()[:16]
+    return f"len{max_len}-{key}"
+
+
+def tokenize_cached(ds: Dataset, tokenizer, max_len: int = MAX_LEN, padding=False) -> Dataset:
+    """Tokenize the `text` column with the fast tokenizer, reusing the on-disk Arrow cache.
+
+    Only token columns (plus `length`, the non-pad token count) are cached; every other
+    column of `ds` (e.g. `label`) is re-attached, so the same cache entry serves training
+    and batch inference regardless of labels.
+
+    TOKENIZE_NUM_PROC worker processes are used only from TOKENIZE_PARALLEL_MIN rows up
+    (e.g. the unlabeled corpus in Distill_RuBERT_Student.py); smaller sets such as
+    Training_Dataset.csv are tokenized in-process, where pool start-up would cost more than
+    it saves. The entry is written to a temporary directory and renamed into place, so an
+    interrupted run never leaves a partial cache behind.
+    """
+    path = os.path.join(TOKENIZED_CACHE_DIR, tokenization_cache_key(ds["text"], tokenizer, max_len, padding))
+    if os.path.isdir(path):
+        print(f" Using cached tokenization: {path}")
+    else:
+        def _tok(ex):
+            enc = tokenizer(ex["text"], padding=padding, truncation=True, max_length=max_len)
+            enc["length"] = [int(sum(m)) for m in enc["attention_mask"]]  # non-pad tokens
+            return enc
+
+        num_proc = TOKENIZE_NUM_PROC if TOKENIZE_NUM_PROC > 1 and len(ds) >= TOKENIZE_PARALLEL_MIN else None
+        tokens = ds.select_columns(["text"]).map(_tok, batched=True, num_proc=num_proc, remove_columns=["text"])
+        tmp = f"{path}.tmp-{os.getpid()}"
+        tokens.save_to_disk(tmp)
+        try:
+            os.rename(tmp, path)
+        except OSError:
+            if not os.path.isdir(path):   # a concurrent writer (e.g. a CV worker) already renamed its copy
+                raise
+            shutil.rmtree(tmp)
+        print(f" Tokenized {len(tokens)} texts -> {path}")
+
+    out = load_from_disk(path)
+    for col in ds.column_names:
+        if col != "text":
+            out = out.add_column(col, ds[col])
+    return out
+
+
+def padded_batches(enc_ds: Dataset, tokenizer, batch_size: int):
+    """Yield per-batch padded int64 numpy encodings from a tokenized dataset (batch inference)."""
+    cols = [c for c in ("input_ids", "attention_mask", "token_type_ids") if c in enc_ds.column_names]
+    enc_ds = enc_ds.with_format(None)
+    for i in range(0, len(enc_ds), batch_size):
+        rows = enc_ds[i:i + batch_size]
+        batch = tokenizer.pad({c: rows[c] for c in cols}, padding=True, return_tensors="np")
+        yield {k: v.astype(np.int64) for k, v in batch.items()}
 
-    train_ds = train_ds.map(_tok, batched=True).remove_columns(["text"])
-    test_ds  = test_ds.map(_tok, batched=True).remove_columns(["text"])
+
+def tokenize_datasets(train_ds: Dataset, test_ds: Dataset, tokenizer):
+    """Tokenize texts (via the on-disk cache) and convert to Torch format.
+
+    With DYNAMIC_PADDING, sequences are left unpadded (the collator pads per batch)
+    and the `length` column is used for length-grouped sampling.
+    """
+    padding = False if DYNAMIC_PADDING else "max_length"
+    train_ds = tokenize_cached(train_ds, tokenizer, padding=padding)
+    test_ds  = tokenize_cached(test_ds, tokenizer, padding=padding)
     train_ds.set_format("torch")
     test_ds.set_format("torch")
     return train_ds, test_ds
 
 
+class EpochTimerCallback(TrainerCallback):
+    """Record wall-clock seconds of each training epoch (evaluation excluded)."""
+
+    def __init__(self):
+        self.epoch_seconds = []
+        self._start = None
+
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, args, state, control, **kwargs):
+        self.epoch_seconds.append(time.perf_counter() - self._start)
+
+
+def report_throughput(timer: EpochTimerCallback, train_ds: Dataset, report: dict) -> dict:
+    """Save epoch time and tokens/sec for this padding mode and compare with the other mode, if run."""
+    mode = "dynamic" if DYNAMIC_PADDING else "max_length"
+    tokens = int(sum(int(n) for n in train_ds["length"]))  # non-pad tokens per epoch
+    mean_epoch = float(np.mean(timer.epoch_seconds)) if timer.epoch_seconds else float("nan")
+    stats = {
+        "padding": mode,
+        "max_len": MAX_LEN,
+        "epoch_seconds": timer.epoch_seconds,
+        "mean_epoch_seconds": mean_epoch,
+        "train_tokens_per_epoch": tokens,
+        "tokens_per_sec": tokens / mean_epoch,
+        "examples_per_sec": len(train_ds) / mean_epoch,
+        "test_accuracy": report["accuracy"],
+        "test_macro_f1": report["macro avg"]["f1-score"],
+    }
+    with open(os.path.join(OUTPUT_DIR, f"rubert_train_throughput_{mode}.json"), "w", encoding="utf-8") as f:
+        json.dump(stats, f, ensure_ascii=False, indent=2)
+
+    print(f"\n Throughput ({mode} padding, max_len={MAX_LEN}): "
+          f"{mean_epoch:.1f} s/epoch, {stats['tokens_per_sec']:.0f} tokens/s")
+
+    other = os.path.join(OUTPUT_DIR, "rubert_train_throughput_{}.json".format(
+        "max_length" if DYNAMIC_PADDING else "dynamic"))
+    if os.path.exists(other):
+        with open(other, encoding="utf-8") as f:
+            ref = json.load(f)
+        print(f" vs {ref['padding']} padding: epoch time x{ref['mean_epoch_seconds'] / mean_epoch:.2f} faster, "
+              f"accuracy {stats['test_accuracy'] - ref['test_accuracy']:+.3f}, "
+              f"macro F1 {stats['test_macro_f1'] - ref['test_macro_f1']:+.3f}")
+    return stats
+
+
 def main():
     ensure_dirs()
     os.environ["WANDB_DISABLED"] = "true"
@@ -101,13 +230,11 @@ def main():
 
     # --- Split and tokenize ---
     train_ds, test_ds, test_texts = make_hf_datasets(df)
-    tokenizer = BertTokenizer.from_pretrained("DeepPavlov/rubert-base-cased")
+    tokenizer = BertTokenizerFast.from_pretrained(BASE_MODEL)
     train_ds, test_ds = tokenize_datasets(train_ds, test_ds, tokenizer)
 
     # --- Model and training setup ---
-    model = BertForSequenceClassification.from_pretrained(
-        "DeepPavlov/rubert-base-cased", num_labels=2
-    )
+    model = BertForSequenceClassification.from_pretrained(BASE_MODEL, num_labels=2)
 
     args = TrainingArguments(
         output_dir=os.path.join(OUTPUT_DIR, "results"),
@@ -116,6 +243,8 @@ def main():
         learning_rate=LR,
         per_device_train_batch_size=BATCH_SIZE,
         per_device_eval_batch_size=BATCH_SIZE,
+        group_by_length=DYNAMIC_PADDING,   # batches of similar length -> little padding
+        length_column_name="length",
         num_train_epochs=EPOCHS,
         weight_decay=WEIGHT_DECAY,
         load_best_model_at_end=True,
@@ -127,12 +256,15 @@ def main():
         seed=RANDOM_SEED,
     )
 
+    timer = EpochTimerCallback()
     trainer = Trainer(
         model=model,
         args=args,
         train_dataset=train_ds,
         eval_dataset=test_ds,
         tokenizer=tokenizer,
+        data_collator=DataCollatorWithPadding(tokenizer, pad_to_multiple_of=8 if DYNAMIC_PADDING else None),
+        callbacks=[timer],
     )
 
     # --- Training ---
@@ -158,6 +290,8 @@ def main():
     with open(os.path.join(OUTPUT_DIR, "rubert_test_confusion_matrix.json"), "w", encoding="utf-8") as f:
         json.dump({"confusion_matrix": cm, "labels": [0, 1]}, f, ensure_ascii=False, indent=2)
 
+    report_throughput(timer, train_ds, report)
+
     # --- FP / FN / TP / TN ---
     df_pred = pd.DataFrame({
         "text": test_texts,
@@ -9,23 +9,13 @@ Frame Counting by Cluster (Postgres or CSV)
 import os
 import re
 import sys
+import numpy as np
 import pandas as pd
 from pathlib import Path
 from collections import defaultdict, OrderedDict
-import psycopg2
 
-# ===== REQUIRED ENV VARS  =====
-def _get_env_required(name: str) -> str:
-    val = os.getenv(name)
-    if not val:
-        sys.exit(f"Environment variable {name} is required but not set.")
-    return val
-
-PGHOST = _get_env_required("PGHOST")
-PGPORT = int(_get_env_required("PGPORT"))
-PGDB   = _get_env_required("PGDATABASE")
-PGUSER = _get_env_required("PGUSER")
-PGPASS = _get_env_required("PGPASSWORD")
+from Compact_Corpus import count_flags_by, flag_bits, flag_dtype, iter_chunks
+from Dedup_Messages import dedup_messages
 
 # ===== SQL =====
 QUERY = """
@@ -40,6 +30,11 @@ ORDER BY "time" ASC
 OUT_COUNTS = Path("frame_counts_by_cluster.csv")
 OUT_PCTS   = Path("frame_percentages_by_cluster.csv")
 
+# ===== Lemmatizer / NLP worker =====
+LEMMA_MODEL = os.getenv("LEMMA_MODEL")   # e.g. ru_core_news_sm: load only this model instead of probing lg/md/sm
+NLP_WORKER = os.getenv("NLP_WORKER")     # socket path or host:port of a running NLP_Worker.py
+WORKER_BATCH_SIZE = 256
+
 # ===== Progress =====
 PROGRESS_EVERY = 500
 PRINT_ALL_CLUSTERS = True
@@ -103,10 +98,19 @@ FRAMES = OrderedDict({
 })
 
 # ===== Lemmatization  =====
+_LEMMATIZER = None
+
 def get_lemmatizer():
+    """Best available lemmatizer, loaded once per process."""
+    global _LEMMATIZER
+    if _LEMMATIZER is None:
+        _LEMMATIZER = _load_lemmatizer()
+    return _LEMMATIZER
+
+def _load_lemmatizer():
     try:
         import spacy
-        for model in ("ru_core_news_lg","ru_core_news_md","ru_core_news_sm"):
+        for model in ((LEMMA_MODEL,) if LEMMA_MODEL else ("ru_core_news_lg","ru_core_news_md","ru_core_news_sm")):
             try:
                 nlp = spacy.load(model, disable=["ner","textcat"])
                 def _lem(text: str) -> str:
@@ -140,6 +144,30 @@ def phrase_to_regex(lem_phrase: str):
 def contains_any(text: str, regex_list) -> bool:
     return any(r.search(text) is not None for r in regex_list)
 
+def compile_frame_regexes(lemmatize) -> dict:
+    """Frame -> regexes of its lemmatized key phrases."""
+    frame_regexes = {}
+    for frame, kws in FRAMES.items():
+        lem_phrases = [normalize_spaces(lemmatize(k)) for k in kws]
+        frame_regexes[frame] = [phrase_to_regex(p) for p in lem_phrases if p]
+    return frame_regexes
+
+def frames_in(msg: str, lemmatize, frame_regexes) -> list:
+    """Frames whose key phrases occur in the lemmatized message."""
+    text = normalize_spaces(lemmatize(msg))
+    return [frame for frame, regs in frame_regexes.items() if contains_any(text, regs)]
+
+def frame_hits(messages, lemmatize, frame_regexes):
+    """Frames found in each message; sent to the NLP worker in batches when NLP_WORKER is set."""
+    if not NLP_WORKER:
+        for msg in messages:
+            yield frames_in(msg, lemmatize, frame_regexes)
+        return
+    from NLP_Worker import call_worker
+    messages = list(messages)
+    for lo in range(0, len(messages), WORKER_BATCH_SIZE):
+        yield from call_worker("frames", messages[lo:lo + WORKER_BATCH_SIZE], NLP_WORKER)["frames"]
+
 # ===== Progress print  =====
 
 def print_progress(i, overall_counts, cluster_counts):
@@ -159,16 +187,15 @@ def print_progress(i, overall_counts, cluster_counts):
 
 # ===== Load from DB -> DataFrame =====
 def load_df_from_postgres():
-    conn = psycopg2.connect(
-        host=PGHOST, port=PGPORT, dbname=PGDB, user=PGUSER, password=PGPASS
-    )
+    """Fetch the corpus in chunks, each converted to the compact layout (see Compact_Corpus.py)."""
+    import psycopg2
+    from Compact_Corpus import read_postgres_compact
+    from Dependency_Parsing import get_pg_config
+
+    conn = psycopg2.connect(**get_pg_config())
     try:
-        with conn, conn.cursor() as cur:
-            cur.execute(QUERY)
-            rows = cur.fetchall()
-            colnames = [desc[0] for desc in cur.description]  # auto column names
-            df = pd.DataFrame(rows, columns=colnames)
-            return df
+        with conn:
+            return read_postgres_compact(conn, QUERY)
     finally:
         conn.close()
 
@@ -179,58 +206,61 @@ def main():
     if df.empty:
         sys.exit("Query returned no results. Please check your SQL filters or connection settings.")
 
-    # Lemmatizer
-    lemmatize, used = get_lemmatizer()
+    # Lemmatizer (local, or the one kept warm by the NLP worker)
+    if NLP_WORKER:
+        from NLP_Worker import worker_health
+        lemmatize, frame_regexes = None, None
+        used = f"worker:{worker_health(NLP_WORKER)['lemmatizer']}"
+    else:
+        lemmatize, used = get_lemmatizer()
+        # Compile regexes per frame (lemmatized phrases)
+        frame_regexes = compile_frame_regexes(lemmatize)
     print(f"[LEMMA] active lemmatization backend: {used}")
 
-    # Compile regexes per frame (lemmatized phrases)
-    frame_regexes = {}
-    for frame, kws in FRAMES.items():
-        lem_phrases = [normalize_spaces(lemmatize(k)) for k in kws]
-        frame_regexes[frame] = [phrase_to_regex(p) for p in lem_phrases if p]
+    # Reposts are scanned once: frames are found for canonical texts and fanned out
+    # (DEDUP=near also folds near duplicates, DEDUP=off disables);
+    # progress counts below are over the scanned texts, the output tables over all messages
+    groups = dedup_messages(df["message"], df["time"] if "time" in df.columns else None)
+    todo = groups.canonical_positions if groups is not None else np.arange(len(df))
 
-    # Scan + progress
-    n = len(df)
-    results = {frame: [False]*n for frame in FRAMES}
+    # Scan + progress: frames found per message as packed bit flags, one chunk of messages at a time
+    n = len(todo)
+    bits = flag_bits(FRAMES)
+    flags = np.zeros(n, dtype=flag_dtype(len(FRAMES)))
     overall_counts = {frame: 0 for frame in FRAMES}
     cluster_counts = defaultdict(lambda: {frame: 0 for frame in FRAMES})
     cluster_totals = defaultdict(int)
 
-    for i, (msg, cl) in enumerate(zip(df["message"].fillna("").astype(str),
-                                      df["cluster"]), start=1):
-        text = normalize_spaces(lemmatize(msg))
-        cluster_totals[cl] += 1
-        for frame, regs in frame_regexes.items():
-            if contains_any(text, regs):
-                results[frame][i-1]   = True
+    for lo, hi in iter_chunks(n):
+        messages = df["message"].iloc[todo[lo:hi]].fillna("").tolist()
+        for i, (found, cl) in enumerate(zip(frame_hits(messages, lemmatize, frame_regexes),
+                                            df["cluster"].iloc[todo[lo:hi]].tolist()), start=lo + 1):
+            cluster_totals[cl] += 1
+            for frame in found:
+                flags[i-1]            |= bits[frame]
                 overall_counts[frame] += 1
                 cluster_counts[cl][frame] += 1
 
-        if i % PROGRESS_EVERY == 0 or i == n:
-            print_progress(i, overall_counts, cluster_counts)
+            if i % PROGRESS_EVERY == 0 or i == n:
+                print_progress(i, overall_counts, cluster_counts)
+
+    if groups is not None:
+        flags = groups.fan_out(flags)
 
     #  Output tables
-    for frame in FRAMES:
-        df["has__"+frame] = results[frame]
-
-    count_cols = [c for c in df.columns if c.startswith("has__")]
-    cluster_totals_df = (
-        df.groupby("cluster", dropna=False)["message"]
-          .count().rename("total_messages").reset_index()
-    )
-    counts = df.groupby("cluster", dropna=False)[count_cols].sum().reset_index()
-    for c in count_cols:
-        counts[c] = counts[c].astype(int)
-    counts = counts.merge(cluster_totals_df, on="cluster", how="left")
+    clusters = df["cluster"].astype("category")
+    codes = clusters.cat.codes.to_numpy()
+    counts = pd.DataFrame(count_flags_by(codes, len(clusters.cat.categories), flags, len(FRAMES)),
+                          columns=list(FRAMES))
+    counts.insert(0, "cluster", clusters.cat.categories)
+    counts["total_messages"] = np.bincount(codes, weights=df["message"].notna().to_numpy(),
+                                           minlength=len(clusters.cat.categories)).astype(int)
+    counts = counts[np.bincount(codes, minlength=len(clusters.cat.categories)) > 0].reset_index(drop=True)
 
     pct = counts.copy()
-    for c in count_cols:
+    for c in FRAMES:
         pct[c] = (pct[c] / pct["total_messages"] * 100).round(2)
 
-    rename_map = {c: c.replace("has__","") for c in count_cols}
-    counts = counts.rename(columns=rename_map)
-    pct    = pct.rename(columns=rename_map)
-
     # CSV output
     counts.to_csv(OUT_COUNTS, index=False)
     pct.to_csv(OUT_PCTS, index=False)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Local HTTP/1.1 Helpers (asyncio servers and their clients)
+==========================================================
+
+The request loop, JSON responses and client connections shared by Criticism_Inference_Server.py
+and NLP_Worker.py. A server supplies one route coroutine; `serve_connection` handles framing,
+keep-alive and errors for it:
+
+- a malformed request line or Content-Length -> 400 and the connection is closed;
+- a body above MAX_BODY_BYTES -> 413 and the connection is closed;
+- HTTPError raised by the route -> its status; any other exception -> 500 (keep-alive kept,
+  since the request was read completely).
+
+Clients connect over TCP or a Unix socket with `connection(...)`.
+
+Dependencies
+------------
+standard library only
+"""
+
+import json
+import socket
+import asyncio
+import http.client
+
+# ========================
+# CONFIGURATION
+# ========================
+MAX_BODY_BYTES = 16 * 2**20
+
+
+class HTTPError(Exception):
+    """Raised by a route to answer with `status` and {"error": message}."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ----------------- server side -----------------
+def json_response(status: int, payload: dict, keep_alive: bool) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    reason = http.client.responses.get(status, "")
+    head = (f"HTTP/1.1 {status} {reason}\r\n"
+            f"Content-Type: application/json; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("ascii") + body
+
+
+def json_object(body: bytes) -> dict:
+    """Decode a request body that must be a JSON object (empty body -> {}); HTTPError 400 otherwise."""
+    try:
+        payload = json.loads(body or b"{}")
+    except ValueError as e:
+        raise HTTPError(400, f"invalid JSON: {e}")
+    if not isinstance(payload, dict):
+        raise HTTPError(400, "body must be a JSON object")
+    return payload
+
+
+def string_list(payload: dict, key: str) -> list:
+    """payload[key] checked to be a list of strings; HTTPError 400 otherwise."""
+    value = payload.get(key)
+    if not isinstance(value, list) or not all(isinstance(v, str) for v in value):
+        raise HTTPError(400, f"'{key}' must be a list of strings")
+    return value
+
+
+async def serve_connection(reader, writer, route):
+    """
+    Serve HTTP/1.1 requests on one connection (keep-alive supported).
+    route(method, path, body) is a coroutine returning (status, payload).
+    """
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, path, version = request_line.decode("latin-1").split()
+            except ValueError:
+                writer.write(json_response(400, {"error": "bad request line"}, False))
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                k, _, v = line.decode("latin-1").partition(":")
+                headers[k.strip().lower()] = v.strip()
+            keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+            length = headers.get("content-length", "0") or "0"
+            if not length.isdigit():   # body framing unknown: answer and close
+                writer.write(json_response(400, {"error": "invalid Content-Length"}, False))
+                break
+            length = int(length)
+            if length > MAX_BODY_BYTES:
+                writer.write(json_response(413, {"error": "body too large"}, False))
+                break
+            body = await reader.readexactly(length) if length else b""
+
+            try:
+                status, payload = await route(method, path, body)
+            except HTTPError as e:
+                status, payload = e.status, {"error": str(e)}
+            except Exception as e:   # the request was read completely, so the connection stays usable
+                status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+            writer.write(json_response(status, payload, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+# ----------------- client side -----------------
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path: str, timeout: float = 60):
+        super().__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+def connection(host=None, port=None, socket_path=None, timeout: float = 60):
+    """HTTP connection to a local server on a Unix socket (if given) or host:port."""
+    if socket_path:
+        return UnixHTTPConnection(socket_path, timeout=timeout)
+    return http.client.HTTPConnection(host, port, timeout=timeout)
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+ruBERT Criticism Classifier — Sliding-Window Scoring with Sequence Packing
+==========================================================================
+
+The classifier from Fine_Tune_RuBERT_Criticism.py sees the first MAX_LEN tokens of a message;
+most Training_Dataset.csv posts are longer (median ~900 characters), and per-batch padding
+spends compute on pad tokens. This script scores full messages instead:
+
+1. windows — each message is cut into overlapping windows of WINDOW_LEN tokens
+   ([CLS] + body + [SEP], WINDOW_OVERLAP tokens shared between neighbours); short messages
+   are a single window;
+2. packing — windows are packed best-fit into rows of PACK_LEN tokens (several windows per
+   row, PACK_ROWS rows per batch); a block-diagonal attention mask keeps windows from seeing
+   each other and position ids restart at every window, so each window gets the same logits
+   as if it were scored alone. Rows default to one window length: full windows fill a row
+   alone and short posts share rows. Longer rows pack more densely, but on CPU the masked
+   attention over the whole row costs more than the padding saved;
+3. aggregation — window logits are combined per message by max (most critical window) or
+   mean of the logit margin.
+
+Evaluation mode (default) scores the held-out split with truncation (the current behaviour),
+windows with length-sorted padded batches, and windows with packing, and reports accuracy /
+F1 overall and on long messages, tokens processed per second and the share of padding.
+INPUT_PATH=<csv with a message column> scores that file with packed windows instead.
+
+Dependencies
+------------
+pip install torch transformers scikit-learn
+"""
+
+import os
+import json
+import time
+import numpy as np
+import pandas as pd
+
+from sklearn.metrics import classification_report
+
+import torch
+from transformers import BertTokenizerFast, BertForSequenceClassification
+
+from Fine_Tune_RuBERT_Criticism import (
+    DATA_PATH,
+    OUTPUT_DIR,
+    MODEL_DIR,
+    MAX_LEN,
+    THRESHOLD,
+    load_data,
+    make_hf_datasets,
+)
+from Export_RuBERT_ONNX import NUM_THREADS, INFER_BATCH_SIZE, torch_backend
+
+# ========================
+# CONFIGURATION
+# ========================
+WINDOW_LEN = int(os.getenv("WINDOW_LEN", MAX_LEN))          # tokens per window incl. [CLS]/[SEP]
+WINDOW_OVERLAP = int(os.getenv("WINDOW_OVERLAP", 32))       # tokens shared by consecutive windows
+PACK_LEN = int(os.getenv("PACK_LEN", WINDOW_LEN))           # tokens per packed row (model limit 512)
+PACK_ROWS = int(os.getenv("PACK_ROWS", INFER_BATCH_SIZE))   # rows per packed batch
+AGGREGATIONS = ("max", "mean")
+INPUT_PATH = os.getenv("INPUT_PATH")                        # score a CSV instead of evaluating
+
+OUT_REPORT = os.path.join(OUTPUT_DIR, "rubert_long_message_report.json")
+OUT_SCORES = os.path.join(OUTPUT_DIR, "long_message_scores.csv")
+
+
+# ----------------- windows -----------------
+def window_spans(n_tokens: int, body: int = WINDOW_LEN - 2, overlap: int = WINDOW_OVERLAP):
+    """(start, end) token spans covering n_tokens; the last window is aligned to the end."""
+    if n_tokens <= body:
+        return [(0, n_tokens)]
+    stride = body - overlap
+    n = -(-(n_tokens - body) // stride) + 1
+    return [(min(i * stride, n_tokens - body), min(i * stride, n_tokens - body) + body) for i in range(n)]
+
+
+def make_windows(tokenizer, texts, max_windows: int = None):
+    """
+    Token id windows ([CLS] body [SEP]) of every text, in text order, with the owning text of
+    each window and the token count of each text. max_windows=1 is plain truncation.
+    """
+    ids = tokenizer(list(texts), add_special_tokens=False, truncation=False, verbose=False)["input_ids"]
+    windows, owner = [], []
+    for i, toks in enumerate(ids):
+        for s, e in window_spans(len(toks))[:max_windows]:
+            windows.append([tokenizer.cls_token_id] + toks[s:e] + [tokenizer.sep_token_id])
+            owner.append(i)
+    return windows, np.asarray(owner), np.fromiter(map(len, ids), dtype=np.int64, count=len(ids))
+
+
+def aggregate(logits: np.ndarray, owner: np.ndarray, n_texts: int, how: str = "max") -> np.ndarray:
+    """P(criticism) per text from window logits: max or mean of the logit margin over its windows."""
+    margin = logits[:, 1] - logits[:, 0]
+    starts = np.searchsorted(owner, np.arange(n_texts))
+    if how == "max":
+        agg = np.maximum.reduceat(margin, starts)
+    else:
+        agg = np.add.reduceat(margin, starts) / np.bincount(owner, minlength=n_texts)
+    return 1 / (1 + np.exp(-agg))   # two-class softmax of the aggregated margin
+
+
+# ----------------- padded batches -----------------
+def pad_encoding(windows, pad_id: int) -> dict:
+    """int64 numpy encoding of token id lists padded to the longest one."""
+    lengths = [len(w) for w in windows]
+    ids = np.full((len(windows), max(lengths)), pad_id, dtype=np.int64)
+    for r, w in enumerate(windows):
+        ids[r, :len(w)] = w
+    mask = (np.arange(ids.shape[1]) < np.asarray(lengths)[:, None]).astype(np.int64)
+    return {"input_ids": ids, "attention_mask": mask, "token_type_ids": np.zeros_like(ids)}
+
+
+def score_padded(run, windows, pad_id: int, batch_size: int = INFER_BATCH_SIZE, sort: bool = True):
+    """Window logits (window order) from padded batches; windows are length-sorted unless sort=False."""
+    order = np.argsort([len(w) for w in windows], kind="stable") if sort else np.arange(len(windows))
+    logits = np.empty((len(windows), 2), dtype=np.float32)
+    computed, t0 = 0, time.perf_counter()
+    for i in range(0, len(order), batch_size):
+        idx = order[i:i + batch_size]
+        enc = pad_encoding([windows[j] for j in idx], pad_id)
+        logits[idx] = run(enc)
+        computed += enc["input_ids"].size
+    return logits, time.perf_counter() - t0, computed
+
+
+# ----------------- packed batches -----------------
+def pack_rows(lengths, pack_len: int = PACK_LEN):
+    """Best-fit decreasing: window indices per row, each row holding at most pack_len tokens."""
+    rows = []
+    by_free = [[] for _ in range(pack_len + 1)]    # free space -> rows with exactly that much left
+    for w in np.argsort(lengths, kind="stable")[::-1]:
+        n = int(lengths[w])
+        f = next((f for f in range(n, pack_len + 1) if by_free[f]), None)
+        if f is None:
+            r, f = len(rows), pack_len
+            rows.append([])
+        else:
+            r = by_free[f].pop()
+        rows[r].append(int(w))
+        by_free[f - n].append(r)
+    return rows
+
+
+def packed_batch(rows, windows, pad_id: int) -> dict:
+    """Torch inputs for rows of packed windows: block-diagonal mask, per-window positions."""
+    width = max(sum(len(windows[w]) for w in row) for row in rows)
+    ids = np.full((len(rows), width), pad_id, dtype=np.int64)
+    pos = np.zeros_like(ids)
+    seg = np.full(ids.shape, -1, dtype=np.int64)     # padding forms its own block
+    cls_row, cls_col, members = [], [], []
+    for r, row in enumerate(rows):
+        c = 0
+        for w in row:
+            n = len(windows[w])
+            ids[r, c:c + n] = windows[w]
+            pos[r, c:c + n] = np.arange(n)
+            seg[r, c:c + n] = w
+            cls_row.append(r)
+            cls_col.append(c)
+            members.append(w)
+            c += n
+    seg = torch.from_numpy(seg)
+    return {"input_ids": torch.from_numpy(ids), "position_ids": torch.from_numpy(pos),
+            "token_type_ids": torch.zeros(ids.shape, dtype=torch.long),
+            "attention_mask": (seg[:, :, None] == seg[:, None, :])[:, None],
+            "cls": (torch.tensor(cls_row), torch.tensor(cls_col)), "windows": np.asarray(members)}
+
+
+def packed_logits(model, batch) -> np.ndarray:
+    """Classifier logits at every window's [CLS] position (BertForSequenceClassification head)."""
+    hidden = model.bert(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"],
+                        position_ids=batch["position_ids"],
+                        token_type_ids=batch["token_type_ids"]).last_hidden_state
+    cls = hidden[batch["cls"]]
+    pooled = model.bert.pooler.activation(model.bert.pooler.dense(cls))
+    return model.classifier(pooled).numpy()
+
+
+def score_packed(model, windows, pad_id: int, pack_len: int = PACK_LEN, pack_rows_per_batch: int = PACK_ROWS):
+    """Window logits (window order) from packed batches of pack_rows_per_batch x pack_len tokens."""
+    rows = pack_rows(np.fromiter(map(len, windows), dtype=np.int64, count=len(windows)), pack_len)
+    logits = np.empty((len(windows), 2), dtype=np.float32)
+    computed, t0 = 0, time.perf_counter()
+    with torch.inference_mode():
+        for i in range(0, len(rows), pack_rows_per_batch):
+            batch = packed_batch(rows[i:i + pack_rows_per_batch], windows, pad_id)
+            logits[batch["windows"]] = packed_logits(model, batch)
+            computed += batch["input_ids"].numel()
+    return logits, time.perf_counter() - t0, computed
+
+
+def score_texts(model, tokenizer, texts) -> dict:
+    """P(criticism) per text for each aggregation, from packed sliding windows."""
+    windows, owner, _ = make_windows(tokenizer, texts)
+    logits, _, _ = score_packed(model, windows, tokenizer.pad_token_id)
+    return {how: aggregate(logits, owner, len(texts), how) for how in AGGREGATIONS}
+
+
+# ----------------- evaluation -----------------
+def summarize(y_true, probs) -> dict:
+    rep = classification_report(y_true, (np.asarray(probs) >= THRESHOLD).astype(int), digits=3,
+                                output_dict=True, zero_division=0)
+    return {"accuracy": rep["accuracy"], "f1_criticism": rep.get("1", {}).get("f1-score", 0.0),
+            "macro_f1": rep["macro avg"]["f1-score"]}
+
+
+def load_model():
+    tokenizer = BertTokenizerFast.from_pretrained(MODEL_DIR)
+    model = BertForSequenceClassification.from_pretrained(MODEL_DIR).eval()
+    return model, tokenizer
+
+
+def evaluate(model, tokenizer, texts, y_true) -> list:
+    """Truncation vs padded windows vs packed windows on the same texts."""
+    pad_id = tokenizer.pad_token_id
+    run = torch_backend(model)
+    truncated, _, n_tokens = make_windows(tokenizer, texts, max_windows=1)
+    windows, owner, _ = make_windows(tokenizer, texts)
+    long = n_tokens > WINDOW_LEN - 2
+    score_padded(run, windows[:INFER_BATCH_SIZE], pad_id)   # warm-up
+
+    modes = [
+        ("truncate", truncated, np.arange(len(texts)),
+         lambda: score_padded(run, truncated, pad_id, sort=False), ("max",)),
+        ("windows-padded", windows, owner, lambda: score_padded(run, windows, pad_id), AGGREGATIONS),
+        ("windows-packed", windows, owner, lambda: score_packed(model, windows, pad_id), AGGREGATIONS),
+    ]
+    results, ref = [], None
+    for name, wins, own, score, aggs in modes:
+        logits, seconds, computed = score()
+        real = sum(map(len, wins))
+        res = {"mode": name, "messages": len(texts), "long_messages": int(long.sum()), "windows": len(wins),
+               "tokens": real, "computed_tokens": int(computed), "padding_share": 1 - real / computed,
+               "seconds": seconds, "tokens_per_sec": real / seconds, "messages_per_sec": len(texts) / seconds}
+        for how in aggs:
+            probs = aggregate(logits, own, len(texts), how)
+            res[how] = {"all": summarize(y_true, probs), "long": summarize(y_true[long], probs[long])}
+        if name == "windows-padded":
+            ref = logits
+        elif ref is not None:
+            res["max_abs_logit_diff_vs_padded"] = float(np.abs(logits - ref).max())
+        results.append(res)
+    return results
+
+
+def print_results(results):
+    print(f"\n{'mode':<16}{'agg':<6}{'acc':>7}{'F1':>7}{'acc long':>10}{'F1 long':>9}"
+          f"{'tok/s':>9}{'msg/s':>8}{'padding':>9}")
+    for res in results:
+        for how in AGGREGATIONS:
+            if how in res:
+                a, l = res[how]["all"], res[how]["long"]
+                print(f"{res['mode']:<16}{how:<6}{a['accuracy']:>7.3f}{a['f1_criticism']:>7.3f}"
+                      f"{l['accuracy']:>10.3f}{l['f1_criticism']:>9.3f}{res['tokens_per_sec']:>9.0f}"
+                      f"{res['messages_per_sec']:>8.1f}{res['padding_share']:>9.1%}")
+    packed = next(r for r in results if r["mode"] == "windows-packed")
+    print(f"\n {packed['long_messages']} of {packed['messages']} messages exceed {WINDOW_LEN} tokens; "
+          f"{packed['windows']} windows; packed vs padded max |Δlogit| = "
+          f"{packed.get('max_abs_logit_diff_vs_padded', float('nan')):.2e}")
+
+
+# ----------------- main -----------------
+def main():
+    torch.set_num_threads(NUM_THREADS)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    print(f" Loading fine-tuned model from: {MODEL_DIR}")
+    model, tokenizer = load_model()
+
+    if INPUT_PATH:
+        df = pd.read_csv(INPUT_PATH)
+        texts = df["message"].fillna("").astype(str).tolist()
+        t0 = time.perf_counter()
+        probs = score_texts(model, tokenizer, texts)
+        for how in AGGREGATIONS:
+            df[f"prob_criticism_{how}"] = probs[how]
+        df.to_csv(OUT_SCORES, index=False)
+        print(f" Scored {len(texts)} messages in {time.perf_counter() - t0:.1f}s -> {OUT_SCORES}")
+        return
+
+    # Same stratified split as training, so the numbers are comparable with the model card
+    _, test_ds, test_texts = make_hf_datasets(load_data(DATA_PATH))
+    y_true = np.asarray(test_ds["label"], dtype=int)
+    print(f" Scoring {len(test_texts)} held-out messages on CPU ({NUM_THREADS} threads); "
+          f"windows of {WINDOW_LEN} tokens, overlap {WINDOW_OVERLAP}, packed {PACK_ROWS} x {PACK_LEN}")
+    results = evaluate(model, tokenizer, test_texts, y_true)
+    print_results(results)
+
+    with open(OUT_REPORT, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n Report saved to: {OUT_REPORT}")
+
+
+if __name__ == "__main__":
+    main()
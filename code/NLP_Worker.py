@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Resident NLP Worker (warm spaCy pipelines over a local socket)
+==============================================================
+
+Loading ru_core_news_lg (and probing lemmatizer models) costs several seconds and hundreds of
+MB per run, which dominates short jobs such as a single channel or a test. This worker loads the
+pipelines once and serves jobs until stopped; Dependency_Parsing.py and
+Frame_Frequency_Analysis.py act as clients when NLP_WORKER is set to its address.
+
+Endpoints (POST bodies are {"texts": ["...", ...]})
+---------------------------------------------------
+POST /parse      -> {"docs": [[[text, lemma, pos, dep, head_index], ...], ...]}
+POST /lemmatize  -> {"lemmas": [...]}            (Frame_Frequency_Analysis lemmatizer)
+POST /rules      -> {"is_criticism": [0/1, ...]} (Dependency_Parsing rule detector)
+POST /frames     -> {"frames": [[frame, ...], ...]}
+GET  /health     -> loaded pipelines, load times, jobs served
+
+Jobs run one at a time on a dedicated thread (spaCy pipelines are not shared across threads).
+
+Usage
+-----
+python code/NLP_Worker.py                                   # listens on /tmp/nlp_worker.sock
+NLP_WORKER=/tmp/nlp_worker.sock python code/Dependency_Parsing.py
+NLP_WORKER=127.0.0.1:8766 ...                               # TCP instead of a Unix socket
+"""
+
+import os
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from Local_HTTP import HTTPError, connection, json_object, serve_connection, string_list
+
+# ========================
+# CONFIGURATION
+# ========================
+NLP_WORKER_ADDRESS = os.getenv("NLP_WORKER", "/tmp/nlp_worker.sock")   # Unix socket path or host:port
+PRELOAD = [p for p in os.getenv("NLP_WORKER_PRELOAD", "rules,lemmatize").split(",") if p]
+CLIENT_TIMEOUT = 600               # seconds per request (a batch of spaCy parses)
+PIPE_BATCH_SIZE = 64
+
+
+def parse_address(address: str):
+    """(host, port, socket_path) for a 'host:port' or a Unix socket path."""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return host, int(port), None
+    return None, None, address
+
+
+# ----------------- worker side -----------------
+class NLPWorker:
+    """Pipelines loaded on first use (or at start via NLP_WORKER_PRELOAD) and kept warm."""
+
+    def __init__(self):
+        self.load_seconds = {}
+        self.jobs = {}
+        self.texts = 0
+        self.busy_seconds = 0.0
+        self.started = time.time()
+        self._frames = None
+        self.lemmatizer = None
+
+    def _timed_load(self, name, load):
+        t0 = time.perf_counter()
+        out = load()
+        self.load_seconds.setdefault(name, round(time.perf_counter() - t0, 3))
+        return out
+
+    def nlp(self):
+        import Dependency_Parsing as rules
+        return self._timed_load("rules", rules.get_nlp)[0]
+
+    def lemmatize_fn(self):
+        import Frame_Frequency_Analysis as ffa
+        lemmatize, self.lemmatizer = self._timed_load("lemmatize", ffa.get_lemmatizer)
+        return lemmatize
+
+    def frames_state(self):
+        if self._frames is None:
+            import Frame_Frequency_Analysis as ffa
+            lemmatize = self.lemmatize_fn()
+            self._frames = (lemmatize, ffa.compile_frame_regexes(lemmatize))
+        return self._frames
+
+    def preload(self, names):
+        loaders = {"rules": self.nlp, "parse": self.nlp, "lemmatize": self.lemmatize_fn,
+                   "frames": self.frames_state}
+        for name in names:
+            try:
+                loaders[name]()
+                print(f" Loaded {name} pipeline in {self.load_seconds.get(name, 0):.1f}s")
+            except (OSError, ImportError) as e:
+                print(f" Warning: could not preload {name}: {e}")
+
+    def run(self, job: str, texts):
+        """Execute one job on the worker thread."""
+        t0 = time.perf_counter()
+        if job == "parse":
+            docs = self.nlp().pipe(texts, batch_size=PIPE_BATCH_SIZE)
+            out = {"docs": [[[t.text, t.lemma_, t.pos_, t.dep_, t.head.i] for t in doc] for doc in docs]}
+        elif job == "rules":
+            import Dependency_Parsing as rules
+            self.nlp()
+            out = {"is_criticism": [int(f) for f in rules.criticism_flags(texts, PIPE_BATCH_SIZE)]}
+        elif job == "lemmatize":
+            lemmatize = self.lemmatize_fn()
+            out = {"lemmas": [lemmatize(t) for t in texts]}
+        else:  # frames
+            import Frame_Frequency_Analysis as ffa
+            lemmatize, regexes = self.frames_state()
+            out = {"frames": [ffa.frames_in(t, lemmatize, regexes) for t in texts]}
+        self.busy_seconds += time.perf_counter() - t0
+        self.jobs[job] = self.jobs.get(job, 0) + 1
+        self.texts += len(texts)
+        return out
+
+    def health(self) -> dict:
+        return {"status": "ok", "pid": os.getpid(), "uptime_seconds": round(time.time() - self.started, 1),
+                "loaded": self.load_seconds, "lemmatizer": self.lemmatizer, "jobs": self.jobs,
+                "texts": self.texts, "busy_seconds": round(self.busy_seconds, 3)}
+
+
+JOBS = ("parse", "lemmatize", "rules", "frames")
+
+
+async def handle_connection(reader, writer, worker: NLPWorker, executor):
+    """Serve HTTP/1.1 requests on one connection (keep-alive and error handling in Local_HTTP.py)."""
+    loop = asyncio.get_running_loop()
+
+    async def route(method, path, body):
+        job = path.strip("/")
+        if method == "POST" and job in JOBS:
+            texts = string_list(json_object(body), "texts")
+            try:
+                return 200, await loop.run_in_executor(executor, worker.run, job, texts)
+            except ValueError as e:
+                raise HTTPError(400, str(e))
+            except OSError as e:   # e.g. a spaCy model that is not installed
+                raise HTTPError(503, str(e))
+        if method == "GET" and path == "/health":
+            return 200, worker.health()
+        raise HTTPError(404, f"no route for {method} {path}")
+
+    await serve_connection(reader, writer, route)
+
+
+async def serve(worker: NLPWorker, address: str = NLP_WORKER_ADDRESS):
+    executor = ThreadPoolExecutor(max_workers=1)
+
+    async def _handler(reader, writer):
+        await handle_connection(reader, writer, worker, executor)
+
+    host, port, socket_path = parse_address(address)
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(_handler, path=socket_path)
+    else:
+        server = await asyncio.start_server(_handler, host, port)
+    print(f" NLP worker ready on {address} (pid {os.getpid()})")
+    async with server:
+        await server.serve_forever()
+
+
+# ----------------- client -----------------
+def _request(method: str, path: str, address: str, payload=None) -> dict:
+    host, port, socket_path = parse_address(address)
+    conn = connection(host, port, socket_path, timeout=CLIENT_TIMEOUT)
+    try:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8") if payload is not None else None
+        conn.request(method, path, body=body, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        out = json.loads(resp.read())
+        if resp.status != 200:
+            raise RuntimeError(f"NLP worker error {resp.status}: {out.get('error')}")
+        return out
+    finally:
+        conn.close()
+
+
+def call_worker(job: str, texts, address: str = NLP_WORKER_ADDRESS) -> dict:
+    """Client helper: run a parse / lemmatize / rules / frames job on a running worker."""
+    return _request("POST", f"/{job}", address, {"texts": list(texts)})
+
+
+def worker_health(address: str = NLP_WORKER_ADDRESS) -> dict:
+    """Client helper: loaded pipelines and job counters of a running worker."""
+    return _request("GET", "/health", address)
+
+
+# ----------------- main -----------------
+def main():
+    worker = NLPWorker()
+    worker.preload(PRELOAD)
+    try:
+        asyncio.run(serve(worker))
+    except KeyboardInterrupt:
+        print("\n NLP worker stopped.")
+
+
+if __name__ == "__main__":
+    main()
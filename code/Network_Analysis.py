@@ -4,30 +4,63 @@ Network Analysis (Degree/Betweenness + Structural Summary)
 
 Dependencies
 ------------
-pip install pandas networkx
+pip install pandas numpy scipy networkx pyarrow
 """
 
 import os
+import json
 import math
+import heapq
+import hashlib
+from itertools import count
+from dataclasses import dataclass
+from functools import cached_property
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 import pandas as pd
 import networkx as nx
+from scipy import sparse
+from scipy.sparse import csgraph
 
 # ========================
 # CONFIG (edit as needed)
 # ========================
 EDGES_PATH = "data/Network_Analysis_Data/Edges.csv"
 NODES_PATH = "data/Network_Analysis_Data/Nodes.csv"
+EDGES_SOURCE = os.getenv("EDGES_SOURCE", "csv")   # "csv" (EDGES_PATH) or "postgres" (Repost_Edges.py table)
 
 OUTPUT_DIR = "outputs"
 
 TOP_N_OVERALL = 20           # how many to show in console (overall ranking)
 TOP_K_PER_CLUSTER = 3        # how many per modularity_class in saved CSVs/prints
 
+N_JOBS = int(os.getenv("N_JOBS", os.cpu_count() or 1))   # processes for all-pairs path statistics
+PARALLEL_MIN_NODES = 2000    # below this a single process is faster than a pool
+BFS_CHUNK_CELLS = 2**24      # sources per chunk * n (bounds the distance block held in memory)
+
+BC_MODE = os.getenv("BC_MODE", "exact")          # "exact" or "approx" (pivot sampling)
+BC_EPSILON = float(os.getenv("BC_EPSILON", 0.01))  # approx: max absolute error of normalized betweenness
+BC_DELTA = float(os.getenv("BC_DELTA", 0.05))      # approx: failure probability (confidence 1 - delta)
+BC_SEED = 42
+BC_PROJECTION = os.getenv("BC_PROJECTION", "last")  # "last": nx.Graph(DiGraph) projection of the published tables
+                                                    # (a reciprocal pair keeps one weight); "sum": weights add up
+
+COMMUNITIES = os.getenv("COMMUNITIES", "louvain")   # "louvain" (computed here) or "gephi" (Nodes.csv column)
+COMMUNITY_RESOLUTIONS = [0.5, 1.0, 1.5]             # Louvain resolutions reported for stability
+COMMUNITY_RESOLUTION = 1.0                          # resolution used for modularity_class
+COMMUNITY_SEEDS = 10                                # seeded runs per resolution
+
+METRIC_CACHE = os.getenv("METRIC_CACHE", "1") == "1"   # reuse stored results when inputs are unchanged
+METRIC_CACHE_DIR = os.path.join(OUTPUT_DIR, "cache", "metrics")
+METRIC_CACHE_VERSION = 2     # bump when a metric's implementation changes its results
+
 OUT_DEGREE   = os.path.join(OUTPUT_DIR, "degree_results.csv")
 OUT_BETWEEN  = os.path.join(OUTPUT_DIR, "betweenness_results.csv")
 OUT_TOPK_DEG = os.path.join(OUTPUT_DIR, f"top{TOP_K_PER_CLUSTER}_per_class_degree.csv")
 OUT_TOPK_BC  = os.path.join(OUTPUT_DIR, f"top{TOP_K_PER_CLUSTER}_per_class_betweenness.csv")
 OUT_SUMMARY  = os.path.join(OUTPUT_DIR, "network_summary.csv")
+OUT_COMMUNITIES = os.path.join(OUTPUT_DIR, "community_stability.csv")
 
 
 # ----------------- helpers -----------------
@@ -44,8 +77,47 @@ def detect_column(df: pd.DataFrame, candidates):
     return None
 
 
-def load_and_prepare_edges(edges_path: str):
-    """Read edges, detect columns, drop self-loops, coerce weights, aggregate."""
+def table_hash(df: pd.DataFrame) -> str:
+    """Content hash of a table (column names + values, row order included)."""
+    h = hashlib.sha256("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return h.hexdigest()[:16]
+
+
+def cached_table(name: str, key_parts: dict, compute):
+    """
+    Return compute()'s table, stored as Parquet under a hash of key_parts (input hashes and
+    metric parameters); an existing file with the same key is read instead of recomputing.
+    """
+    key_parts = {"version": METRIC_CACHE_VERSION, **key_parts}
+    key = hashlib.sha256(json.dumps(key_parts, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    path = os.path.join(METRIC_CACHE_DIR, f"{name}-{key}.parquet")
+    if METRIC_CACHE and os.path.exists(path):
+        print(f"Using cached {name}: {path}")
+        return pd.read_parquet(path)
+    df = compute()
+    if METRIC_CACHE:
+        os.makedirs(METRIC_CACHE_DIR, exist_ok=True)
+        tmp = path + ".tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    return df
+
+
+def write_csv_if_changed(df: pd.DataFrame, path: str) -> bool:
+    """Write df as CSV unless the file already holds exactly this content."""
+    text = df.to_csv(index=False)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            if f.read() == text:
+                return False
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return True
+
+
+def load_edge_list(edges_path: str):
+    """Read edges, detect columns, drop self-loops, coerce weights -> (source, target, weight) arrays."""
     edges = pd.read_csv(edges_path)
     print(f"Loaded {len(edges)} raw edges")
 
@@ -53,24 +125,19 @@ def load_and_prepare_edges(edges_path: str):
     tgt_col = detect_column(edges, ["target", "to", "dst"]) or edges.columns[1]
     w_col   = detect_column(edges, ["weight", "count", "freq", "Weight"]) or None
 
-    cols = [src_col, tgt_col] + ([w_col] if w_col else [])
-    edges = edges[cols].copy()
-
     edges = edges.dropna(subset=[src_col, tgt_col])
     edges = edges[edges[src_col] != edges[tgt_col]]  # drop self-loops
 
+    src = edges[src_col].to_numpy()
+    tgt = edges[tgt_col].to_numpy()
     if w_col is None:
-        edges["weight"] = 1.0
-        w_col = "weight"
+        w = np.ones(len(edges))
     else:
-        edges[w_col] = pd.to_numeric(edges[w_col], errors="coerce").fillna(0)
-
-    # collapse multi-edges
-    edges = edges.groupby([src_col, tgt_col], as_index=False)[w_col].sum()
-    return edges, src_col, tgt_col, w_col
+        w = pd.to_numeric(edges[w_col], errors="coerce").fillna(0).to_numpy()
+    return src, tgt, w
 
 
-def load_and_prepare_nodes(nodes_path: str):
+def load_and_prepare_nodes(nodes_path: str, require_modularity: bool = True):
     """Read nodes, ensure Id/Label/modularity_class exist (auto-rename if needed)."""
     nodes = pd.read_csv(nodes_path)
 
@@ -84,47 +151,153 @@ def load_and_prepare_nodes(nodes_path: str):
             nodes["Label"] = nodes["Id"]  # fallback
 
     if "modularity_class" not in nodes.columns:
-        raise ValueError("Nodes.csv must contain 'modularity_class' column (e.g., from Gephi).")
+        if require_modularity:
+            raise ValueError("Nodes.csv must contain 'modularity_class' column (e.g., from Gephi), "
+                             "or run with COMMUNITIES=louvain.")
+        nodes["modularity_class"] = np.nan
 
     nodes["modularity_class"] = pd.to_numeric(nodes["modularity_class"], errors="coerce")
     return nodes
 
 
-def build_directed_graph(edges: pd.DataFrame, src_col: str, tgt_col: str, w_col: str):
-    """Build a directed weighted NetworkX graph from edge table."""
-    G = nx.DiGraph()
-    G.add_weighted_edges_from(edges[[src_col, tgt_col, w_col]].itertuples(index=False, name=None))
-    print(f"Graph built: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges")
-    return G
+# ----------------- sparse graph core -----------------
+@dataclass
+class SparseGraph:
+    """
+    Weighted directed graph as a CSR adjacency over integer node ids.
+    `labels[i]` is the channel Id of node i; A[i, j] is the (summed) weight of i -> j.
+    """
+    labels: np.ndarray
+    A: sparse.csr_matrix
+
+    @property
+    def n(self) -> int:
+        return self.A.shape[0]
+
+    @property
+    def m(self) -> int:
+        return self.A.nnz
+
+    @cached_property
+    def index(self) -> dict:
+        return {label: i for i, label in enumerate(self.labels)}
+
+    @cached_property
+    def csc(self) -> sparse.csc_matrix:
+        return self.A.tocsc()
+
+    def in_degree(self) -> np.ndarray:
+        return np.asarray(self.csc.sum(axis=0)).ravel()
+
+    def out_degree(self) -> np.ndarray:
+        return np.asarray(self.A.sum(axis=1)).ravel()
+
+    def pattern(self) -> sparse.csr_matrix:
+        """Unweighted adjacency (edges with zero weight included)."""
+        P = self.A.copy()
+        P.data = np.ones(len(P.data), dtype=np.int8)
+        return P
+
+    def subgraph(self, idx) -> "SparseGraph":
+        idx = np.asarray(idx)
+        return SparseGraph(self.labels[idx], self.A[idx][:, idx].tocsr())
+
+    def undirected(self, how: str = "sum") -> sparse.csr_matrix:
+        """
+        Symmetric weighted adjacency of the undirected projection.
+        how="sum": reciprocal edges add up (independent of node order).
+        how="last": a reciprocal pair keeps the weight of the edge whose source comes later in
+        node order, which is what nx.Graph(DiGraph) produces (default for the betweenness table).
+        """
+        if how == "sum":
+            return (self.A + self.A.T).tocsr()
+        if how != "last":
+            raise ValueError(f"Unknown projection: {how!r}")
+        upper = sparse.triu(self.A, k=1).tocsr()
+        lower_t = sparse.tril(self.A, k=-1).T.tocsr()
+        # drop upper entries overridden by a reciprocal edge, then add the reciprocal weights
+        mask = lower_t.copy()
+        mask.data = np.ones(len(mask.data))
+        upper = (upper - upper.multiply(mask)).tocsr()
+        U = (upper + lower_t).tocsr()
+        return (U + U.T).tocsr()
+
+    def to_networkx(self) -> nx.DiGraph:
+        """NetworkX view for algorithms that are not implemented on the sparse core."""
+        G = nx.DiGraph()
+        G.add_nodes_from(self.labels)
+        C = self.A.tocoo()
+        G.add_weighted_edges_from(zip(self.labels[C.row], self.labels[C.col], C.data.tolist()))
+        return G
+
+
+def pair_order(src, tgt) -> np.ndarray:
+    """
+    Positions of the (source, target) pairs sorted on their native values, as the former
+    groupby + NetworkX build ordered them; ids are compared as strings only when mixed types
+    (e.g. numeric ids and usernames) cannot be compared.
+    """
+    src = np.asarray(src, dtype=object)
+    tgt = np.asarray(tgt, dtype=object)
+    try:
+        return np.lexsort((tgt, src))
+    except TypeError:
+        return np.lexsort((tgt.astype(str), src.astype(str)))
 
 
-def compute_degree_tables(G: nx.DiGraph, nodes: pd.DataFrame):
-    """Compute weighted degrees and merge with node metadata."""
-    in_deg  = dict(G.in_degree(weight="weight"))
-    out_deg = dict(G.out_degree(weight="weight"))
-    tot_deg = dict(G.degree(weight="weight"))
+def build_sparse_graph(src, tgt, w) -> SparseGraph:
+    """
+    Integer-index an edge list and collapse multi-edges into a CSR adjacency.
+    Node order is that of the sorted (source, target) pairs (see pair_order), as in the
+    former NetworkX build, so output row order is unchanged.
+    """
+    src = np.asarray(src, dtype=object)
+    tgt = np.asarray(tgt, dtype=object)
+    w = np.asarray(w)
+    order = pair_order(src, tgt)
+    codes, labels = pd.factorize(np.column_stack([src[order], tgt[order]]).ravel())
+    codes = codes.reshape(-1, 2)
+    n = len(labels)
+    A = sparse.coo_matrix((w[order], (codes[:, 0], codes[:, 1])), shape=(n, n)).tocsr()
+    A.sum_duplicates()
+    g = SparseGraph(np.asarray(labels, dtype=object), A)
+    print(f"Graph built: {g.n} nodes, {g.m} edges")
+    return g
+
+
+def load_sparse_graph(edges_path: str) -> SparseGraph:
+    return build_sparse_graph(*load_edge_list(edges_path))
 
+
+def compute_degree_tables(g: SparseGraph, nodes: pd.DataFrame):
+    """Compute weighted degrees and merge with node metadata."""
+    in_deg = g.in_degree()
+    out_deg = g.out_degree()
     deg_df = pd.DataFrame({
-        "Id": list(G.nodes()),
-        "InDegree": [in_deg.get(n, 0) for n in G.nodes()],
-        "OutDegree": [out_deg.get(n, 0) for n in G.nodes()],
-        "TotalDegree": [tot_deg.get(n, 0) for n in G.nodes()],
+        "Id": g.labels,
+        "InDegree": in_deg,
+        "OutDegree": out_deg,
+        "TotalDegree": in_deg + out_deg,
     })
 
     deg_df = deg_df.merge(nodes[["Id", "Label", "modularity_class"]], on="Id", how="left")
     return deg_df
 
 
-def compute_betweenness_table(G: nx.DiGraph, nodes: pd.DataFrame):
-    """Betweenness on undirected projection with distance = 1/weight."""
-    GU = nx.Graph(G)
-    for _, _, data in GU.edges(data=True):
-        w = data.get("weight", 1.0)
-        data["inv_w"] = 1.0 / w if w > 0 else float("inf")
-    bc = nx.betweenness_centrality(GU, weight="inv_w", normalized=True)
+def compute_betweenness_table(g: SparseGraph, nodes: pd.DataFrame, mode: str = BC_MODE,
+                              epsilon: float = BC_EPSILON, projection: str = BC_PROJECTION):
+    """Betweenness on undirected projection, distance = 1/weight (exact or pivot-sampled)."""
+    W = g.undirected(how=projection)
+    with np.errstate(divide="ignore"):
+        W.data = np.where(W.data > 0, 1.0 / W.data, np.inf)   # inv_w
+    bc, info = betweenness(W, mode=mode, epsilon=epsilon)
+    if info["mode"] == "approx":
+        print(f"Approximate betweenness: {info['pivots']} pivots of {info['n']} nodes, "
+              f"|error| <= {info['epsilon']:.4f} with probability >= {1 - info['delta']:.2f}")
 
-    bc_df = (pd.DataFrame({"Id": list(bc.keys()), "Betweenness": list(bc.values())})
+    bc_df = (pd.DataFrame({"Id": g.labels, "Betweenness": bc})
                .merge(nodes[["Id", "Label", "modularity_class"]], on="Id", how="left"))
+    bc_df.attrs["betweenness"] = info
     return bc_df
 
 
@@ -139,117 +312,319 @@ def top_k_per_group(df: pd.DataFrame, group_col: str, sort_col: str, k: int):
     )
 
 
-def structural_summary(G: nx.DiGraph) -> pd.DataFrame:
+# ----------------- shortest-path engine -----------------
+_BFS_GRAPH = {}
+
+
+def _init_bfs_worker(A):
+    _BFS_GRAPH["A"] = A
+
+
+def _path_stats_chunk(bounds):
+    """BFS from sources [lo, hi): (sum of distances, reachable pairs, max distance, sum of 1/d)."""
+    lo, hi = bounds
+    A = _BFS_GRAPH["A"]
+    dist = csgraph.shortest_path(A, method="D", directed=True, unweighted=True,
+                                 indices=np.arange(lo, hi))
+    dist[np.arange(hi - lo), np.arange(lo, hi)] = np.inf   # exclude u == v
+    finite = np.isfinite(dist)
+    d = dist[finite]
+    if not len(d):
+        return 0.0, 0, 0, 0.0
+    return float(d.sum()), int(len(d)), int(d.max()), float((1.0 / d).sum())
+
+
+def path_stats(A: sparse.csr_matrix, n_jobs: int = N_JOBS) -> dict:
+    """
+    One BFS per source over a CSR adjacency (directed edges as stored; pass a symmetric
+    matrix for undirected graphs). Sources are processed in chunks, in parallel for large
+    graphs, and each distance block yields APL, diameter, reachability and efficiency at once.
+    """
+    n = A.shape[0]
+    if n < 2:
+        return {"Reachability": 0, "APL": float("nan"), "Diameter": 0, "Efficiency": 0}
+    step = max(1, min(n, BFS_CHUNK_CELLS // n))
+    if n_jobs > 1 and n >= PARALLEL_MIN_NODES:
+        step = min(step, -(-n // (4 * n_jobs)))   # enough chunks to balance the pool
+    chunks = [(lo, min(lo + step, n)) for lo in range(0, n, step)]
+
+    if n_jobs > 1 and n >= PARALLEL_MIN_NODES and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_bfs_worker, initargs=(A,)) as pool:
+            parts = list(pool.map(_path_stats_chunk, chunks))
+    else:
+        _init_bfs_worker(A)
+        parts = [_path_stats_chunk(c) for c in chunks]
+
+    sum_len = sum(p[0] for p in parts)
+    n_reach = sum(p[1] for p in parts)
+    pairs = n * (n - 1)
+    return {
+        "Reachability": n_reach / pairs,
+        "APL": sum_len / n_reach if n_reach else float("nan"),
+        "Diameter": max(p[2] for p in parts),
+        "Efficiency": sum(p[3] for p in parts) / pairs,
+    }
+
+
+def largest_component(A: sparse.csr_matrix, connection: str) -> np.ndarray:
+    """Indices of the largest weakly/strongly connected component of a CSR adjacency."""
+    _, labels = csgraph.connected_components(A, directed=True, connection=connection)
+    return np.flatnonzero(labels == np.bincount(labels).argmax())
+
+
+# ----------------- betweenness engine -----------------
+_BC_GRAPH = {}
+
+
+def _init_bc_worker(W):
+    W = sparse.csr_matrix(W)
+    _BC_GRAPH.update(n=W.shape[0], indptr=W.indptr.tolist(), indices=W.indices.tolist(),
+                     weights=W.data.tolist())
+
+
+def _brandes_partial(sources):
+    """Brandes dependency accumulation (weighted, Dijkstra) from the given sources."""
+    n, indptr, indices, weights = (_BC_GRAPH[k] for k in ("n", "indptr", "indices", "weights"))
+    bc = [0.0] * n
+    for s in sources:
+        S, P, sigma, D = [], [[] for _ in range(n)], [0.0] * n, {}
+        sigma[s] = 1.0
+        seen = {s: 0}
+        c = count()
+        Q = [(0, next(c), s, s)]
+        while Q:
+            dist, _, pred, v = heapq.heappop(Q)
+            if v in D:
+                continue
+            sigma[v] += sigma[pred]
+            S.append(v)
+            D[v] = dist
+            for e in range(indptr[v], indptr[v + 1]):
+                w = indices[e]
+                vw_dist = dist + weights[e]
+                if w not in D and (w not in seen or vw_dist < seen[w]):
+                    seen[w] = vw_dist
+                    heapq.heappush(Q, (vw_dist, next(c), v, w))
+                    sigma[w] = 0.0
+                    P[w] = [v]
+                elif vw_dist == seen[w]:
+                    sigma[w] += sigma[v]
+                    P[w].append(v)
+        delta = [0.0] * n
+        while S:
+            w = S.pop()
+            coeff = (1 + delta[w]) / sigma[w]
+            for v in P[w]:
+                delta[v] += sigma[v] * coeff
+            if w != s:
+                bc[w] += delta[w]
+    return np.asarray(bc)
+
+
+def pivots_for_error(n: int, epsilon: float, delta: float) -> int:
+    """
+    Pivots needed so every normalized score is within epsilon with probability 1 - delta.
+    Each pivot contributes a value in [0, n/(n-1)]; Hoeffding + union bound over n nodes.
+    """
+    r = n / (n - 1)
+    return math.ceil(r * r * math.log(2 * n / delta) / (2 * epsilon * epsilon))
+
+
+def achieved_error(n: int, k: int, delta: float) -> float:
+    """Error bound (probability 1 - delta) reached with k pivots; 0 when all sources are used."""
+    if k >= n:
+        return 0.0
+    return n / (n - 1) * math.sqrt(math.log(2 * n / delta) / (2 * k))
+
+
+def betweenness(W: sparse.csr_matrix, mode: str = BC_MODE, epsilon: float = BC_EPSILON,
+                delta: float = BC_DELTA, n_jobs: int = N_JOBS, seed: int = BC_SEED,
+                normalized: bool = True):
+    """
+    Betweenness of an undirected graph given as a symmetric CSR distance matrix.
+    Sources (all nodes, or a random pivot sample in approx mode) are partitioned across
+    processes; partial dependency vectors are summed. Returns (scores, info); with
+    normalized=False the scores are raw dependency sums (pivot estimates scaled by n/k).
+    """
+    n = W.shape[0]
+    if n <= 2:
+        return np.zeros(n), {"mode": "exact", "n": n, "pivots": n, "epsilon": 0.0, "delta": 0.0}
+    k = pivots_for_error(n, epsilon, delta) if mode == "approx" else n
+    if k >= n:
+        mode, k, sources = "exact", n, np.arange(n)
+    else:
+        sources = np.sort(np.random.default_rng(seed).choice(n, size=k, replace=False))
+
+    n_chunks = min(len(sources), max(1, n_jobs) * 4)
+    chunks = [c.tolist() for c in np.array_split(sources, n_chunks)]
+    if n_jobs > 1 and n >= PARALLEL_MIN_NODES // 4 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_bc_worker, initargs=(W,)) as pool:
+            bc = sum(pool.map(_brandes_partial, chunks))
+    else:
+        _init_bc_worker(W)
+        bc = sum(_brandes_partial(c) for c in chunks)
+
+    bc = bc * (n / k)
+    if normalized:
+        # same scaling as nx.betweenness_centrality(normalized=True) on an undirected graph
+        bc = bc / ((n - 1) * (n - 2))
+    return bc, {"mode": mode, "n": n, "pivots": k, "epsilon": achieved_error(n, k, delta),
+                "delta": delta if mode == "approx" else 0.0}
+
+
+def structural_summary(g: SparseGraph) -> pd.DataFrame:
     """
     Structural metrics:
     - Directed GWC: reachability, density, APL, diameter, efficiency
     - Undirected LCC: same metrics
+    All path metrics are unweighted and come from a single all-pairs BFS pass per graph.
     """
+    A = g.pattern()
+
     # --- Directed GWC ---
-    gwc_nodes = max(nx.weakly_connected_components(G), key=len)
-    G_gwc = G.subgraph(gwc_nodes).copy()
-    n = G_gwc.number_of_nodes()
-    m = G_gwc.number_of_edges()
-
-    D_dir = nx.density(G_gwc)
-
-    sum_len = 0
-    Nr = 0
-    diameter = 0
-    for u in G_gwc.nodes():
-        dist = nx.single_source_shortest_path_length(G_gwc, u)  # unweighted directed
-        for v, d in dist.items():
-            if v == u:
-                continue
-            sum_len += d
-            Nr += 1
-            if d > diameter:
-                diameter = d
-    reach = Nr / (n * (n - 1)) if n > 1 else 0
-    L_dir = sum_len / Nr if Nr > 0 else float("nan")
-
-    # Global efficiency (directed, unweighted)
-    eff_sum = 0
-    for u in G_gwc.nodes():
-        dist = nx.single_source_shortest_path_length(G_gwc, u)
-        for v in G_gwc.nodes():
-            if v == u:
-                continue
-            d = dist.get(v, math.inf)
-            eff_sum += (0 if math.isinf(d) else 1 / d)
-    E_dir = eff_sum / (n * (n - 1)) if n > 1 else 0
-
-    # --- Undirected projection on same nodes ---
-    H = nx.Graph()
-    H.add_nodes_from(G_gwc.nodes())
-    for i, j, data in G_gwc.edges(data=True):
-        w = data.get("weight", 1.0)
-        if H.has_edge(i, j):
-            H[i][j]["weight"] += w
-        else:
-            H.add_edge(i, j, weight=w)
-
-    lcc_nodes = max(nx.connected_components(H), key=len)
-    H_lcc = H.subgraph(lcc_nodes).copy()
-    n_u = H_lcc.number_of_nodes()
-    m_u = H_lcc.number_of_edges()
-
-    D_undir = nx.density(H_lcc)
-
-    sum_len_u = 0
-    Nr_u = 0
-    diameter_u = 0
-    for u in H_lcc.nodes():
-        dist = nx.single_source_shortest_path_length(H_lcc, u)  # undirected
-        for v, d in dist.items():
-            if v == u:
-                continue
-            sum_len_u += d
-            Nr_u += 1
-            if d > diameter_u:
-                diameter_u = d
-    L_undir = sum_len_u / Nr_u if Nr_u > 0 else float("nan")
-    reach_u = 1.0  # inside LCC everyone is reachable
-
-    # Global efficiency (undirected, unweighted)
-    eff_sum_u = 0
-    for u in H_lcc.nodes():
-        dist = nx.single_source_shortest_path_length(H_lcc, u)
-        for v in H_lcc.nodes():
-            if v == u:
-                continue
-            d = dist.get(v, math.inf)
-            eff_sum_u += (0 if math.isinf(d) else 1 / d)
-    E_undir = eff_sum_u / (n_u * (n_u - 1)) if n_u > 1 else 0
+    gwc = largest_component(A, "weak")
+    A_gwc = A[gwc][:, gwc]
+    n = len(gwc)
+    m = A_gwc.nnz
+    D_dir = m / (n * (n - 1)) if n > 1 else 0
+    dir_stats = path_stats(A_gwc)
+
+    # --- Undirected projection on same nodes (LCC) ---
+    U = ((A_gwc + A_gwc.T) > 0).astype(np.int8).tocsr()
+    lcc = largest_component(U, "weak")
+    U_lcc = U[lcc][:, lcc]
+    n_u = len(lcc)
+    m_u = U_lcc.nnz // 2
+    D_undir = 2 * m_u / (n_u * (n_u - 1)) if n_u > 1 else 0
+    undir_stats = path_stats(U_lcc)
+    undir_stats["Reachability"] = 1.0  # inside LCC everyone is reachable
 
     summary = pd.DataFrame([
-        {"Graph": "Directed (GWC)", "n": n, "m": m, "Reachability": reach,
-         "Density": D_dir, "APL": L_dir, "Diameter": diameter, "Efficiency": E_dir},
-        {"Graph": "Undirected (projection, LCC)", "n": n_u, "m": m_u, "Reachability": reach_u,
-         "Density": D_undir, "APL": L_undir, "Diameter": diameter_u, "Efficiency": E_undir}
+        {"Graph": "Directed (GWC)", "n": n, "m": m, "Reachability": dir_stats["Reachability"],
+         "Density": D_dir, "APL": dir_stats["APL"], "Diameter": dir_stats["Diameter"],
+         "Efficiency": dir_stats["Efficiency"]},
+        {"Graph": "Undirected (projection, LCC)", "n": n_u, "m": m_u, "Reachability": undir_stats["Reachability"],
+         "Density": D_undir, "APL": undir_stats["APL"], "Diameter": undir_stats["Diameter"],
+         "Efficiency": undir_stats["Efficiency"]}
     ])
     return summary
 
 
+# ----------------- community detection -----------------
+def edge_set_hash(g: SparseGraph) -> str:
+    """Content hash of the weighted edge set (labels + CSR arrays)."""
+    h = hashlib.sha256("\x1f".join(map(str, g.labels)).encode("utf-8"))
+    for a in (g.A.indptr, g.A.indices, g.A.data):
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()[:16]
+
+
+def adjusted_rand(a: np.ndarray, b: np.ndarray) -> float:
+    """Adjusted Rand index between two partitions given as label arrays."""
+    _, a = np.unique(a, return_inverse=True)
+    _, b = np.unique(b, return_inverse=True)
+    table = sparse.coo_matrix((np.ones(len(a)), (a, b))).tocsr()
+    comb = lambda x: (x * (x - 1) / 2).sum()
+    sum_ij = comb(table.data)
+    sum_a = comb(np.asarray(table.sum(axis=1)).ravel())
+    sum_b = comb(np.asarray(table.sum(axis=0)).ravel())
+    expected = sum_a * sum_b / comb(np.array([len(a)], dtype=float))
+    max_index = (sum_a + sum_b) / 2
+    return 1.0 if max_index == expected else float((sum_ij - expected) / (max_index - expected))
+
+
+def louvain_partition(GU: nx.Graph, resolution: float, seed: int):
+    """Seeded Louvain run -> (community per node, sorted by size, largest = 0; modularity)."""
+    comms = nx.community.louvain_communities(GU, weight="weight", resolution=resolution, seed=seed)
+    comms = sorted(comms, key=lambda c: (-len(c), min(c)))
+    labels = np.empty(GU.number_of_nodes(), dtype=int)
+    for k, members in enumerate(comms):
+        labels[list(members)] = k
+    Q = nx.community.modularity(GU, comms, weight="weight", resolution=resolution)
+    return labels, Q
+
+
+def detect_communities(g: SparseGraph, resolutions=COMMUNITY_RESOLUTIONS, n_seeds: int = COMMUNITY_SEEDS):
+    """
+    Louvain on the weighted undirected projection (reciprocal weights summed), COMMUNITY_SEEDS
+    seeded runs per resolution. Returns (membership, stability):
+    membership — Id + one community column per resolution (best-modularity run);
+    stability  — per resolution: communities, modularity, mean pairwise ARI across seeds.
+    Cached by edge-set hash, so results are recomputed only when the edges change.
+    """
+    def compute():
+        membership, stability = _louvain_runs(g, resolutions, n_seeds)
+        membership.attrs["stability"] = stability.to_dict("records")
+        return membership
+
+    membership = cached_table("communities", {"edges": edge_set_hash(g), "projection": "undirected-sum",
+                                              "resolutions": list(resolutions), "seeds": n_seeds}, compute)
+    return membership, pd.DataFrame(membership.attrs["stability"])
+
+
+def _louvain_runs(g: SparseGraph, resolutions, n_seeds: int):
+    GU = nx.from_scipy_sparse_array(g.undirected(how="sum"), edge_attribute="weight")
+    membership = pd.DataFrame({"Id": g.labels})
+    rows = []
+    for res in resolutions:
+        runs = [louvain_partition(GU, res, seed) for seed in range(n_seeds)]
+        best_labels, best_q = max(runs, key=lambda r: r[1])
+        aris = [adjusted_rand(runs[i][0], runs[j][0])
+                for i in range(len(runs)) for j in range(i + 1, len(runs))]
+        membership[f"community_r{res}"] = best_labels
+        rows.append({"resolution": res, "communities": int(best_labels.max()) + 1, "modularity": best_q,
+                     "modularity_mean": float(np.mean([q for _, q in runs])),
+                     "stability_ari": float(np.mean(aris)) if aris else 1.0, "seeds": n_seeds})
+    return membership, pd.DataFrame(rows)
+
+
+def attach_communities(nodes: pd.DataFrame, membership: pd.DataFrame,
+                       resolution: float = COMMUNITY_RESOLUTION) -> pd.DataFrame:
+    """Node table for every graph node with modularity_class taken from the detected communities."""
+    col = f"community_r{resolution}"
+    out = (membership[["Id", col]].rename(columns={col: "modularity_class"})
+           .merge(nodes.drop(columns=["modularity_class"], errors="ignore"), on="Id", how="left"))
+    out["Label"] = out["Label"].fillna(out["Id"])
+    return out
+
+
 # ----------------- main -----------------
 def main():
     ensure_outdir(OUTPUT_DIR)
 
-    # === Load ===
-    edges, src_col, tgt_col, w_col = load_and_prepare_edges(EDGES_PATH)
-    nodes = load_and_prepare_nodes(NODES_PATH)
-    print(f"Prepared {len(edges)} edges and {len(nodes)} nodes")
-
-    # === Build graph ===
-    G = build_directed_graph(edges, src_col, tgt_col, w_col)
+    # === Load and build graph ===
+    if EDGES_SOURCE == "postgres":
+        from Repost_Edges import load_repost_graph
+        g = load_repost_graph()
+    else:
+        g = load_sparse_graph(EDGES_PATH)
+    nodes = load_and_prepare_nodes(NODES_PATH, require_modularity=COMMUNITIES == "gephi")
+    print(f"Prepared {g.m} edges and {len(nodes)} nodes")
+
+    # === Communities (Louvain, replaces the Gephi modularity_class) ===
+    if COMMUNITIES == "louvain":
+        membership, stability = detect_communities(g)
+        write_csv_if_changed(stability, OUT_COMMUNITIES)
+        gephi = nodes.set_index("Id")["modularity_class"]
+        nodes = attach_communities(nodes, membership)
+        print("\n=== Louvain communities (stability across seeds) ===")
+        print(stability.to_string(index=False))
+        known = nodes["Id"].map(gephi).notna()
+        if known.any():
+            ari = adjusted_rand(nodes.loc[known, "modularity_class"].to_numpy(),
+                                nodes.loc[known, "Id"].map(gephi).to_numpy())
+            print(f"Agreement with Nodes.csv modularity_class (ARI, resolution {COMMUNITY_RESOLUTION}): {ari:.3f}")
+
+    # === Cache keys: prepared edges + node metadata + metric parameters ===
+    inputs = {"edges": edge_set_hash(g), "nodes": table_hash(nodes[["Id", "Label", "modularity_class"]])}
+    bc_params = {"projection": f"undirected-{BC_PROJECTION}", "distance": "1/weight", "mode": BC_MODE,
+                 "epsilon": BC_EPSILON, "delta": BC_DELTA, "seed": BC_SEED}
 
     # === Degree tables ===
-    deg_df = compute_degree_tables(G, nodes)
-    deg_df.to_csv(OUT_DEGREE, index=False)
+    deg_df = cached_table("degree", {**inputs, "weight": "weight"}, lambda: compute_degree_tables(g, nodes))
 
     # === Betweenness (undirected, 1/weight) ===
-    bc_df = compute_betweenness_table(G, nodes)
-    bc_df.to_csv(OUT_BETWEEN, index=False)
+    bc_df = cached_table("betweenness", {**inputs, **bc_params}, lambda: compute_betweenness_table(g, nodes))
 
     # === Print Top-N overall ===
     print("\n=== Top Channels by Weighted Total Degree ===")
@@ -263,17 +638,15 @@ def main():
               .to_string(index=False))
 
     # === Top-K per modularity_class ===
-    topk_deg = top_k_per_group(
+    topk_deg = cached_table("topk_degree", {**inputs, "k": TOP_K_PER_CLUSTER}, lambda: top_k_per_group(
         deg_df[["Id", "Label", "modularity_class", "TotalDegree"]],
         "modularity_class", "TotalDegree", TOP_K_PER_CLUSTER
-    )
-    topk_bc = top_k_per_group(
+    ))
+    topk_bc = cached_table("topk_betweenness", {**inputs, **bc_params, "k": TOP_K_PER_CLUSTER},
+                           lambda: top_k_per_group(
         bc_df[["Id", "Label", "modularity_class", "Betweenness"]],
         "modularity_class", "Betweenness", TOP_K_PER_CLUSTER
-    )
-
-    topk_deg.to_csv(OUT_TOPK_DEG, index=False)
-    topk_bc.to_csv(OUT_TOPK_BC, index=False)
+    ))
 
     print(f"\n=== Top-{TOP_K_PER_CLUSTER} per Modularity Class by Total Degree ===")
     print(topk_deg.to_string(index=False))
@@ -281,18 +654,19 @@ def main():
     print(topk_bc.to_string(index=False))
 
     # === Structural summary (GWC/LCC) ===
-    summary = structural_summary(G)
+    summary = cached_table("structural_summary", {"edges": inputs["edges"], "paths": "unweighted"},
+                           lambda: structural_summary(g))
     print("\n=== Structural Summary ===")
     print(summary.to_string(index=False))
-    summary.to_csv(OUT_SUMMARY, index=False)
 
-    # === Saved paths ===
+    # === Save (files whose content is unchanged are left untouched) ===
+    outputs = [(deg_df, OUT_DEGREE), (bc_df, OUT_BETWEEN), (topk_deg, OUT_TOPK_DEG),
+               (topk_bc, OUT_TOPK_BC), (summary, OUT_SUMMARY)]
     print("\nSaved:")
-    print(f" - {OUT_DEGREE}")
-    print(f" - {OUT_BETWEEN}")
-    print(f" - {OUT_TOPK_DEG}")
-    print(f" - {OUT_TOPK_BC}")
-    print(f" - {OUT_SUMMARY}")
+    for df, path in outputs:
+        print(f" - {path}" + ("" if write_csv_if_changed(df, path) else " (unchanged)"))
+    if COMMUNITIES == "louvain":
+        print(f" - {OUT_COMMUNITIES}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Repost Edges from telegram_data (incremental)
+=============================================
+
+Builds the inter-channel repost network directly from `telegram_data.forward_from_id`
+instead of a hand-exported Edges.csv. Forwards are aggregated in PostgreSQL with GROUP BY
+into a daily edge table:
+
+    repost_edges_daily(source_id, target_id, day, weight)
+
+where source_id is the channel that forwarded (telegram_data.channel_id) and target_id the
+channel whose post was forwarded (forward_from_id), matching the Source -> Target direction
+of Edges.csv. A per-channel watermark (last aggregated message_id) makes every run add only
+messages collected since the previous run, so the table can be refreshed after each
+collection. Forwards inserted at or below a channel's watermark (historical backfills by
+Telegram_Export_Import.py, or older history walked by Telegram_Data_Collection.py) are queued in
+repost_edges_backfill by an insert trigger on telegram_data, whatever the writer, and counted,
+once, by the next run. The trigger is installed by the first run (or ensure_tables) and waits
+for a refresh in progress, so it compares new rows against the watermark that refresh commits.
+Network_Analysis.py reads the table with EDGES_SOURCE=postgres.
+
+Usage
+-----
+python code/Repost_Edges.py                  # incremental update + Edges.csv-style export
+FULL_REBUILD=1 python code/Repost_Edges.py   # drop aggregated state and rebuild from scratch
+
+Dependencies
+------------
+pip install psycopg2-binary pandas numpy scipy
+"""
+
+import os
+import time
+import numpy as np
+import pandas as pd
+
+# ========================
+# CONFIGURATION
+# ========================
+START_DATE = os.getenv("START_DATE", "2022-02-22")      # forwards before this date are ignored
+FULL_REBUILD = os.getenv("FULL_REBUILD", "0") == "1"
+SAMPLE_ONLY = os.getenv("SAMPLE_ONLY", "1") == "1"       # keep only edges between channels in telegram_channels
+OUTPUT_DIR = "outputs"
+OUT_EDGES = os.path.join(OUTPUT_DIR, "Edges_from_db.csv")
+REFRESH_LOCK = 7208071                # advisory lock key: held by a refresh, awaited by the backfill trigger
+
+DDL = """
+CREATE TABLE IF NOT EXISTS repost_edges_daily (
+    source_id BIGINT NOT NULL,
+    target_id BIGINT NOT NULL,
+    day       DATE   NOT NULL,
+    weight    BIGINT NOT NULL,
+    PRIMARY KEY (source_id, target_id, day)
+);
+CREATE TABLE IF NOT EXISTS repost_edges_watermark (
+    channel_id      TEXT PRIMARY KEY,
+    last_message_id BIGINT NOT NULL,
+    updated_at      TIMESTAMP NOT NULL DEFAULT now()
+);
+CREATE TABLE IF NOT EXISTS repost_edges_backfill (
+    channel_id TEXT   NOT NULL,
+    message_id BIGINT NOT NULL,
+    PRIMARY KEY (channel_id, message_id)
+);
+CREATE OR REPLACE FUNCTION repost_edges_queue_backfill() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    -- wait for a running refresh, so the watermark read below is the one it commits
+    PERFORM pg_advisory_xact_lock_shared(%(lock)s);
+    INSERT INTO repost_edges_backfill (channel_id, message_id)
+    SELECT i.channel_id::text, i.message_id
+    FROM inserted i
+    JOIN repost_edges_watermark w ON w.channel_id = i.channel_id::text
+    WHERE i.forward_from_id IS NOT NULL AND i.message_id <= w.last_message_id
+    ON CONFLICT DO NOTHING;
+    RETURN NULL;
+END $$;
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                   WHERE tgname = 'repost_edges_queue_backfill'
+                     AND tgrelid = 'public.telegram_data'::regclass) THEN
+        CREATE TRIGGER repost_edges_queue_backfill
+        AFTER INSERT ON public.telegram_data
+        REFERENCING NEW TABLE AS inserted
+        FOR EACH STATEMENT EXECUTE FUNCTION repost_edges_queue_backfill();
+    END IF;
+END $$;
+"""
+
+# New forwards since each channel's watermark, plus queued backfilled forwards below it,
+# aggregated per (source, target, day) and merged into the existing counts.
+UPDATE_EDGES = """
+WITH new_forwards AS (
+    SELECT d.channel_id::bigint AS source_id, d.forward_from_id AS target_id, d."time"::date AS day
+    FROM public.telegram_data d
+    LEFT JOIN repost_edges_watermark w ON w.channel_id = d.channel_id::text
+    WHERE d.forward_from_id IS NOT NULL
+      AND d."time" >= %(start)s
+      AND d.message_id > COALESCE(w.last_message_id, 0)
+    UNION ALL
+    SELECT d.channel_id::bigint, d.forward_from_id, d."time"::date
+    FROM repost_edges_backfill b
+    JOIN public.telegram_data d ON d.channel_id::text = b.channel_id AND d.message_id = b.message_id
+    WHERE d.forward_from_id IS NOT NULL
+      AND d."time" >= %(start)s
+)
+INSERT INTO repost_edges_daily (source_id, target_id, day, weight)
+SELECT source_id, target_id, day, COUNT(*)
+FROM new_forwards
+GROUP BY source_id, target_id, day
+ON CONFLICT (source_id, target_id, day)
+DO UPDATE SET weight = repost_edges_daily.weight + EXCLUDED.weight
+"""
+
+UPDATE_WATERMARK = """
+INSERT INTO repost_edges_watermark (channel_id, last_message_id, updated_at)
+SELECT channel_id::text, MAX(message_id), now()
+FROM public.telegram_data
+GROUP BY channel_id
+ON CONFLICT (channel_id)
+DO UPDATE SET last_message_id = GREATEST(repost_edges_watermark.last_message_id, EXCLUDED.last_message_id),
+              updated_at = EXCLUDED.updated_at
+"""
+
+# Aggregated edges for a time window, labelled with channel usernames (numeric id as fallback).
+# Forward targets outside telegram_channels take the username recorded on the message.
+EDGES_QUERY = """
+WITH target_names AS (
+    SELECT DISTINCT ON (forward_from_id) forward_from_id, forward_channel_username
+    FROM public.telegram_data
+    WHERE forward_from_id IS NOT NULL
+      AND forward_channel_username IS NOT NULL AND forward_channel_username <> 'unknown'
+    ORDER BY forward_from_id, "time" DESC
+)
+SELECT COALESCE(s.channel_username, e.source_id::text) AS source,
+       COALESCE(t.channel_username, n.forward_channel_username, e.target_id::text) AS target,
+       SUM(e.weight) AS weight
+FROM repost_edges_daily e
+LEFT JOIN public.telegram_channels s ON s.channel_id::text = e.source_id::text
+LEFT JOIN public.telegram_channels t ON t.channel_id::text = e.target_id::text
+LEFT JOIN target_names n ON n.forward_from_id = e.target_id
+WHERE e.day >= %(start)s AND e.day < %(end)s
+  {sample_filter}
+GROUP BY 1, 2
+"""
+SAMPLE_FILTER = "AND s.channel_username IS NOT NULL AND t.channel_username IS NOT NULL"
+
+# Daily rows for temporal snapshots (ids only; labels are attached once in Python).
+DAILY_QUERY = """
+SELECT e.source_id, e.target_id, e.day, e.weight
+FROM repost_edges_daily e
+{sample_join}
+WHERE e.day >= %(start)s AND e.day < %(end)s
+"""
+SAMPLE_JOIN = """
+JOIN public.telegram_channels s ON s.channel_id::text = e.source_id::text
+JOIN public.telegram_channels t ON t.channel_id::text = e.target_id::text
+"""
+
+# Quarterly forward counts for every (forwarding channel, forwarded source) pair, labelled as in
+# EDGES_QUERY; used by the EDSS sampling engine, which needs sources outside the sample too.
+QUARTERLY_QUERY = """
+WITH target_names AS (
+    SELECT DISTINCT ON (forward_from_id) forward_from_id, forward_channel_username
+    FROM public.telegram_data
+    WHERE forward_from_id IS NOT NULL
+      AND forward_channel_username IS NOT NULL AND forward_channel_username <> 'unknown'
+    ORDER BY forward_from_id, "time" DESC
+)
+SELECT COALESCE(s.channel_username, e.source_id::text) AS source,
+       COALESCE(t.channel_username, n.forward_channel_username, e.target_id::text) AS target,
+       date_trunc('quarter', e.day)::date AS quarter,
+       SUM(e.weight) AS weight
+FROM repost_edges_daily e
+LEFT JOIN public.telegram_channels s ON s.channel_id::text = e.source_id::text
+LEFT JOIN public.telegram_channels t ON t.channel_id::text = e.target_id::text
+LEFT JOIN target_names n ON n.forward_from_id = e.target_id
+WHERE e.day >= %(start)s AND e.day < %(end)s
+  AND e.source_id <> e.target_id
+GROUP BY 1, 2, 3
+"""
+
+LABELS_QUERY = """
+SELECT channel_id::bigint AS channel_id, channel_username
+FROM public.telegram_channels
+WHERE channel_id IS NOT NULL AND channel_username IS NOT NULL
+"""
+
+
+# ----------------- database -----------------
+def connect():
+    """Open a PostgreSQL connection from the PG* environment variables."""
+    import psycopg2
+    from Dependency_Parsing import get_pg_config
+
+    return psycopg2.connect(**get_pg_config())
+
+
+def ensure_tables(conn):
+    """Create the edge tables and the backfill trigger on telegram_data (if missing)."""
+    with conn, conn.cursor() as cur:
+        cur.execute(DDL, {"lock": REFRESH_LOCK})
+
+
+def update_edges(conn, start: str = START_DATE, full_rebuild: bool = False) -> dict:
+    """
+    Aggregate forwards newer than the watermark, and queued backfills, into repost_edges_daily.
+    The refresh lock is taken before the snapshot: it waits for writers whose inserts are not
+    committed yet and holds new ones in the backfill trigger until the new watermark is
+    committed. All statements then run in one REPEATABLE READ transaction, so backfill keys
+    queued after the snapshot stay queued for the next run.
+    """
+    ensure_tables(conn)
+    t0 = time.perf_counter()
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_advisory_lock(%s)", (REFRESH_LOCK,))   # session lock, outlives this commit
+    conn.set_session(isolation_level="REPEATABLE READ")
+    try:
+        with conn, conn.cursor() as cur:
+            if full_rebuild:
+                cur.execute("TRUNCATE repost_edges_daily, repost_edges_watermark, repost_edges_backfill")
+            cur.execute(UPDATE_EDGES, {"start": start})
+            rows = cur.rowcount
+            cur.execute(UPDATE_WATERMARK)
+            cur.execute("DELETE FROM repost_edges_backfill")   # only the queued rows this snapshot counted
+            cur.execute("SELECT COUNT(*), COALESCE(SUM(weight), 0) FROM repost_edges_daily")
+            n_rows, total = cur.fetchone()
+    finally:
+        conn.set_session(isolation_level="DEFAULT")
+        with conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (REFRESH_LOCK,))
+    return {"upserted_rows": rows, "table_rows": n_rows, "total_forwards": int(total),
+            "seconds": time.perf_counter() - t0}
+
+
+def fetch_edges(conn, start: str = START_DATE, end: str = "infinity", sample_only: bool = SAMPLE_ONLY):
+    """(source, target, weight) arrays aggregated over [start, end)."""
+    query = EDGES_QUERY.format(sample_filter=SAMPLE_FILTER if sample_only else "")
+    with conn.cursor() as cur:
+        cur.execute(query, {"start": start, "end": end})
+        rows = cur.fetchall()
+    if not rows:
+        return np.array([], dtype=object), np.array([], dtype=object), np.array([], dtype=np.int64)
+    src, tgt, w = zip(*rows)
+    return np.asarray(src, dtype=object), np.asarray(tgt, dtype=object), np.asarray(w, dtype=np.int64)
+
+
+def fetch_daily_edges(conn, start: str = START_DATE, end: str = "infinity",
+                      sample_only: bool = SAMPLE_ONLY) -> pd.DataFrame:
+    """Daily (source_id, target_id, day, weight) rows over [start, end), ids left numeric."""
+    query = DAILY_QUERY.format(sample_join=SAMPLE_JOIN if sample_only else "")
+    with conn.cursor() as cur:
+        cur.execute(query, {"start": start, "end": end})
+        rows = cur.fetchall()
+    df = pd.DataFrame(rows, columns=["source_id", "target_id", "day", "weight"])
+    df["day"] = pd.to_datetime(df["day"])
+    return df
+
+
+def fetch_quarterly_edges(conn, start: str = START_DATE, end: str = "infinity") -> pd.DataFrame:
+    """Quarterly (source, target, quarter, weight) rows over [start, end) for all forward sources."""
+    with conn.cursor() as cur:
+        cur.execute(QUARTERLY_QUERY, {"start": start, "end": end})
+        rows = cur.fetchall()
+    df = pd.DataFrame(rows, columns=["source", "target", "quarter", "weight"])
+    df["quarter"] = pd.PeriodIndex(pd.to_datetime(df["quarter"]), freq="Q")
+    return df
+
+
+def fetch_channel_labels(conn) -> dict:
+    """channel_id -> username for sampled channels."""
+    with conn.cursor() as cur:
+        cur.execute(LABELS_QUERY)
+        return dict(cur.fetchall())
+
+
+def load_repost_graph(start: str = START_DATE, end: str = "infinity", sample_only: bool = SAMPLE_ONLY,
+                      refresh: bool = True):
+    """SparseGraph of reposts in [start, end), optionally bringing the edge table up to date first."""
+    from Network_Analysis import build_sparse_graph
+
+    conn = connect()
+    try:
+        if refresh:
+            stats = update_edges(conn)
+            print(f"Edge table refreshed: {stats['upserted_rows']} rows upserted in {stats['seconds']:.1f}s")
+        src, tgt, w = fetch_edges(conn, start, end, sample_only)
+    finally:
+        conn.close()
+    print(f"Loaded {len(src)} aggregated edges from repost_edges_daily")
+    keep = src != tgt  # self-forwards
+    return build_sparse_graph(src[keep], tgt[keep], w[keep])
+
+
+# ----------------- main -----------------
+def main():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    conn = connect()
+    try:
+        stats = update_edges(conn, full_rebuild=FULL_REBUILD)
+        print(f" {'Rebuilt' if FULL_REBUILD else 'Updated'} repost_edges_daily: {stats['upserted_rows']} rows "
+              f"upserted, {stats['table_rows']} rows / {stats['total_forwards']} forwards total "
+              f"({stats['seconds']:.1f}s)")
+        src, tgt, w = fetch_edges(conn)
+    finally:
+        conn.close()
+
+    edges = pd.DataFrame({"Source": src, "Target": tgt, "Type": "Directed", "Weight": w})
+    edges = edges[edges["Source"] != edges["Target"]].sort_values(["Source", "Target"])
+    edges.insert(3, "Id", np.arange(len(edges)))
+    edges.to_csv(OUT_EDGES, index=False)
+    print(f" Exported {len(edges)} edges ({'sampled channels' if SAMPLE_ONLY else 'all forward sources'}) "
+          f"-> {OUT_EDGES}")
+
+
+if __name__ == "__main__":
+    main()
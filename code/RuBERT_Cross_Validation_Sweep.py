@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""
+ruBERT Criticism Classifier — Parallel Cross-Validation and Hyperparameter Sweep
+================================================================================
+
+The training script evaluates one configuration on a single 80/20 split (125 test messages),
+which is too small for stable model selection. This runner evaluates every configuration in
+SWEEP_GRID with stratified K-fold cross-validation:
+
+- trials (config × fold) are scheduled fold-major across a process pool, each worker limited to
+  THREADS_PER_WORKER intra-op threads;
+- the dataset is tokenized once through the shared on-disk cache, workers only select fold indices;
+- each trial holds out VAL_FRACTION of its training folds as an inner validation set, which alone
+  drives early stopping and best-checkpoint selection; the test fold is scored once at the end;
+- a configuration is pruned once its mean macro-F1 after MIN_FOLDS_BEFORE_PRUNE folds trails the
+  best configuration by PRUNE_MARGIN;
+- fold metrics are aggregated into means with 95% t-confidence intervals.
+
+Dependencies
+------------
+pip install torch transformers datasets scikit-learn scipy
+"""
+
+import os
+import json
+import shutil
+import itertools
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.metrics import classification_report
+
+import torch
+from datasets import Dataset
+from transformers import (
+    BertTokenizerFast,
+    BertForSequenceClassification,
+    DataCollatorWithPadding,
+    EarlyStoppingCallback,
+    Trainer,
+    TrainingArguments,
+)
+
+from Fine_Tune_RuBERT_Criticism import (
+    BASE_MODEL,
+    DATA_PATH,
+    OUTPUT_DIR,
+    RANDOM_SEED,
+    THRESHOLD,
+    WEIGHT_DECAY,
+    load_data,
+    tokenize_cached,
+)
+
+# ========================
+# CONFIGURATION
+# ========================
+K_FOLDS = int(os.getenv("K_FOLDS", 5))
+N_WORKERS = int(os.getenv("N_WORKERS", 2))
+THREADS_PER_WORKER = int(os.getenv("THREADS_PER_WORKER", max(1, (os.cpu_count() or 1) // N_WORKERS)))
+
+SWEEP_GRID = {
+    "learning_rate": [1e-5, 2e-5, 3e-5, 5e-5],
+    "batch_size": [8, 16],
+    "epochs": [3, 4],
+}
+EARLY_STOPPING_PATIENCE = 1       # epochs without validation-loss improvement inside a trial
+VAL_FRACTION = 0.15               # share of each training fold used for early stopping / checkpointing
+MIN_FOLDS_BEFORE_PRUNE = 2
+PRUNE_MARGIN = 0.05               # macro-F1 gap to the current best config that prunes a config
+SELECTION_METRIC = "macro_f1"
+
+SWEEP_DIR = os.path.join(OUTPUT_DIR, "cv_sweep")
+OUT_TRIALS = os.path.join(OUTPUT_DIR, "rubert_cv_sweep_trials.csv")
+OUT_SUMMARY = os.path.join(OUTPUT_DIR, "rubert_cv_sweep_summary.csv")
+OUT_BEST = os.path.join(OUTPUT_DIR, "rubert_cv_sweep_best.json")
+
+
+# ----------------- worker side -----------------
+_WORKER = {}
+
+
+def _init_worker(threads: int):
+    """Limit threads and open the cached tokenized dataset once per worker process."""
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["MKL_NUM_THREADS"] = str(threads)
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    os.environ["WANDB_DISABLED"] = "true"
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already initialized
+
+    df = load_data(DATA_PATH).reset_index(drop=True)
+    tokenizer = BertTokenizerFast.from_pretrained(BASE_MODEL)
+    full = tokenize_cached(Dataset.from_dict({"text": df["message"].tolist(),
+                                              "label": df["is_criticism"].tolist()}), tokenizer)
+    _WORKER.update(tokenizer=tokenizer, dataset=full)
+
+
+def _run_trial(config_id: int, config: dict, fold: int, train_idx, val_idx, test_idx) -> dict:
+    """Train one configuration on one fold (stopping on val_idx) and return its test-fold metrics."""
+    tokenizer, full = _WORKER["tokenizer"], _WORKER["dataset"]
+    train_ds = full.select(train_idx)
+    val_ds = full.select(val_idx)
+    test_ds = full.select(test_idx)
+    for ds in (train_ds, val_ds, test_ds):
+        ds.set_format("torch")
+
+    torch.manual_seed(RANDOM_SEED)
+    model = BertForSequenceClassification.from_pretrained(BASE_MODEL, num_labels=2)
+    out_dir = os.path.join(SWEEP_DIR, f"cfg{config_id}_fold{fold}")
+    args = TrainingArguments(
+        output_dir=out_dir,
+        evaluation_strategy="epoch",
+        save_strategy="epoch",
+        learning_rate=config["learning_rate"],
+        per_device_train_batch_size=config["batch_size"],
+        per_device_eval_batch_size=32,
+        num_train_epochs=config["epochs"],
+        weight_decay=WEIGHT_DECAY,
+        group_by_length=True,
+        length_column_name="length",
+        load_best_model_at_end=True,
+        metric_for_best_model="eval_loss",
+        greater_is_better=False,
+        save_total_limit=1,
+        logging_strategy="no",
+        disable_tqdm=True,
+        report_to=[],
+        seed=RANDOM_SEED,
+        dataloader_num_workers=0,
+    )
+    trainer = Trainer(
+        model=model,
+        args=args,
+        train_dataset=train_ds,
+        eval_dataset=val_ds,     # the test fold never influences stopping or checkpoint choice
+        tokenizer=tokenizer,
+        data_collator=DataCollatorWithPadding(tokenizer, pad_to_multiple_of=8),
+        callbacks=[EarlyStoppingCallback(early_stopping_patience=EARLY_STOPPING_PATIENCE)],
+    )
+    train_out = trainer.train()
+    pred = trainer.predict(test_ds)
+    shutil.rmtree(out_dir, ignore_errors=True)
+
+    y_true = pred.label_ids.astype(int)
+    probs = torch.softmax(torch.tensor(pred.predictions), dim=-1).numpy()[:, 1]
+    rep = classification_report(y_true, (probs >= THRESHOLD).astype(int), digits=3,
+                                output_dict=True, zero_division=0)
+    return {
+        "config_id": config_id, **config, "fold": fold,
+        "accuracy": rep["accuracy"],
+        "macro_f1": rep["macro avg"]["f1-score"],
+        "f1_criticism": rep["1"]["f1-score"],
+        "precision_criticism": rep["1"]["precision"],
+        "recall_criticism": rep["1"]["recall"],
+        "eval_loss": pred.metrics.get("test_loss"),
+        "val_loss": trainer.state.best_metric,
+        "epochs_run": trainer.state.epoch,
+        "train_seconds": train_out.metrics.get("train_runtime"),
+    }
+
+
+# ----------------- scheduler side -----------------
+def expand_grid(grid: dict):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[k] for k in keys))]
+
+
+def should_prune(config_id: int, scores: dict) -> bool:
+    """Prune a config whose mean score trails the best config (with as many folds) by PRUNE_MARGIN."""
+    mine = scores.get(config_id, [])
+    if len(mine) < MIN_FOLDS_BEFORE_PRUNE:
+        return False
+    rivals = [np.mean(v) for c, v in scores.items() if c != config_id and len(v) >= len(mine)]
+    return bool(rivals) and np.mean(mine) + PRUNE_MARGIN < max(rivals)
+
+
+def mean_ci(values, level: float = 0.95):
+    """Mean and t-based confidence interval half-width over folds."""
+    arr = np.asarray([v for v in values if v is not None and not np.isnan(v)], dtype=float)
+    if len(arr) < 2:
+        return (float(arr.mean()) if len(arr) else float("nan")), float("nan")
+    half = stats.t.ppf(0.5 + level / 2, len(arr) - 1) * arr.std(ddof=1) / np.sqrt(len(arr))
+    return float(arr.mean()), float(half)
+
+
+def aggregate(trials: pd.DataFrame, pruned: set) -> pd.DataFrame:
+    rows = []
+    for cid, g in trials.groupby("config_id"):
+        row = {"config_id": cid, **{k: g[k].iloc[0] for k in SWEEP_GRID}, "folds": len(g),
+               "pruned": cid in pruned}
+        for metric in ("macro_f1", "f1_criticism", "accuracy", "eval_loss"):
+            m, h = mean_ci(g[metric].tolist())
+            row[f"{metric}_mean"] = m
+            row[f"{metric}_ci95"] = h
+        rows.append(row)
+    return (pd.DataFrame(rows)
+              .sort_values(["pruned", f"{SELECTION_METRIC}_mean"], ascending=[True, False])
+              .reset_index(drop=True))
+
+
+def main():
+    os.makedirs(SWEEP_DIR, exist_ok=True)
+    df = load_data(DATA_PATH).reset_index(drop=True)
+    y = df["is_criticism"].to_numpy()
+
+    # Tokenize once in the parent so every worker just opens the cache
+    tokenizer = BertTokenizerFast.from_pretrained(BASE_MODEL)
+    tokenize_cached(Dataset.from_dict({"text": df["message"].tolist(), "label": y.tolist()}), tokenizer)
+
+    # (train, inner validation, test) per fold; the inner split is stratified and fixed per fold,
+    # so every config of a fold sees the same three sets
+    folds = []
+    for tr, te in StratifiedKFold(n_splits=K_FOLDS, shuffle=True, random_state=RANDOM_SEED).split(
+            np.zeros(len(y)), y):
+        fit, val = train_test_split(tr, test_size=VAL_FRACTION, stratify=y[tr], random_state=RANDOM_SEED)
+        folds.append((np.sort(fit), np.sort(val), te))
+    configs = expand_grid(SWEEP_GRID)
+    # Fold-major order: every config gets its first folds early, which makes pruning effective
+    pending = [(cid, f) for f in range(K_FOLDS) for cid in range(len(configs))]
+    print(f" {len(configs)} configs x {K_FOLDS} folds = {len(pending)} trials on {len(df)} messages; "
+          f"{N_WORKERS} workers x {THREADS_PER_WORKER} threads")
+
+    os.environ["OMP_NUM_THREADS"] = str(THREADS_PER_WORKER)  # inherited by workers before torch loads
+    results, scores, pruned = [], {}, set()
+    ctx = mp.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=N_WORKERS, mp_context=ctx,
+                             initializer=_init_worker, initargs=(THREADS_PER_WORKER,)) as pool:
+        running = {}
+        while pending or running:
+            while pending and len(running) < N_WORKERS:
+                cid, f = pending.pop(0)
+                if cid in pruned:
+                    continue
+                tr, val, te = folds[f]
+                running[pool.submit(_run_trial, cid, configs[cid], f,
+                                    tr.tolist(), val.tolist(), te.tolist())] = (cid, f)
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                cid, f = running.pop(fut)
+                res = fut.result()
+                results.append(res)
+                scores.setdefault(cid, []).append(res[SELECTION_METRIC])
+                print(f" cfg {cid} {configs[cid]} fold {f}: macro F1={res['macro_f1']:.3f} "
+                      f"(epochs run {res['epochs_run']:.0f}, {res['train_seconds']:.0f}s)")
+                for other in list(scores):
+                    if other not in pruned and should_prune(other, scores):
+                        pruned.add(other)
+                        print(f" pruned cfg {other}: mean {SELECTION_METRIC}={np.mean(scores[other]):.3f}")
+
+    trials = pd.DataFrame(results).sort_values(["config_id", "fold"])
+    trials.to_csv(OUT_TRIALS, index=False)
+    summary = aggregate(trials, pruned)
+    summary.to_csv(OUT_SUMMARY, index=False)
+
+    best = summary.iloc[0].to_dict()
+    with open(OUT_BEST, "w", encoding="utf-8") as f:
+        json.dump(best, f, ensure_ascii=False, indent=2, default=float)
+
+    cols = ["config_id", *SWEEP_GRID, "folds", "pruned", "macro_f1_mean", "macro_f1_ci95",
+            "f1_criticism_mean", "f1_criticism_ci95", "accuracy_mean"]
+    print("\n=== CV summary (95% CI over folds) ===")
+    print(summary[cols].to_string(index=False, float_format="%.3f"))
+    print(f"\n Best: {({k: best[k] for k in SWEEP_GRID})}  macro F1 = "
+          f"{best['macro_f1_mean']:.3f} ± {best['macro_f1_ci95']:.3f}")
+    print(f" Saved: {OUT_TRIALS}, {OUT_SUMMARY}, {OUT_BEST}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Pipeline Runner (DAG of analysis stages with content-hash caching)
+==================================================================
+
+Declares the project's scripts as stages with typed inputs and outputs and runs them as a
+DAG from the repository root:
+
+    collect ──> rules
+            ──> frames
+            ──> network  (EDGES_SOURCE=postgres; otherwise Edges.csv) + Nodes.csv
+    train        (data/Training_Dataset.csv)
+
+A stage's dependencies are the stages that produce its inputs. Each stage is keyed by the
+hash of its code (the script and the code/ modules it imports), its input artifacts and the
+environment variables it reads. When the key matches the manifest of the last successful run
+and the recorded outputs are intact, the stage is skipped. Outputs of every run are copied
+into a content-addressed store, so returning to an earlier input state restores its outputs
+without rerunning. Independent stages run concurrently (MAX_PARALLEL). A stage that fails,
+or waits on one that failed or can never finish, is reported and the runner exits with 1.
+
+Usage
+-----
+python code/Run_Pipeline.py                    # all stages except collect (needs Telegram login)
+STAGES=frames,network python code/Run_Pipeline.py
+FORCE=1 / DRY_RUN=1                            # rerun regardless of cache / only print the plan
+
+Dependencies
+------------
+standard library only (stages need their own dependencies)
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import hashlib
+import subprocess
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+# ========================
+# CONFIGURATION
+# ========================
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CODE_DIR = os.path.join(ROOT, "code")
+PIPELINE_DIR = os.path.join("outputs", "pipeline")
+MANIFEST_PATH = os.path.join(PIPELINE_DIR, "manifest.json")
+STORE_DIR = os.path.join(PIPELINE_DIR, "store")
+LOG_DIR = os.path.join(PIPELINE_DIR, "logs")
+
+STAGES = [s for s in os.getenv("STAGES", "").split(",") if s]   # empty = all default stages
+FORCE = os.getenv("FORCE", "0") == "1"
+DRY_RUN = os.getenv("DRY_RUN", "0") == "1"
+MAX_PARALLEL = int(os.getenv("MAX_PARALLEL", 2))
+
+
+# ----------------- artifacts -----------------
+@dataclass(frozen=True)
+class Artifact:
+    """
+    A typed stage input/output.
+    kind: "csv" (optionally with required columns), "file", "dir", or "pg_table"
+    (a PostgreSQL table fingerprinted by row count and latest timestamp).
+    """
+    path: str
+    kind: str = "file"
+    columns: tuple = ()
+
+    def check(self):
+        """Raise if the artifact is missing or does not match its declared type."""
+        if self.kind == "pg_table":
+            return
+        if self.kind == "dir":
+            if not os.path.isdir(self.path):
+                raise FileNotFoundError(f"Missing directory artifact: {self.path}")
+            return
+        if not os.path.isfile(self.path):
+            raise FileNotFoundError(f"Missing {self.kind} artifact: {self.path}")
+        if self.kind == "csv" and self.columns:
+            with open(self.path, encoding="utf-8-sig") as f:
+                header = f.readline().strip().split(",")
+            missing = [c for c in self.columns if c not in header]
+            if missing:
+                raise ValueError(f"{self.path} lacks required column(s) {missing}")
+
+    def files(self):
+        if self.kind == "dir":
+            for base, _, names in sorted(os.walk(self.path)):
+                for name in sorted(names):
+                    yield os.path.join(base, name)
+        elif self.kind != "pg_table":
+            yield self.path
+
+    def fingerprint(self) -> str:
+        if self.kind == "pg_table":
+            return pg_fingerprint(self.path)
+        h = hashlib.sha256()
+        for p in self.files():
+            h.update(os.path.relpath(p, self.path if self.kind == "dir" else os.path.dirname(p)).encode())
+            h.update(file_hash(p).encode())
+        return h.hexdigest()
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def pg_fingerprint(table: str) -> str:
+    """Row count + max(time) of a PostgreSQL table; cheap proxy for 'has new data arrived'."""
+    if not os.getenv("PGHOST"):
+        return "unavailable"
+    from Repost_Edges import connect
+
+    conn = connect()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f'SELECT COUNT(*), MAX("time") FROM {table}')
+            return hashlib.sha256(repr(cur.fetchone()).encode()).hexdigest()
+    finally:
+        conn.close()
+
+
+# ----------------- stages -----------------
+@dataclass
+class Stage:
+    name: str
+    script: str
+    inputs: tuple = ()
+    outputs: tuple = ()
+    env: tuple = ()              # environment variables that change the stage's results
+    default: bool = True         # run when STAGES is empty
+    deps: set = field(default_factory=set)
+
+    def code_files(self):
+        """The stage script plus code/ modules it imports (transitively)."""
+        seen, todo = set(), [self.script]
+        while todo:
+            name = todo.pop()
+            path = os.path.join(CODE_DIR, name)
+            if name in seen or not os.path.exists(path):
+                continue
+            seen.add(name)
+            with open(path, encoding="utf-8") as f:
+                src = f.read()
+            for mod in re.findall(r"^\s*(?:from|import)\s+(\w+)", src, flags=re.MULTILINE):
+                todo.append(f"{mod}.py")
+        return sorted(seen)
+
+    def key(self) -> str:
+        h = hashlib.sha256(self.name.encode())
+        for name in self.code_files():
+            h.update(f"code:{name}:{file_hash(os.path.join(CODE_DIR, name))}".encode())
+        for art in self.inputs:
+            h.update(f"in:{art.path}:{art.fingerprint()}".encode())
+        for var in self.env:
+            h.update(f"env:{var}={os.getenv(var, '')}".encode())
+        return h.hexdigest()[:20]
+
+
+TELEGRAM_DATA = Artifact("public.telegram_data", "pg_table")
+NODES_CSV = Artifact("data/Network_Analysis_Data/Nodes.csv", "csv", ("Id",))
+# EDGES_SOURCE=postgres builds the graph from telegram_data (Repost_Edges.py) instead of Edges.csv
+NETWORK_INPUTS = ((TELEGRAM_DATA, NODES_CSV) if os.getenv("EDGES_SOURCE", "csv") == "postgres"
+                  else (Artifact("data/Network_Analysis_Data/Edges.csv", "csv"), NODES_CSV))
+PIPELINE = [
+    Stage("collect", "Telegram_Data_Collection.py", outputs=(TELEGRAM_DATA,), default=False),
+    Stage("rules", "Dependency_Parsing.py", inputs=(TELEGRAM_DATA,),
+          outputs=(Artifact("anti_regime_nationalists_analyzed_data.pkl"),
+                   Artifact("anti_regime_nationalists_critical_messages.xlsx")),
+          env=("CHANNEL_ID",)),
+    Stage("frames", "Frame_Frequency_Analysis.py", inputs=(TELEGRAM_DATA,),
+          outputs=(Artifact("frame_counts_by_cluster.csv", "csv", ("cluster", "total_messages")),
+                   Artifact("frame_percentages_by_cluster.csv", "csv", ("cluster", "total_messages")))),
+    Stage("train", "Fine_Tune_RuBERT_Criticism.py",
+          inputs=(Artifact("data/Training_Dataset.csv", "csv", ("message", "is_criticism")),),
+          outputs=(Artifact("outputs/models/rubert_criticism_classifier", "dir"),
+                   Artifact("outputs/rubert_test_classification_report.json"),
+                   Artifact("outputs/rubert_test_predictions_all.csv", "csv")),
+          env=("MAX_LEN", "DYNAMIC_PADDING")),
+    Stage("network", "Network_Analysis.py", inputs=NETWORK_INPUTS,
+          outputs=tuple(Artifact(f"outputs/{n}.csv", "csv") for n in
+                        ("degree_results", "betweenness_results", "top3_per_class_degree",
+                         "top3_per_class_betweenness", "network_summary")
+                        + (("community_stability",) if os.getenv("COMMUNITIES", "louvain") == "louvain" else ())),
+          env=("EDGES_SOURCE", "SAMPLE_ONLY", "COMMUNITIES", "BC_MODE", "BC_EPSILON", "BC_DELTA",
+               "BC_PROJECTION")),
+]
+
+
+def resolve(stages, selected):
+    """Wire dependencies (producer of an input -> consumer) and pick the stages to run."""
+    by_output = {art.path: s.name for s in stages for art in s.outputs}
+    by_name = {s.name: s for s in stages}
+    for s in stages:
+        s.deps = {by_output[a.path] for a in s.inputs if a.path in by_output} - {s.name}
+    if not selected:
+        return [s for s in stages if s.default]
+    unknown = set(selected) - set(by_name)
+    if unknown:
+        sys.exit(f"Unknown stage(s): {sorted(unknown)}; available: {list(by_name)}")
+    return [by_name[n] for n in selected]
+
+
+# ----------------- manifest and store -----------------
+def load_manifest() -> dict:
+    if os.path.exists(MANIFEST_PATH):
+        with open(MANIFEST_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    return {"stages": {}, "store": {}}
+
+
+def save_manifest(manifest: dict):
+    os.makedirs(PIPELINE_DIR, exist_ok=True)
+    tmp = MANIFEST_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, MANIFEST_PATH)
+
+
+def _copy(src: str, dst: str):
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    shutil.copy2(src, dst + ".tmp")
+    os.replace(dst + ".tmp", dst)
+
+
+def snapshot_outputs(stage: Stage) -> dict:
+    """Put the stage's output files into the content-addressed store; return {path: sha256}."""
+    files = {}
+    for art in stage.outputs:
+        art.check()
+        for p in art.files():
+            digest = file_hash(p)
+            blob = os.path.join(STORE_DIR, digest[:2], digest)
+            if not os.path.exists(blob):
+                _copy(p, blob)
+            files[p] = digest
+    return files
+
+
+def outputs_intact(files: dict) -> bool:
+    return all(os.path.exists(p) and file_hash(p) == d for p, d in files.items())
+
+
+def restore_outputs(files: dict) -> bool:
+    """Restore recorded outputs from the store; False if any blob is missing."""
+    blobs = {p: os.path.join(STORE_DIR, d[:2], d) for p, d in files.items()}
+    if not all(os.path.exists(b) for b in blobs.values()):
+        return False
+    for p, b in blobs.items():
+        if not (os.path.exists(p) and file_hash(p) == files[p]):
+            _copy(b, p)
+    return True
+
+
+# ----------------- execution -----------------
+def run_stage(stage: Stage) -> float:
+    os.makedirs(LOG_DIR, exist_ok=True)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [CODE_DIR, os.getenv("PYTHONPATH")])))
+    log_path = os.path.join(LOG_DIR, f"{stage.name}.log")
+    t0 = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.run([sys.executable, os.path.join(CODE_DIR, stage.script)],
+                              cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"stage '{stage.name}' failed (exit {proc.returncode}); see {log_path}")
+    return time.perf_counter() - t0
+
+
+def plan_stage(stage: Stage, manifest: dict):
+    """('skip'|'restore'|'run', key)."""
+    for art in stage.inputs:
+        art.check()
+    key = stage.key()
+    if FORCE:
+        return "run", key
+    last = manifest["stages"].get(stage.name)
+    if last and last["key"] == key and outputs_intact(last["outputs"]):
+        return "skip", key
+    if key in manifest["store"]:
+        return "restore", key
+    return "run", key
+
+
+def main():
+    os.chdir(ROOT)
+    sys.path.insert(0, CODE_DIR)
+    selected = resolve(PIPELINE, STAGES)
+    names = {s.name for s in selected}
+    manifest = load_manifest()
+
+    # stages whose producers are not selected treat those inputs as already available
+    pending = {s.name: s for s in selected}
+    done, failed = set(), {}
+    print(f" Pipeline: {', '.join(s.name for s in selected)} (max {MAX_PARALLEL} in parallel)")
+
+    with ThreadPoolExecutor(max_workers=MAX_PARALLEL) as pool:
+        running = {}
+        while pending or running:
+            ready = [s for s in pending.values()
+                     if not (s.deps & names) - done and not (s.deps & set(failed))]
+            blocked = [s for s in pending.values() if s.deps & set(failed)]
+            for s in blocked:
+                failed[s.name] = "upstream failed"
+                pending.pop(s.name)
+            for s in ready:
+                pending.pop(s.name)
+                try:
+                    action, key = plan_stage(s, manifest)
+                except (FileNotFoundError, ValueError) as e:
+                    failed[s.name] = str(e)
+                    print(f" [{s.name}] input error: {e}")
+                    continue
+                if action == "skip":
+                    print(f" [{s.name}] up to date (key {key})")
+                    done.add(s.name)
+                elif DRY_RUN:
+                    print(f" [{s.name}] would {action} (key {key})")
+                    done.add(s.name)
+                elif action == "restore" and restore_outputs(manifest["store"][key]):
+                    manifest["stages"][s.name] = {"key": key, "outputs": manifest["store"][key],
+                                                  "restored_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+                    print(f" [{s.name}] restored outputs from store (key {key})")
+                    done.add(s.name)
+                else:
+                    print(f" [{s.name}] running {s.script} ...")
+                    running[pool.submit(run_stage, s)] = (s, key)
+            if not running:
+                if pending and not ready:
+                    # nothing running and nothing can start: the remaining stages wait on each other
+                    for s in pending.values():
+                        failed[s.name] = f"blocked on {sorted((s.deps & names) - done)}"
+                        print(f" [{s.name}] BLOCKED: waiting on {sorted((s.deps & names) - done)}")
+                    pending.clear()
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in finished:
+                s, key = running.pop(fut)
+                try:
+                    seconds = fut.result()
+                    files = snapshot_outputs(s)
+                except Exception as e:
+                    failed[s.name] = str(e)
+                    print(f" [{s.name}] FAILED: {e}")
+                    continue
+                manifest["stages"][s.name] = {"key": key, "outputs": files, "seconds": round(seconds, 1),
+                                              "finished_at": time.strftime("%Y-%m-%d %H:%M:%S")}
+                manifest["store"][key] = files
+                save_manifest(manifest)
+                done.add(s.name)
+                print(f" [{s.name}] done in {seconds:.1f}s")
+
+    save_manifest(manifest)
+    print(f"\n Completed: {sorted(done)}" + (f"; failed: {sorted(failed)}" if failed else ""))
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Telegram Desktop Export → PostgreSQL Bulk Importer
+==================================================
+
+Offline alternative to Telegram_Data_Collection.py for historical backfills: reads the
+`result.json` written by Telegram Desktop ("Export chat history" for one channel, or a full
+account export with chats.list) and loads its channel posts into `telegram_data` with the
+same columns as the API collector, forward fields included.
+
+- The file is read incrementally: structural tokens are pulled one at a time and each message
+  is decoded on its own with json's C scanner, so memory holds one message plus one read block
+  whatever the size of the export.
+- Rows are bulk-loaded with COPY into a session temp table, then moved into telegram_data
+  with INSERT ... WHERE NOT EXISTS on (channel_id, message_id), so re-importing an export
+  or overlapping it with API-collected data adds no duplicates.
+
+Field mapping: channel id / name come from the exported chat; message text is the plain text
+of the "text" field (formatting entities flattened); time is date_unixtime (UTC) when present;
+forwards use forwarded_from (name) and forwarded_from_id when the export has it, otherwise the
+id and username are looked up by name in telegram_channels. Service messages and posts without
+text are skipped, as in the collector. Exports carry no view / forward counters, so views and
+reposts are NULL.
+
+Usage
+-----
+python code/Telegram_Export_Import.py path/to/result.json [more paths or export dirs ...]
+DRY_RUN=1 python code/Telegram_Export_Import.py export_dir/    # parse and count only, no database
+
+Forwards inserted below a channel's repost_edges_watermark (history older than what
+Repost_Edges.py has aggregated) are queued by the backfill trigger Repost_Edges.py installs on
+telegram_data, so its next run counts them.
+
+Dependencies
+------------
+pip install psycopg2-binary
+"""
+
+import io
+import os
+import re
+import sys
+import json
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+# ========================
+# CONFIGURATION
+# ========================
+EXPORT_PATH = os.getenv("EXPORT_PATH", "result.json")   # used when no paths are given on the command line
+CHAT_TYPES = set(os.getenv("CHAT_TYPES", "public_channel,private_channel").split(","))
+DRY_RUN = os.getenv("DRY_RUN", "0") == "1"
+COPY_BATCH_ROWS = 50_000           # rows per COPY + merge transaction
+READ_BLOCK = 1 << 20               # characters read from the export at a time
+
+COLUMNS = ("channel_id", "message_id", "channel_name", "time", "message",
+           "views", "reposts", "forward_from_id", "forward_channel_username", "forward_channel_name")
+STAGE_TABLE = "telegram_import_stage"
+
+PREPARE = f"""
+CREATE TEMP TABLE IF NOT EXISTS {STAGE_TABLE} AS
+SELECT {", ".join(COLUMNS)} FROM public.telegram_data WITH NO DATA;
+CREATE INDEX IF NOT EXISTS telegram_data_channel_message_idx ON public.telegram_data (channel_id, message_id);
+"""
+
+# New rows only: duplicates within the batch collapse to one, rows already stored are skipped.
+# The table lock keeps a concurrent collector from inserting the same keys mid-merge.
+MERGE_STAGE = f"""
+INSERT INTO public.telegram_data ({", ".join(COLUMNS)})
+SELECT DISTINCT ON (s.channel_id, s.message_id) {", ".join("s." + c for c in COLUMNS)}
+FROM {STAGE_TABLE} s
+WHERE NOT EXISTS (
+    SELECT 1 FROM public.telegram_data d
+    WHERE d.channel_id = s.channel_id AND d.message_id = s.message_id
+)
+ORDER BY s.channel_id, s.message_id
+"""
+
+CHANNELS_QUERY = """
+SELECT channel_id::bigint, channel_username, channel_name
+FROM public.telegram_channels
+WHERE channel_id IS NOT NULL
+"""
+
+_WS = re.compile(r"[ \t\n\r]*")
+_COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+# ----------------- incremental JSON reading -----------------
+class JSONStream:
+    """Pull parser over a text file: punctuation is taken one token at a time, values are decoded whole."""
+
+    def __init__(self, f, block: int = READ_BLOCK):
+        self.f = f
+        self.block = block
+        self.buf = ""
+        self.pos = 0
+        self.offset = 0      # characters dropped from the front of buf
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        # read at least as much as is buffered, so a value spanning many blocks is rescanned O(log n) times
+        chunk = self.f.read(max(self.block, len(self.buf) - self.pos))
+        self.offset += self.pos
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        self.eof = not chunk
+
+    def peek(self) -> str:
+        """Next non-whitespace character ('' at end of input), not consumed."""
+        while True:
+            self.pos = _WS.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self._fill()
+
+    def take(self, expected: str) -> str:
+        """Consume one of the expected punctuation characters."""
+        c = self.peek()
+        if not c or c not in expected:
+            raise ValueError(f"Expected one of {expected!r} at character {self.offset + self.pos}, got {c!r}")
+        self.pos += 1
+        return c
+
+    def value(self):
+        """Decode the next complete JSON value."""
+        self.peek()
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buf, self.pos)
+                # a number ending exactly at the buffer end may continue in the next block
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return obj
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def _members(s: JSONStream, close: str):
+    """Stop at each element of the array / object just opened; the caller reads it."""
+    if s.peek() == close:
+        s.take(close)
+        return
+    while True:
+        yield
+        if s.take("," + close) == close:
+            return
+
+
+def _chat(s: JSONStream, chat: dict):
+    """(chat, message) pairs of one chat object; full-account exports nest chats in chats.list."""
+    s.take("{")
+    for _ in _members(s, "}"):
+        key = s.value()
+        s.take(":")
+        if key == "messages" and s.peek() == "[":
+            s.take("[")
+            for _ in _members(s, "]"):
+                yield chat, s.value()
+        elif key in ("chats", "left_chats") and s.peek() == "{":
+            yield from _chat(s, {})
+        elif key == "list" and s.peek() == "[":
+            s.take("[")
+            for _ in _members(s, "]"):
+                yield from _chat(s, {})
+        else:
+            value = s.value()
+            if not isinstance(value, (dict, list)):   # name, type, id; skip large side sections
+                chat[key] = value
+
+
+def iter_export(path: str):
+    """(chat header, message dict) for every message of a Telegram Desktop result.json."""
+    with open(path, encoding="utf-8") as f:
+        yield from _chat(JSONStream(f), {})
+
+
+def export_files(paths) -> list:
+    """result.json files named directly or found under export directories."""
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            for root, _, files in sorted(os.walk(p)):
+                out += [os.path.join(root, f) for f in sorted(files) if f == "result.json"]
+        elif os.path.exists(p):
+            out.append(p)
+        else:
+            print(f" Warning: {p} not found, skipped")
+    return out
+
+
+# ----------------- field mapping -----------------
+def message_text(text) -> str:
+    """Plain text of an export "text" field (a string, or a list of strings and entity dicts)."""
+    if isinstance(text, str):
+        return text
+    return "".join(p if isinstance(p, str) else p.get("text", "") for p in text or ())
+
+
+def message_time(msg: dict) -> datetime:
+    if msg.get("date_unixtime"):
+        return datetime.fromtimestamp(int(msg["date_unixtime"]), tz=timezone.utc)
+    return datetime.fromisoformat(msg["date"])
+
+
+def forward_fields(msg: dict, channels: dict):
+    """(forward_from_id, forward_channel_username, forward_channel_name) as the API collector stores them."""
+    name = msg.get("forwarded_from")
+    peer = msg.get("forwarded_from_id") or ""
+    if not name and not peer:
+        return None, None, None
+    if peer.startswith("user"):
+        return None, "unknown", "unknown"
+    if peer.startswith("channel"):
+        channel_id = int(peer[len("channel"):])
+        username = channels.get(channel_id, (None, None))[0]
+        return channel_id, username, name
+    channel_id, username = channels.get(name, (None, None))
+    return channel_id, username, name
+
+
+def message_row(chat: dict, msg: dict, channels: dict):
+    """telegram_data row (COLUMNS order) for one exported message, or None if it is skipped."""
+    if chat.get("type") not in CHAT_TYPES or msg.get("type") != "message":
+        return None
+    text = message_text(msg.get("text"))
+    if not text:
+        return None
+    return (str(chat["id"]), int(msg["id"]), chat.get("name"), message_time(msg), text,
+            None, None, *forward_fields(msg, channels))
+
+
+def load_channel_index(conn) -> dict:
+    """channel_id -> (username, name) and channel_name -> (channel_id, username) from telegram_channels."""
+    index = {}
+    with conn.cursor() as cur:
+        cur.execute(CHANNELS_QUERY)
+        for channel_id, username, name in cur.fetchall():
+            index[channel_id] = (username, name)
+            if name:
+                index.setdefault(name, (channel_id, username))
+    return index
+
+
+# ----------------- loading -----------------
+def _copy_field(v) -> str:
+    if v is None:
+        return "\\N"
+    if isinstance(v, datetime):
+        return v.isoformat()
+    return str(v).translate(_COPY_ESCAPES)
+
+
+def copy_rows(conn, rows):
+    """COPY rows into the staging table and merge the new ones into telegram_data; return rows inserted."""
+    buf = io.StringIO()
+    for row in rows:
+        buf.write("\t".join(map(_copy_field, row)))
+        buf.write("\n")
+    buf.seek(0)
+    with conn, conn.cursor() as cur:
+        cur.execute("LOCK TABLE public.telegram_data IN SHARE ROW EXCLUSIVE MODE")
+        cur.copy_expert(f"COPY {STAGE_TABLE} ({', '.join(COLUMNS)}) FROM STDIN", buf)
+        cur.execute(MERGE_STAGE)
+        inserted = cur.rowcount
+        cur.execute(f"TRUNCATE {STAGE_TABLE}")
+    return inserted
+
+
+def import_export(path: str, conn=None, channels=None, stats: Counter = None) -> Counter:
+    """Stream one result.json into telegram_data (parse and count only when conn is None)."""
+    stats = Counter() if stats is None else stats
+    channels = channels or {}
+    batch = []
+
+    def flush():
+        if batch and conn is not None:
+            stats["inserted"] += copy_rows(conn, batch)
+        batch.clear()
+
+    for chat, msg in iter_export(path):
+        row = message_row(chat, msg, channels)
+        if row is None:
+            stats["skipped"] += 1
+            continue
+        batch.append(row)
+        stats["rows"] += 1
+        stats["forwards"] += row[-1] is not None
+        if len(batch) >= COPY_BATCH_ROWS:
+            flush()
+    flush()
+    return stats
+
+
+# ----------------- main -----------------
+def main():
+    paths = export_files(sys.argv[1:] or [EXPORT_PATH])
+    if not paths:
+        sys.exit("No result.json found. Pass export files or directories, or set EXPORT_PATH.")
+
+    conn, channels = None, {}
+    if not DRY_RUN:
+        from Repost_Edges import connect, ensure_tables
+
+        conn = connect()
+        ensure_tables(conn)   # backfill trigger queues inserted forwards below the edge watermark
+        channels = load_channel_index(conn)
+        with conn, conn.cursor() as cur:
+            cur.execute(PREPARE)
+
+    total, t0, size = Counter(), time.perf_counter(), 0
+    try:
+        for path in paths:
+            t1, before = time.perf_counter(), total["rows"]
+            import_export(path, conn, channels, total)
+            size += os.path.getsize(path)
+            print(f" {path}: {total['rows'] - before:,} messages in {time.perf_counter() - t1:.1f}s")
+    finally:
+        if conn is not None:
+            conn.close()
+
+    seconds = time.perf_counter() - t0
+    print(f" Parsed {total['rows']:,} channel messages ({total['forwards']:,} forwards, "
+          f"{total['skipped']:,} service/empty/non-channel skipped) from {len(paths)} file(s), "
+          f"{size / 2**20:.1f} MB in {seconds:.1f}s ({total['rows'] / max(seconds, 1e-9):,.0f} msg/s, "
+          f"{size / 2**20 / max(seconds, 1e-9):.1f} MB/s)")
+    if DRY_RUN:
+        print(" DRY_RUN=1: nothing written.")
+    else:
+        print(f" Inserted {total['inserted']:,} new rows into telegram_data; "
+              f"{total['rows'] - total['inserted']:,} already present or duplicated in the export.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Temporal Network Analysis (per-quarter or sliding-window snapshots)
+===================================================================
+
+Splits the time-stamped repost edges into snapshots — calendar quarters (2022Q1 … 2024Q3,
+as in the EDSS sampling tables) or sliding windows of WINDOW_DAYS every STEP_DAYS — and
+computes for each snapshot the same metrics as Network_Analysis.py: weighted degrees,
+betweenness (undirected projection, 1/weight) and the structural summary. The default
+projection (BC_PROJECTION=last, see Network_Analysis.py) depends on node order, so each snapshot
+is indexed in the order Network_Analysis.py gives the same window's edges.
+
+Consecutive snapshots are computed incrementally:
+- all snapshots share one integer node index; the window adjacency is updated by adding the
+  days entering and subtracting the days leaving the window, and degrees by the same deltas;
+- betweenness is computed per connected component and cached by the component's content,
+  so components that did not change between windows are not recomputed;
+- the structural summary is recomputed only when the snapshot's edge pattern changed.
+
+Input: repost_edges_daily from Repost_Edges.py (TEMPORAL_SOURCE=postgres, default) or a CSV
+with columns source, target, day, weight (TEMPORAL_SOURCE=<path>).
+
+Output (tidy, one row per snapshot × node / snapshot × graph):
+- temporal_node_metrics.csv
+- temporal_network_summary.csv
+
+Dependencies
+------------
+pip install pandas numpy scipy networkx (psycopg2-binary for TEMPORAL_SOURCE=postgres)
+"""
+
+import os
+import time
+import hashlib
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from Network_Analysis import (
+    BC_MODE,
+    BC_PROJECTION,
+    OUTPUT_DIR,
+    SparseGraph,
+    betweenness,
+    build_sparse_graph,
+    detect_column,
+    pair_order,
+    structural_summary,
+)
+
+# ========================
+# CONFIGURATION
+# ========================
+TEMPORAL_SOURCE = os.getenv("TEMPORAL_SOURCE", "postgres")  # "postgres" or a CSV path
+WINDOW = os.getenv("WINDOW", "quarter")                     # "quarter" or "sliding"
+WINDOW_DAYS = int(os.getenv("WINDOW_DAYS", 90))             # sliding windows only
+STEP_DAYS = int(os.getenv("STEP_DAYS", 30))
+START_DATE = "2022-02-22"
+END_DATE = "2024-09-01"
+
+OUT_NODES = os.path.join(OUTPUT_DIR, "temporal_node_metrics.csv")
+OUT_SUMMARY = os.path.join(OUTPUT_DIR, "temporal_network_summary.csv")
+
+
+# ----------------- input -----------------
+def load_daily_edges(source: str = TEMPORAL_SOURCE) -> pd.DataFrame:
+    """Daily edge rows with columns source, target, day, weight (labels as channel usernames)."""
+    if source == "postgres":
+        from Repost_Edges import connect, update_edges, fetch_daily_edges, fetch_channel_labels
+
+        conn = connect()
+        try:
+            update_edges(conn)
+            daily = fetch_daily_edges(conn, START_DATE, END_DATE)
+            names = fetch_channel_labels(conn)
+        finally:
+            conn.close()
+        daily["source"] = daily["source_id"].map(names).fillna(daily["source_id"].astype(str))
+        daily["target"] = daily["target_id"].map(names).fillna(daily["target_id"].astype(str))
+    else:
+        daily = pd.read_csv(source)
+        cols = {
+            detect_column(daily, ["source", "from", "src"]): "source",
+            detect_column(daily, ["target", "to", "dst"]): "target",
+            detect_column(daily, ["day", "date", "time"]): "day",
+            detect_column(daily, ["weight", "count", "Weight"]): "weight",
+        }
+        daily = daily.rename(columns={k: v for k, v in cols.items() if k})
+        if "weight" not in daily.columns:
+            daily["weight"] = 1
+        daily["day"] = pd.to_datetime(daily["day"]).dt.normalize()
+    daily = daily.dropna(subset=["source", "target", "day"])
+    daily = daily[daily["source"] != daily["target"]]
+    return daily[["source", "target", "day", "weight"]].sort_values("day", kind="stable").reset_index(drop=True)
+
+
+def make_windows(first_day: pd.Timestamp, last_day: pd.Timestamp, kind: str = WINDOW):
+    """[(name, start, end)] with end exclusive."""
+    if kind == "quarter":
+        return [(str(p), p.start_time, (p + 1).start_time)
+                for p in pd.period_range(first_day, last_day, freq="Q")]
+    windows = []
+    start = first_day.normalize()
+    while start <= last_day:
+        end = start + pd.Timedelta(days=WINDOW_DAYS)
+        windows.append((f"{start.date()}..{(end - pd.Timedelta(days=1)).date()}", start, end))
+        start += pd.Timedelta(days=STEP_DAYS)
+    return windows
+
+
+# ----------------- incremental snapshots -----------------
+def _content_key(labels, *arrays) -> str:
+    h = hashlib.sha256("\x1f".join(map(str, labels)).encode("utf-8"))
+    for a in arrays:
+        h.update(np.ascontiguousarray(a).tobytes())
+    return h.hexdigest()
+
+
+class SnapshotEngine:
+    """Slide a window over daily edges, keeping the window adjacency and degrees up to date."""
+
+    def __init__(self, daily: pd.DataFrame):
+        g = build_sparse_graph(daily["source"].to_numpy(), daily["target"].to_numpy(),
+                               daily["weight"].to_numpy())
+        self.labels = g.labels
+        self.n = g.n
+        self.rows = daily["source"].map(g.index).to_numpy()
+        self.cols = daily["target"].map(g.index).to_numpy()
+        self.weights = daily["weight"].to_numpy()
+        self.days = daily["day"].to_numpy()
+        self.A = sparse.csr_matrix((self.n, self.n), dtype=self.weights.dtype)
+        self.in_deg = np.zeros(self.n, dtype=self.weights.dtype)
+        self.out_deg = np.zeros(self.n, dtype=self.weights.dtype)
+        self.lo = self.hi = 0      # daily rows [lo, hi) are in the current window
+        self.bc_cache = {}          # component content hash -> raw betweenness
+        self.summary_cache = {}     # snapshot pattern hash -> structural summary
+        self.stats = {"components": 0, "components_reused": 0, "summaries_reused": 0}
+
+    def _delta(self, a: int, b: int) -> sparse.csr_matrix:
+        return sparse.coo_matrix((self.weights[a:b], (self.rows[a:b], self.cols[a:b])),
+                                 shape=(self.n, self.n)).tocsr()
+
+    def move_to(self, start, end):
+        """
+        Advance the window to [start, end); return the snapshot graph (active nodes only) and their
+        ids, in the node order build_sparse_graph gives the window's edges.
+        """
+        lo = int(np.searchsorted(self.days, np.datetime64(start), side="left"))
+        hi = int(np.searchsorted(self.days, np.datetime64(end), side="left"))
+        if lo >= self.hi or hi <= self.lo:          # no overlap: rebuild from the window rows
+            self.A = self._delta(lo, hi)
+            self.in_deg = np.asarray(self.A.sum(axis=0)).ravel()
+            self.out_deg = np.asarray(self.A.sum(axis=1)).ravel()
+        else:
+            for a, b, sign in ((self.hi, hi, 1), (self.lo, lo, -1), (hi, self.hi, -1), (lo, self.lo, 1)):
+                if a < b:
+                    D = self._delta(a, b)
+                    self.A = self.A + D if sign > 0 else self.A - D
+                    self.in_deg = self.in_deg + sign * np.asarray(D.sum(axis=0)).ravel()
+                    self.out_deg = self.out_deg + sign * np.asarray(D.sum(axis=1)).ravel()
+            self.A.eliminate_zeros()  # edges whose forwards all left the window
+        self.lo, self.hi = lo, hi
+        active = np.flatnonzero((self.in_deg + self.out_deg) > 0)
+        S = self.A[active][:, active].tocoo()
+        order = pair_order(self.labels[active][S.row], self.labels[active][S.col])
+        active = active[pd.unique(np.column_stack([S.row[order], S.col[order]]).ravel())]
+        return SparseGraph(self.labels[active], self.A[active][:, active].tocsr()), active
+
+    def betweenness(self, g: SparseGraph) -> np.ndarray:
+        """Normalized betweenness of a snapshot, reusing unchanged connected components."""
+        W = g.undirected(how=BC_PROJECTION)   # same projection as Network_Analysis.py
+        W.data = 1.0 / W.data   # inv_w (window weights are positive counts)
+        n = g.n
+        n_comp, comp = csgraph.connected_components(W, directed=False)
+        raw = np.zeros(n)
+        for c in range(n_comp):
+            idx = np.flatnonzero(comp == c)
+            self.stats["components"] += 1
+            if len(idx) <= 2:
+                continue
+            Wc = W[idx][:, idx].tocsr()
+            key = _content_key(g.labels[idx], Wc.indptr, Wc.indices, Wc.data)
+            if key in self.bc_cache:
+                self.stats["components_reused"] += 1
+            else:
+                self.bc_cache[key] = betweenness(Wc, mode=BC_MODE, normalized=False)[0]
+            raw[idx] = self.bc_cache[key]
+        return raw / ((n - 1) * (n - 2)) if n > 2 else raw
+
+    def summary(self, g: SparseGraph) -> pd.DataFrame:
+        P = g.pattern()
+        key = _content_key(g.labels, P.indptr, P.indices)
+        if key in self.summary_cache:
+            self.stats["summaries_reused"] += 1
+        else:
+            self.summary_cache[key] = structural_summary(g)
+        return self.summary_cache[key]
+
+
+# ----------------- main -----------------
+def main():
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    daily = load_daily_edges()
+    daily = daily[(daily["day"] >= START_DATE) & (daily["day"] < END_DATE)]
+    if daily.empty:
+        print(f"No repost edges between {START_DATE} and {END_DATE}; nothing to write.")
+        return
+    print(f"Loaded {len(daily)} daily edge rows, {daily['day'].min().date()} .. {daily['day'].max().date()}")
+
+    engine = SnapshotEngine(daily)
+    windows = make_windows(daily["day"].min(), daily["day"].max())
+    node_rows, summary_rows = [], []
+    t0 = time.perf_counter()
+    for name, start, end in windows:
+        g, active = engine.move_to(start, end)
+        meta = {"window": name, "window_start": start.date(), "window_end": end.date()}
+        if g.n == 0:
+            continue
+        bc = engine.betweenness(g)
+        node_rows.append(pd.DataFrame({
+            **meta,
+            "Id": g.labels,
+            "InDegree": engine.in_deg[active],
+            "OutDegree": engine.out_deg[active],
+            "TotalDegree": engine.in_deg[active] + engine.out_deg[active],
+            "Betweenness": bc,
+        }))
+        summary_rows.append(engine.summary(g).assign(**meta))
+        print(f" {name}: {g.n} nodes, {g.m} edges")
+
+    if not node_rows:
+        print(f"\nNo repost edges in any of the {len(windows)} {WINDOW} snapshots; nothing to write.")
+        return
+
+    nodes_ts = pd.concat(node_rows, ignore_index=True)
+    summary_ts = pd.concat(summary_rows, ignore_index=True)
+    summary_ts = summary_ts[["window", "window_start", "window_end"]
+                            + [c for c in summary_ts.columns if not c.startswith("window")]]
+    nodes_ts.to_csv(OUT_NODES, index=False)
+    summary_ts.to_csv(OUT_SUMMARY, index=False)
+
+    s = engine.stats
+    print(f"\n{len(windows)} {WINDOW} snapshots in {time.perf_counter() - t0:.1f}s; "
+          f"betweenness components reused {s['components_reused']}/{s['components']}, "
+          f"structural summaries reused {s['summaries_reused']}")
+    print("\n=== Structural summary over time (directed GWC) ===")
+    print(summary_ts[summary_ts["Graph"].str.startswith("Directed")]
+          [["window", "n", "m", "Density", "APL", "Diameter", "Efficiency"]].to_string(index=False))
+    print("\nSaved:")
+    print(f" - {OUT_NODES}")
+    print(f" - {OUT_SUMMARY}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import os
+import sys
+import json
+import asyncio
+
+import pytest
+
+# the analysis scripts live in code/ and import each other by module name
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "code"))
+
+
+@pytest.fixture
+def http_exchange():
+    """exchange(handler, *raw_requests) -> [(status, payload)] read from one connection until it closes."""
+    def exchange(handler, *requests):
+        async def run():
+            server = await asyncio.start_server(handler, "127.0.0.1", 0)
+            port = server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"".join(requests))
+            await writer.drain()
+            replies = []
+            while True:
+                status_line = await reader.readline()
+                if not status_line:
+                    break
+                headers = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    k, _, v = line.decode().partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                body = await reader.readexactly(int(headers["content-length"]))
+                replies.append((int(status_line.split()[1]), json.loads(body)))
+            writer.close()
+            server.close()
+            return replies
+        return asyncio.run(asyncio.wait_for(run(), 10))
+    return exchange
@@ -0,0 +1,29 @@
+import numpy as np
+
+from Dedup_Messages import dedup, dedup_messages
+
+VARIANTS = [
+    "Всё идёт по плану, сказал @rybar https://t.me/rybar/1",
+    "Всё идёт по плану, сказал @rybar https://t.me/rybar/1",   # byte-identical repost
+    "Все идет по плану, сказал @rybar https://t.me/rybar/1",   # ё -> е
+    "всё идёт по плану сказал",                                 # case, punctuation, mention, link
+]
+
+
+def test_exact_mode_folds_only_identical_texts():
+    groups = dedup_messages(VARIANTS, mode="exact")
+    assert groups.canonical.tolist() == [0, 0, 2, 3]
+    assert groups.kind.tolist() == [0, 1, 0, 0]
+    labels = np.array([len(t) for t in np.asarray(VARIANTS)[groups.canonical_positions]])
+    assert groups.fan_out(labels).tolist() == [len(t) for t in VARIANTS]
+
+
+def test_near_mode_also_folds_normalized_variants():
+    groups = dedup(VARIANTS, near=True)
+    assert groups.canonical.tolist() == [0, 0, 0, 0]
+    assert groups.kind.tolist() == [0, 1, 2, 2]
+
+
+def test_canonical_is_earliest_in_time():
+    groups = dedup(VARIANTS[:2], times=np.array([5, 1]), near=False)
+    assert groups.canonical.tolist() == [1, 1]
@@ -0,0 +1,58 @@
+import pandas as pd
+import pytest
+
+from EDSS_Snowball_Sampling import ForwardCounts, apply_criteria, load_exclusions, run_edss
+
+
+def _counts(rows):
+    df = pd.DataFrame(rows, columns=["source", "target", "quarter", "weight"])
+    df["quarter"] = pd.PeriodIndex(df["quarter"], freq="Q")
+    return df
+
+
+def test_wave_without_qualifying_pairs_returns_empty_table():
+    counts = ForwardCounts(_counts([("seed", "a", "2022Q2", 2), ("seed", "b", "2023Q1", 1)]))
+
+    table = counts.wave(["seed"], {"seed": 0}, threshold=5)
+    assert table.empty
+    assert list(table.columns) == counts.columns()
+
+    out = apply_criteria(table, {}, {})
+    assert out.empty
+    assert list(out.columns[-8:]) == ["news", "official", "foreign", "irregular_source",
+                                      "Private_Deleted_Blocked", "Selected", "active_quarters", "reviewed"]
+
+    tables, sample = run_edss(counts, ["seed"], [5, 10], {}, {})
+    assert list(tables) == [1] and tables[1].empty
+    assert sample.to_dict("list") == {"channel": ["seed"], "wave": [0]}
+
+
+def test_waves_expand_from_the_frontier_only():
+    quarters = ["2022Q2", "2022Q3", "2022Q4"]
+    rows = [("seed", "a", q, 10) for q in quarters]
+    rows += [("a", "b", q, 10) for q in quarters]
+    rows += [("seed", "c", q, 10) for q in quarters]     # excluded in wave 1
+    rows += [("c", "d", q, 10) for q in quarters]        # c is not in the frontier, so d is never a candidate
+    counts = ForwardCounts(_counts(rows))
+
+    tables, sample = run_edss(counts, ["seed"], [5, 10], {"c": {"news"}}, {})
+    assert set(tables[1]["forward_channel_name"]) == {"a", "c"}
+    assert tables[2][["channel_name", "forward_channel_name"]].values.tolist() == [["a", "b"]]
+    assert dict(zip(sample["channel"], sample["wave"])) == {"seed": 0, "a": 1, "b": 2}
+
+
+def test_missing_exclusion_list_warns_by_default_and_fails_when_explicit(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("EXCLUSIONS_PATH", raising=False)
+    assert load_exclusions() == {}
+    assert "data/Sampling_Exclusions.csv" in capsys.readouterr().out
+
+    with pytest.raises(FileNotFoundError, match="missing.csv"):
+        load_exclusions(str(tmp_path / "missing.csv"))
+    monkeypatch.setenv("EXCLUSIONS_PATH", "data/Sampling_Exclusions.csv")
+    with pytest.raises(FileNotFoundError):
+        load_exclusions()
+
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "Sampling_Exclusions.csv").write_text("channel,reason\nria,News\n")
+    assert load_exclusions() == {"ria": {"news"}}
@@ -0,0 +1,40 @@
+from Criticism_Inference_Server import handle_connection
+
+HEALTH_CLOSE = b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n"
+
+
+class _Batcher:
+    threshold = 0.5
+
+    async def score(self, texts):
+        if "boom" in texts:
+            raise RuntimeError("forward failed")
+        return [0.9 for _ in texts]
+
+    def metrics(self):
+        return {}
+
+
+def _handler(reader, writer):
+    return handle_connection(reader, writer, _Batcher())
+
+
+def _post(body: bytes, length=None) -> bytes:
+    length = len(body) if length is None else length
+    return b"POST /score HTTP/1.1\r\nContent-Length: " + str(length).encode() + b"\r\n\r\n" + body
+
+
+def test_bad_content_length_gets_400_and_close(http_exchange):
+    assert [s for s, _ in http_exchange(_handler, _post(b"{}", length="abc"))] == [400]
+
+
+def test_non_object_body_gets_400_and_connection_stays_open(http_exchange):
+    replies = http_exchange(_handler, _post(b"[1,2]"), _post(b'{"messages": ["a"]}'), HEALTH_CLOSE)
+    assert [s for s, _ in replies] == [400, 200, 200]
+    assert replies[1][1] == {"prob_criticism": [0.9], "is_criticism": [1]}
+
+
+def test_forward_failure_gets_500_and_connection_stays_open(http_exchange):
+    replies = http_exchange(_handler, _post(b'{"messages": ["boom"]}'), HEALTH_CLOSE)
+    assert [s for s, _ in replies] == [500, 200]
+    assert "forward failed" in replies[0][1]["error"]
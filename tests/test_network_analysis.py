@@ -0,0 +1,24 @@
+import networkx as nx
+import pandas as pd
+
+from Network_Analysis import build_sparse_graph
+
+
+def _former_node_order(edges):
+    # the NetworkX build this graph replaced: groupby-collapsed edges added to a DiGraph
+    edges = edges.groupby(["source", "target"], as_index=False)["weight"].sum()
+    G = nx.DiGraph()
+    G.add_weighted_edges_from(edges.itertuples(index=False, name=None))
+    return list(G.nodes)
+
+
+def test_node_order_matches_former_build_for_numeric_ids():
+    edges = pd.DataFrame({"source": [10, 9, 100, 9, 2], "target": [9, 10, 2, 100, 10],
+                          "weight": [1, 2, 3, 4, 5]})
+    g = build_sparse_graph(edges["source"], edges["target"], edges["weight"])
+    assert list(g.labels) == _former_node_order(edges)
+
+
+def test_mixed_id_types_fall_back_to_string_order():
+    g = build_sparse_graph([10, "rybar", 9], ["rybar", 9, 10], [1, 1, 1])
+    assert list(g.labels) == [10, "rybar", 9]
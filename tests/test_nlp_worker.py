@@ -0,0 +1,39 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from NLP_Worker import handle_connection
+
+HEALTH_CLOSE = b"GET /health HTTP/1.1\r\nConnection: close\r\n\r\n"
+
+
+class _Worker:
+    def run(self, job, texts):
+        if job == "parse":
+            raise KeyError("pipeline crashed")
+        if job == "frames":
+            raise OSError("model not installed")
+        return {"lemmas": [t.lower() for t in texts]}
+
+    def health(self):
+        return {"status": "ok"}
+
+
+def _handler(reader, writer):
+    return handle_connection(reader, writer, _Worker(), ThreadPoolExecutor(max_workers=1))
+
+
+def _post(job: str, body: bytes, length=None) -> bytes:
+    length = len(body) if length is None else length
+    return (f"POST /{job} HTTP/1.1\r\nContent-Length: {length}\r\n\r\n").encode() + body
+
+
+def test_bad_content_length_and_non_object_body_get_400(http_exchange):
+    assert [s for s, _ in http_exchange(_handler, _post("lemmatize", b"{}", length="abc"))] == [400]
+    replies = http_exchange(_handler, _post("lemmatize", b"[1,2]"), HEALTH_CLOSE)
+    assert [s for s, _ in replies] == [400, 200]
+
+
+def test_job_failures_are_answered_and_connection_stays_open(http_exchange):
+    replies = http_exchange(_handler, _post("parse", b'{"texts": ["a"]}'), _post("frames", b'{"texts": ["a"]}'),
+                            _post("lemmatize", b'{"texts": ["A"]}'), HEALTH_CLOSE)
+    assert [s for s, _ in replies] == [500, 503, 200, 200]
+    assert replies[2][1] == {"lemmas": ["a"]}
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import Temporal_Network_Analysis
+from Network_Analysis import build_sparse_graph, compute_betweenness_table
+from Temporal_Network_Analysis import SnapshotEngine
+
+
+def _daily():
+    # reciprocal pairs with unequal weights, and channels first seen in different windows so the
+    # shared snapshot index orders them differently from a graph built on one window alone
+    rows = [
+        ("z", "a", "2023-01-05", 1), ("a", "z", "2023-01-06", 5),
+        ("a", "b", "2023-01-07", 2), ("b", "a", "2023-01-08", 1),
+        ("b", "c", "2023-04-02", 3), ("c", "b", "2023-04-03", 4),
+        ("c", "d", "2023-04-04", 1), ("d", "z", "2023-04-05", 2),
+        ("z", "c", "2023-04-06", 1), ("d", "a", "2023-04-07", 6),
+        ("a", "d", "2023-04-08", 1), ("e", "d", "2023-04-09", 2),
+        ("c", "z", "2023-04-10", 7),
+    ]
+    daily = pd.DataFrame(rows, columns=["source", "target", "day", "weight"])
+    daily["day"] = pd.to_datetime(daily["day"])
+    return daily
+
+
+@pytest.mark.parametrize("projection", ["last", "sum"])
+def test_snapshot_betweenness_matches_network_analysis(monkeypatch, projection):
+    monkeypatch.setattr(Temporal_Network_Analysis, "BC_PROJECTION", projection)
+    daily = _daily()
+    start, end = pd.Timestamp("2023-04-01"), pd.Timestamp("2023-07-01")
+
+    engine = SnapshotEngine(daily)
+    engine.move_to(pd.Timestamp("2023-01-01"), start)
+    g, active = engine.move_to(start, end)
+    temporal = pd.Series(engine.betweenness(g), index=g.labels)
+
+    window = daily[(daily["day"] >= start) & (daily["day"] < end)]
+    window = window.groupby(["target", "source"], as_index=False, sort=False)["weight"].sum()
+    standalone = build_sparse_graph(window["source"].to_numpy(), window["target"].to_numpy(),
+                                    window["weight"].to_numpy())
+    # the shared index orders the window's channels differently; the snapshot is re-indexed
+    assert list(engine.labels[np.sort(active)]) != list(standalone.labels)
+    assert list(g.labels) == list(standalone.labels)
+    nodes = pd.DataFrame({"Id": standalone.labels, "Label": standalone.labels, "modularity_class": 0})
+    reference = (compute_betweenness_table(standalone, nodes, mode="exact", projection=projection)
+                 .set_index("Id")["Betweenness"])
+
+    assert temporal.abs().sum() > 0
+    np.testing.assert_allclose(temporal.sort_index(), reference.sort_index(), atol=1e-12)